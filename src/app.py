@@ -1,16 +1,589 @@
 import base64
+import json
+import os
+import time
+from typing import Callable, Optional, Tuple
 
 import cv2 as cv
 import numpy as np
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 
+from detection.packed_contours import PackedContours
+from detection.rig_profile import RigProfile, get_rig_store
+from errors.error import (
+    InvalidCoordinatesError,
+    InvalidImageError,
+    JobTimeoutError,
+    NotFoundError,
+    QueueFullError,
+)
+from monitoring.metrics import MetricsRegistry
+from monitoring.timing import StageTimer
+from processors.export_jobs import ExportJobStore
 from processors.image_processor import ImageProcessor
+from processors.live_session import LiveSessionRegistry
+from processors.multi_drawer_processor import MultiDrawerProcessor
+from processors.multipart import encode_multipart
 from processors.request_processor import RequestProcessor
+from processors.result_cache import ResultCache
+from processors.session_store import ImageSession, SessionStore
+from processors.sweep_processor import SweepProcessor
+from processors.worker_pool import WorkerPool
 
 app = Flask(__name__)
 CORS(app) 
 
+session_store = SessionStore()
+live_sessions = LiveSessionRegistry()
+result_cache = ResultCache()
+export_jobs = ExportJobStore()
+# Rig profiles of ALIGNER_RIG_DIR, loaded at startup
+rig_store = get_rig_store()
+worker_pool: Optional[WorkerPool] = None
+
+metrics = MetricsRegistry()
+metrics.describe("aligner_requests_total", "counter", "HTTP requests by endpoint and status")
+metrics.describe("aligner_request_seconds", "histogram", "HTTP request latency by endpoint")
+metrics.describe("aligner_stage_seconds", "histogram", "Pipeline stage latency")
+metrics.describe("aligner_megapixels_total", "counter", "Input image megapixels processed")
+metrics.describe("aligner_not_modified_total", "counter", "Conditional requests answered with 304")
+metrics.describe("aligner_pool_buffer_bytes_total", "counter", "Buffer pool bytes by allocated/reused")
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or "unknown"
+    metrics.inc(
+        "aligner_requests_total",
+        labels={"endpoint": endpoint, "status": str(response.status_code)},
+    )
+    if "request_start" in g:
+        metrics.observe(
+            "aligner_request_seconds",
+            time.perf_counter() - g.request_start,
+            {"endpoint": endpoint},
+        )
+    return response
+
+
+def set_worker_pool(pool: Optional[WorkerPool]) -> None:
+    """
+    Routes processing jobs to a worker pool, None processes them on the
+    request thread. Session caches only apply on the request thread, pool
+    jobs receive the session image and recompute its correction
+    """
+    global worker_pool
+    worker_pool = pool
+
+
+def get_result_key(
+    data: dict,
+    session: Optional[ImageSession] = None,
+    image_bytes: Optional[bytes] = None,
+    kind: str = "process",
+) -> Optional[str]:
+    """
+    Content addressed key of a processing request, used as result cache key
+    and ETag. None when the image content is unknown
+    """
+    if session is not None:
+        content_hash = session.content_hash
+    elif image_bytes:
+        content_hash = ResultCache.hash_content(image_bytes)
+    else:
+        content_hash = None
+
+    if content_hash is None:
+        return None
+    return ResultCache.make_key(content_hash, data, kind)
+
+
+def not_modified(result_key: Optional[str]) -> Optional[Response]:
+    """304 response when the request's If-None-Match lists the result key"""
+    if result_key is None or not request.if_none_match.contains_weak(result_key):
+        return None
+
+    metrics.inc("aligner_not_modified_total", labels={"endpoint": request.endpoint})
+    response = Response(status=304)
+    response.set_etag(result_key, weak=True)
+    return response
+
+
+def expand_rig(data: dict) -> dict:
+    """
+    Request data with the geometry of its "rigId" filled in
+
+    Raises:
+        ValueError: For an unknown rig
+    """
+    if not isinstance(data, dict):
+        return data
+    return rig_store.expand_request(data)
+
+
+def resolve_image_source(
+    data: dict, image_bytes: Optional[bytes] = None
+) -> Tuple[dict, Optional[ImageSession], Optional[bytes]]:
+    """
+    Request data with its rig expanded, plus the image it refers to: the
+    session of "sessionId", otherwise image_bytes or the decoded "imageData"
+
+    Returns:
+        Tuple of (data, session or None, image bytes or None)
+
+    Raises:
+        NotFoundError: For an unknown rig or an unknown or expired session
+    """
+    try:
+        data = expand_rig(data)
+    except ValueError as e:
+        raise NotFoundError(str(e)) from None
+
+    session = None
+    if data.get("sessionId"):
+        session = session_store.get(data["sessionId"])
+        if session is None:
+            raise NotFoundError("Unknown or expired session")
+    elif image_bytes is None:
+        image_bytes = ImageProcessor.decode_base64(data["imageData"])
+    return data, session, image_bytes
+
+
+def execute(
+    data: dict,
+    session: Optional[ImageSession] = None,
+    image_bytes: Optional[bytes] = None,
+    function: Callable = RequestProcessor.process_job,
+    result_key: Optional[str] = None,
+    timer: Optional[StageTimer] = None,
+) -> dict:
+    """
+    Runs a job function (RequestProcessor.process_job by default) inline or
+    on the worker pool and feeds its timings and input size into metrics.
+    With a result key, results are read from and stored in the result cache,
+    cache hits count their input size but record no stage timings. Jobs
+    with a timer (e.g. a cancelling one) always run inline and record every
+    span, including the cache lookup, on that timer
+
+    Returns:
+        Job output with "spans" replaced by a StageTimer ("timer")
+    """
+    job_timer = timer
+    if timer is None:
+        timer = StageTimer()
+
+    if result_key is not None and result_cache.enabled:
+        with timer.span("cache"):
+            job = result_cache.get(result_key)
+        if job is not None:
+            job["timer"] = timer
+            job["result"]["pool_buffer_bytes"] = {"allocated": 0, "reused": 0}
+            metrics.inc("aligner_megapixels_total", job["result"].get("megapixels", 0.0))
+            return job
+
+    if job_timer is not None:
+        job = function(data, session, image_bytes=image_bytes, timer=job_timer)
+    elif worker_pool is None:
+        job = function(data, session, image_bytes=image_bytes)
+    else:
+        image = session.image if session is not None else None
+        job = worker_pool.run(function, data, None, image, image_bytes)
+
+    spans = job.pop("spans")
+    if spans is not timer.spans:
+        timer.spans.extend(spans)
+    job["timer"] = timer
+
+    if result_key is not None and result_cache.enabled:
+        # Stored even if the job became stale meanwhile, the result is valid
+        store_timer = StageTimer()
+        with store_timer.span("cache"):
+            result_cache.put(result_key, job)
+        timer.spans.extend(store_timer.spans)
+
+    metrics.observe_stages("aligner_stage_seconds", timer.totals())
+    metrics.inc("aligner_megapixels_total", job["result"].get("megapixels", 0.0))
+    for kind, count in job["result"].get("pool_buffer_bytes", {}).items():
+        metrics.inc("aligner_pool_buffer_bytes_total", count, labels={"kind": kind})
+    return job
+
+
+def build_process_response(data: dict, job: dict) -> dict:
+    """/process-image JSON response of a job, artifacts that were not requested are null"""
+    timer = job["timer"]
+    result = job["result"]
+    artifacts = {name: (content_type, body) for name, content_type, body in job["artifacts"]}
+
+    response = {
+        "success": True,
+        "xRatio": result.get("x_ratio"),
+        "yRatio": result.get("y_ratio"),
+        "coordinates": result.get("coordinates"),
+        "transformations": result.get("transformations"),
+        "previewScale": result.get("preview_scale"),
+        "imageSize": result.get("image_size"),
+        "measurements": result.get("measurements"),
+        "contours": None,
+        "dxf_data": None,
+    }
+    for name in ("processedImage", "edgeImage", "contouredImage"):
+        response[name] = None
+        if name in artifacts:
+            content_type, body = artifacts[name]
+            encoded = base64.b64encode(body).decode("utf-8")
+            response[name] = f"data:{content_type};base64,{encoded}"
+    if "dxf" in artifacts:
+        response["dxf_data"] = base64.b64encode(artifacts["dxf"][1]).decode("utf-8")
+    if "contours" in artifacts:
+        response["contours"] = {
+            "format": RequestProcessor.parse_contour_format(
+                (data.get("encoding") or {}).get("contours")
+            ),
+            "data": base64.b64encode(artifacts["contours"][1]).decode("utf-8"),
+        }
+    if data.get("includeTimings"):
+        response["timings"] = timer.as_milliseconds()
+        response["poolBufferBytes"] = result.get("pool_buffer_bytes")
+    return response
+
+
+# Errors job_error_response maps to a status code
+JOB_ERRORS = (
+    InvalidImageError,
+    InvalidCoordinatesError,
+    NotFoundError,
+    QueueFullError,
+    JobTimeoutError,
+)
+
+
+def job_error_response(error: Exception):
+    """
+    Maps undecodable images, invalid coordinates, unknown sessions or rigs
+    and worker pool overload or timeouts to HTTP errors
+    """
+    if isinstance(error, NotFoundError):
+        return jsonify({"success": False, "error": str(error)}), 404
+    if isinstance(error, QueueFullError):
+        retry_after = worker_pool.retry_after if worker_pool is not None else 1
+        return (
+            jsonify({"success": False, "error": str(error)}),
+            503,
+            {"Retry-After": str(retry_after)},
+        )
+    if isinstance(error, JobTimeoutError):
+        return jsonify({"success": False, "error": str(error)}), 504
+    return jsonify({"success": False, "error": str(error)}), 400
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Prometheus metrics: request counts, latencies, stage timings, cache usage"""
+    stats = session_store.stats()
+    stage_cache = stats["stageCache"]
+    cache_stats = result_cache.stats()
+    gauges = {
+        "aligner_sessions": ("Cached image sessions", {(): stats["sessions"]}),
+        "aligner_session_cache_bytes": ("Memory held by cached sessions", {(): stats["bytes"]}),
+        "aligner_session_cache_max_bytes": ("Session cache memory cap", {(): stats["maxBytes"]}),
+        "aligner_session_evictions": ("Sessions evicted from the cache", {(): stats["evictions"]}),
+        "aligner_stage_cache_hits": (
+            "Stage cache hits of live sessions",
+            {(("stage", stage),): count for stage, count in stage_cache["hits"].items()},
+        ),
+        "aligner_stage_cache_misses": (
+            "Stage cache misses of live sessions",
+            {(("stage", stage),): count for stage, count in stage_cache["misses"].items()},
+        ),
+        "aligner_result_cache_bytes": ("Disk used by cached results", {(): cache_stats["bytes"]}),
+        "aligner_result_cache_entries": ("Cached results on disk", {(): cache_stats["entries"]}),
+        "aligner_result_cache_lookups": (
+            "Result cache hits and misses",
+            {
+                (("result", "hit"),): cache_stats["hits"],
+                (("result", "miss"),): cache_stats["misses"],
+            },
+        ),
+    }
+    if worker_pool is not None:
+        pool_stats = worker_pool.stats()
+        gauges["aligner_worker_pool"] = (
+            "Worker pool size, busy workers, queued jobs, rejected and timed out jobs",
+            {(("state", state),): value for state, value in pool_stats.items()},
+        )
+    return Response(metrics.render(gauges), content_type="text/plain; version=0.0.4")
+
+
+@app.route("/sessions", methods=["POST"])
+def create_session():
+    """
+    Uploads an image once, so later /process-image calls can refer to it
+
+    Expected JSON format:
+    {
+        "imageData": "data:image/png;base64,iVBORw0KGgo..."
+    }
+
+    Returns:
+    {
+        "success": true,
+        "sessionId": "3f2c...",
+        "width": 4000,
+        "height": 2250
+    }
+    """
+    try:
+        data = request.json
+        if not data or "imageData" not in data:
+            return jsonify({"success": False, "error": "Missing required data"}), 400
+
+        image_bytes = ImageProcessor.decode_base64(data["imageData"])
+        image = ImageProcessor.decode_image_bytes(image_bytes)
+        if image is None:
+            return jsonify({"success": False, "error": "Invalid image data"}), 400
+
+        session = session_store.create(image, ResultCache.hash_content(image_bytes))
+        height, width = image.shape[:2]
+
+        return jsonify(
+            {
+                "success": True,
+                "sessionId": session.session_id,
+                "width": width,
+                "height": height,
+            }
+        )
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/sessions", methods=["GET"])
+def session_stats():
+    """Session cache usage and stage cache hit/miss counts"""
+    return jsonify({"success": True, **session_store.stats()})
+
+
+@app.route("/sessions/<session_id>", methods=["GET"])
+def get_session(session_id):
+    """Image size and stage cache hit/miss counts of a single session"""
+    session = session_store.get(session_id)
+    if session is None:
+        return jsonify({"success": False, "error": "Unknown session"}), 404
+
+    height, width = session.image.shape[:2]
+    channel = live_sessions.get(session_id)
+    return jsonify(
+        {
+            "success": True,
+            "sessionId": session.session_id,
+            "width": width,
+            "height": height,
+            "bytes": session.nbytes,
+            "stageCache": session.stage_cache.stats(),
+            "live": channel.stats() if channel is not None else None,
+        }
+    )
+
+
+@app.route("/sessions/<session_id>", methods=["DELETE"])
+def delete_session(session_id):
+    """Releases the cached image of a session and closes its live channel"""
+    live_sessions.close(session_id)
+    if not session_store.delete(session_id):
+        return jsonify({"success": False, "error": "Unknown session"}), 404
+    return jsonify({"success": True})
+
+
+def run_live_update(session_id: str, data: dict, timer: StageTimer) -> dict:
+    """
+    Processes one live update like /process-image, returns its JSON response
+
+    Live updates run inline on the session's live thread instead of the
+    worker pool: the cancelling timer checks between stages whether a newer
+    update arrived, which a pool process cannot see, and the session's stage
+    cache, which makes slider ticks cheap, lives in this process. Every live
+    session runs at most one update at a time
+    """
+    session = session_store.get(session_id)
+    if session is None:
+        raise ValueError("Unknown or expired session")
+
+    data = expand_rig(dict(data, sessionId=session_id))
+    job = execute(data, session, result_key=get_result_key(data, session), timer=timer)
+    return build_process_response(data, job)
+
+
+@app.route("/sessions/<session_id>/live", methods=["POST"])
+def update_live_session(session_id):
+    """
+    Queues a parameter update of a live tuning session
+
+    Expects the /process-image JSON without "imageData" and "sessionId".
+    Updates are coalesced latest-wins: a pending update is replaced and a
+    running one is cancelled at its next pipeline stage, so only the newest
+    parameters are processed. Results arrive on GET /sessions/<id>/live.
+
+    Returns (202):
+    {
+        "success": true,
+        "generation": 12    # Sequence number of this update, echoed by its result
+    }
+    """
+    if session_store.get(session_id) is None:
+        return jsonify({"success": False, "error": "Unknown or expired session"}), 404
+
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "error": "Missing required data"}), 400
+
+    channel = live_sessions.get_or_create(
+        session_id, lambda update, timer: run_live_update(session_id, update, timer)
+    )
+    return jsonify({"success": True, "generation": channel.submit(data)}), 202
+
+
+@app.route("/sessions/<session_id>/live", methods=["GET"])
+def stream_live_session(session_id):
+    """
+    Server-sent event stream of live tuning results
+
+    Every completed update is sent as a "result" event with the
+    /process-image response plus its "generation" (also the event id), a
+    failed one as an "error" event. Results of superseded updates are never
+    sent, a slow client skips straight to the newest result. Reconnecting
+    clients resume with the Last-Event-ID header or the "after" query
+    argument. A comment line is sent every 15 seconds as keep-alive.
+    """
+    if session_store.get(session_id) is None:
+        return jsonify({"success": False, "error": "Unknown or expired session"}), 404
+
+    try:
+        after = int(request.headers.get("Last-Event-ID") or request.args.get("after", 0))
+    except ValueError:
+        return jsonify({"success": False, "error": "Invalid last event id"}), 400
+
+    channel = live_sessions.get_or_create(
+        session_id, lambda update, timer: run_live_update(session_id, update, timer)
+    )
+
+    def events():
+        nonlocal after
+        with channel.subscription():
+            while not channel.closed and session_store.get(session_id) is not None:
+                event = channel.wait(after, timeout=15)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                after = event["generation"]
+                payload = {name: value for name, value in event.items() if name != "event"}
+                yield f"id: {after}\nevent: {event['event']}\ndata: {json.dumps(payload)}\n\n"
+
+    return Response(
+        events(),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/rigs", methods=["POST"])
+def create_rig():
+    """
+    Stores the geometry of a fixed camera rig. Its perspective correction
+    is precomputed as remap tables, full resolution requests with "rigId"
+    and a photo of the rig size skip building the warp
+
+    Expected JSON format:
+    {
+        "rigId": "bench-1",           # Letters, digits, "_" and "-", replaces an existing rig
+        "sessionId": "3f2c...",       # Or "imageWidth" and "imageHeight" of the rig photos
+        "coordinates": [...],         # As for /process-image
+        "realWidthMm": 530,
+        "realHeightMm": 330,
+        "transformations": {"mirrored": false, "rotation": 0}   # Optional
+    }
+
+    Returns the stored rig as GET /rigs/<id>
+    """
+    try:
+        data = request.json
+        if not data or not all(
+            key in data for key in ("rigId", "coordinates", "realWidthMm", "realHeightMm")
+        ):
+            return jsonify({"success": False, "error": "Missing required data"}), 400
+
+        if data.get("sessionId"):
+            session = session_store.get(data["sessionId"])
+            if session is None:
+                return jsonify({"success": False, "error": "Unknown or expired session"}), 404
+            height, width = session.image.shape[:2]
+        elif "imageWidth" in data and "imageHeight" in data:
+            width, height = int(data["imageWidth"]), int(data["imageHeight"])
+        else:
+            return jsonify({"success": False, "error": "Missing image size"}), 400
+
+        transformations = data.get(
+            "transformations", RequestProcessor.get_default_transformations()
+        )
+        RequestProcessor.check_coordinates(
+            {"coordinates": data["coordinates"], "transformations": transformations},
+            width,
+            height,
+        )
+        source_transform, _ = ImageProcessor.get_transformation_matrix(
+            width,
+            height,
+            bool(transformations.get("mirrored", False)),
+            int(transformations.get("rotation", 0)),
+        )
+        profile = RigProfile(
+            str(data["rigId"]),
+            (width, height),
+            data["coordinates"],
+            data["realWidthMm"],
+            data["realHeightMm"],
+            transformations,
+            source_transform,
+        )
+        rig_store.register(profile)
+        return jsonify({"success": True, **profile.describe()})
+
+    except InvalidCoordinatesError as e:
+        return job_error_response(e)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/rigs", methods=["GET"])
+def list_rigs():
+    """All stored rigs"""
+    return jsonify({"success": True, "rigs": rig_store.list()})
+
+
+@app.route("/rigs/<rig_id>", methods=["GET"])
+def get_rig(rig_id):
+    """Geometry, photo size, corrected size and remap table bytes of a rig"""
+    profile = rig_store.get(rig_id)
+    if profile is None:
+        return jsonify({"success": False, "error": "Unknown rig"}), 404
+    return jsonify({"success": True, **profile.describe()})
+
+
+@app.route("/rigs/<rig_id>", methods=["DELETE"])
+def delete_rig(rig_id):
+    """Removes a rig, requests naming it fail afterwards"""
+    if not rig_store.delete(rig_id):
+        return jsonify({"success": False, "error": "Unknown rig"}), 404
+    return jsonify({"success": True})
+
 
 @app.route("/process-image", methods=["POST"])
 def process_image():
@@ -18,6 +591,9 @@ def process_image():
     Expected JSON format:
     {
         "imageData": "data:image/png;base64,iVBORw0KGgo...",
+        "sessionId": "3f2c...",     # Optional, replaces imageData
+        "rigId": "bench-1",         # Optional, replaces coordinates, real size and
+                                    # transformations with those of a /rigs profile
         "coordinates": [
             {"x": 100, "y": 200},
             {"x": 300, "y": 200},
@@ -35,10 +611,30 @@ def process_image():
             "cannyLow": 30,               
             "cannyHigh": 130,             
             "morphKernelSize": [5, 5]     
+        },
+        "preview": {"width": 1280, "height": 720},  # Optional, process a proxy sized to the viewport
+        "commit": false,              # Optional, true forces the full resolution pass
+        "dxfFormat": "ascii",         # Optional, "binary" for a binary DXF
+        "simplifyToleranceMm": 0.2,   # Optional, simplify contours to this tolerance
+        "measure": false,             # Optional, per contour measurements in mm
+        "perspectiveMode": "image",   # Optional, "contours" maps contours instead of warping
+        "includeTimings": false,      # Optional, adds per stage milliseconds as "timings" and
+                                      # buffer pool bytes allocated/reused as "poolBufferBytes"
+        "outputs": ["processedImage", "dxf"],  # Optional, default the three images, "dxf"
+                                      # and "contours" on request (downloads use /exports)
+        "encoding": {                 # Optional, per image artifact, default PNG
+            "processedImage": {"format": "jpeg", "quality": 80, "maxDimension": 1280},
+            "edgeImage": {"format": "png", "compression": 1},
+            "contours": {"format": "delta"}  # "packed" (default) or "delta"
         }
     }
 
-    Returns:
+    With "contours" in outputs the contours are returned as vector data,
+    so clients can draw the overlay over processedImage themselves instead
+    of requesting contouredImage. Coordinates are pixels of the corrected
+    image, whose size is returned as imageSize.
+
+    Returns (artifacts that were not requested are null):
     {
         "success": true,
         "processedImage": "data:image/png;base64,...", 
@@ -56,9 +652,30 @@ def process_image():
             "mirrored": false,
             "rotation": 0
         },
-        "dxf_data": string 
+        "previewScale": float,        # Proxy size relative to full resolution
+        "imageSize": [width, height], # Corrected image size, the contour coordinate space
+        "measurements": [             # Only with "measure", DXF coordinates in mm
+            {
+                "areaMm2": float, "perimeterMm": float, "circularity": float,
+                "minAreaRect": {"center": [x, y], "size": [w, h], "angle": float},
+                "enclosingCircle": {"center": [x, y], "diameter": float},
+                "inscribedCircle": {"center": [x, y], "diameter": float}
+            }
+        ],
+        "contours": {                 # Only with "contours" in outputs
+            "format": "delta",
+            "data": "..."             # base64 of PackedContours.encode
+        },
+        "dxf_data": string            # Only with "dxf" in outputs, at full resolution
     }
 
+    Stage timings are always returned in the Server-Timing header.
+
+    Results are cached on disk by image content and parameters. The response
+    carries a weak ETag derived from both, a request with a matching
+    If-None-Match header is answered with 304 Not Modified without running
+    the pipeline.
+
     Error Response:
     {
         "success": false,
@@ -72,31 +689,452 @@ def process_image():
         is_valid, error = ImageProcessor.validate_input(data)
         if not is_valid:
             return jsonify({"success": False, "error": error}), 400
+        data, session, image_bytes = resolve_image_source(data)
 
-        # Decode and validate image
-        image = ImageProcessor.decode_image(data["imageData"])
-        if image is None:
-            return jsonify({"success": False, "error": "Invalid image data"}), 400
+        result_key = get_result_key(data, session, image_bytes)
+        cached_response = not_modified(result_key)
+        if cached_response is not None:
+            return cached_response
 
+        # Process request, decoding happens once inside the job
+        job = execute(data, session, image_bytes, result_key=result_key)
+        timer = job["timer"]
+        response = build_process_response(data, job)
 
-        # Process request
-        result = RequestProcessor.process_request(data)
+        http_response = jsonify(response)
+        http_response.headers["Server-Timing"] = timer.server_timing_header()
+        if result_key is not None:
+            http_response.set_etag(result_key, weak=True)
+        return http_response
 
-        # Prepare response
-        response = {
+    except JOB_ERRORS as e:
+        return job_error_response(e)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/process-image/binary", methods=["POST"])
+def process_image_binary():
+    """
+    Binary variant of /process-image, artifacts travel as raw bytes
+
+    Request, either:
+        multipart/form-data with an "image" file part holding the raw JPEG/PNG
+        bytes and an optional "params" field with the /process-image JSON
+        (without "imageData")
+    or:
+        the raw image bytes as body (Content-Type: image/*) with the JSON
+        params in the "params" query argument
+
+    "sessionId" in params replaces the image upload.
+
+    Returns multipart/mixed, the first part is JSON metadata:
+    {
+        "success": true,
+        "xRatio": float,
+        "yRatio": float,
+        "coordinates": [...],
+        "transformations": {...},
+        "parts": ["processedImage", "edgeImage", "contouredImage", "dxf"]
+    }
+    followed by one part per requested artifact, named as listed in "parts"
+    ("outputs" and "encoding" in params work as for /process-image,
+    images use their encoded MIME type, the DXF application/dxf, the
+    contours application/x-contours-packed or application/x-contours-delta).
+
+    ETag, If-None-Match and the result cache work as for /process-image.
+
+    Errors are returned as JSON like /process-image.
+    """
+    try:
+        if request.mimetype.startswith("image/"):
+            params = request.args.get("params", "{}")
+            buffer = request.get_data()
+        else:
+            params = request.form.get("params", "{}")
+            upload = request.files.get("image")
+            buffer = upload.read() if upload is not None else b""
+        data, session, buffer = resolve_image_source(json.loads(params), buffer)
+
+        result_key = get_result_key(data, session, buffer)
+        cached_response = not_modified(result_key)
+        if cached_response is not None:
+            return cached_response
+
+        job = execute(data, session, buffer, result_key=result_key)
+        timer = job["timer"]
+        result = job["result"]
+        parts = job["artifacts"]
+
+        metadata = {
             "success": True,
-            "processedImage": ImageProcessor.encode_image(result["image"]),
-            "edgeImage": result["edge_image"],
-            "contouredImage": ImageProcessor.encode_image(result["contoured_image"]),
             "xRatio": result.get("x_ratio"),
             "yRatio": result.get("y_ratio"),
             "coordinates": result.get("coordinates"),
             "transformations": result.get("transformations"),
-            "dxf_data": result.get("dxf_data"),
+            "previewScale": result.get("preview_scale"),
+            "imageSize": result.get("image_size"),
+            "measurements": result.get("measurements"),
+            "parts": [name for name, _, _ in parts],
+        }
+        if data.get("includeTimings"):
+            metadata["timings"] = timer.as_milliseconds()
+            metadata["poolBufferBytes"] = result.get("pool_buffer_bytes")
+        body, content_type = encode_multipart(metadata, parts)
+
+        http_response = Response(
+            body,
+            content_type=content_type,
+            headers={"Server-Timing": timer.server_timing_header()},
+        )
+        if result_key is not None:
+            http_response.set_etag(result_key, weak=True)
+        return http_response
+
+    except JOB_ERRORS as e:
+        return job_error_response(e)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/process-drawers", methods=["POST"])
+def process_drawers():
+    """
+    Processes several drawers of one photo, e.g. a cabinet section, with a
+    single upload and decode. Drawers run concurrently
+
+    Expected JSON format (shared fields as for /process-image, every drawer
+    can override them, edgeDetectionSettings key by key):
+    {
+        "imageData": "data:image/jpeg;base64,...",   # Or "sessionId"
+        "transformations": {"mirrored": false, "rotation": 0},
+        "edgeDetectionSettings": {...},
+        "outputs": ["dxf"],
+        "dxfMode": "combined",        # Optional, "separate" (default): a DXF per drawer,
+                                      # "combined": one DXF, drawers side by side on
+                                      # "<name>_CONTOURS" / "<name>_BOUNDARIES" layers
+        "drawers": [
+            {
+                "name": "top",        # Optional, defaults to drawer_<n>
+                "coordinates": [...], # Or "rigId"
+                "realWidthMm": 530,
+                "realHeightMm": 120,
+                "edgeDetectionSettings": {"cannyLow": 20}
+            },
+            ...
+        ]
+    }
+
+    Returns:
+    {
+        "success": true,
+        "drawers": [
+            {"name": "top", ...}      # /process-image response fields of the drawer
+        ],
+        "dxf_data": string            # Combined DXF, null in "separate" mode
+    }
+
+    ETag, If-None-Match and the result cache work as for /process-image.
+    """
+    try:
+        data = request.json
+
+        is_valid, error = ImageProcessor.validate_input(data)
+        if not is_valid:
+            return jsonify({"success": False, "error": error}), 400
+        if not isinstance(data.get("drawers"), list):
+            return jsonify({"success": False, "error": "drawers must be a list"}), 400
+        try:
+            data = dict(data, drawers=[expand_rig(drawer) for drawer in data["drawers"]])
+            MultiDrawerProcessor.parse_drawers(data)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        data, session, image_bytes = resolve_image_source(data)
+
+        result_key = get_result_key(data, session, image_bytes, kind="drawers")
+        cached_response = not_modified(result_key)
+        if cached_response is not None:
+            return cached_response
+
+        job = execute(
+            data, session, image_bytes, MultiDrawerProcessor.process_job, result_key=result_key
+        )
+        timer = job["timer"]
+        result = job["result"]
+
+        drawers = []
+        drawer_data = {key: value for key, value in data.items() if key != "includeTimings"}
+        for drawer in result["drawers"]:
+            prefix = drawer["name"] + "/"
+            drawer_job = {
+                "timer": timer,
+                "result": drawer,
+                "artifacts": [
+                    (name[len(prefix):], content_type, body)
+                    for name, content_type, body in job["artifacts"]
+                    if name.startswith(prefix)
+                ],
+            }
+            drawer_response = build_process_response(drawer_data, drawer_job)
+            del drawer_response["success"]
+            drawers.append({"name": drawer["name"], **drawer_response})
+
+        combined = [body for name, _, body in job["artifacts"] if name == "dxf"]
+        response = {
+            "success": True,
+            "drawers": drawers,
+            "dxf_data": base64.b64encode(combined[0]).decode("utf-8") if combined else None,
+        }
+        if data.get("includeTimings"):
+            response["timings"] = timer.as_milliseconds()
+
+        http_response = jsonify(response)
+        http_response.headers["Server-Timing"] = timer.server_timing_header()
+        if result_key is not None:
+            http_response.set_etag(result_key, weak=True)
+        return http_response
+
+    except JOB_ERRORS as e:
+        return job_error_response(e)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+def prepare_export(data: dict, session: Optional[ImageSession], image_bytes: Optional[bytes]):
+    """
+    Export inputs of a /process-image request: runs the full resolution
+    pipeline for the contours only, through the result cache
+    """
+    process_data = {
+        key: value for key, value in data.items() if key not in ("preview", "filename")
+    }
+    process_data["outputs"] = ["contours"]
+    process_data["commit"] = True
+    job = execute(
+        process_data,
+        session,
+        image_bytes,
+        result_key=get_result_key(process_data, session, image_bytes),
+    )
+    result = job["result"]
+    if result.get("x_ratio") is None or "realWidthMm" not in data or "realHeightMm" not in data:
+        raise ValueError("DXF export needs coordinates or realWidthMm and realHeightMm")
+    return {
+        "contours": job["contours"],
+        "x_ratio": result["x_ratio"],
+        "y_ratio": result["y_ratio"],
+        "width_mm": float(data["realWidthMm"]),
+        "height_mm": float(data["realHeightMm"]),
+        "binary": data.get("dxfFormat") == "binary",
+    }
+
+
+@app.route("/exports", methods=["POST"])
+def create_export():
+    """
+    Starts a DXF export in the background, so interactive requests do not
+    build DXFs nobody downloads
+
+    Expected JSON format, either the contours of an earlier response:
+    {
+        "contours": {"format": "delta", "data": "..."},  # "contours" output of /process-image
+        "xRatio": float,
+        "yRatio": float,
+        "realWidthMm": 530,
+        "realHeightMm": 330,
+        "dxfFormat": "ascii",         # Optional, "binary" for a binary DXF
+        "filename": "drawer.dxf"      # Optional, download file name
+    }
+    or a /process-image request (imageData or sessionId, coordinates or
+    rigId, dimensions, settings), which is processed at full resolution.
+
+    Files are cached by contour hash plus dimensions, exports of cached
+    contours are "done" right away.
+
+    Returns (202, 200 when already done):
+    {
+        "success": true,
+        "exportId": "9b1e...",
+        "status": "queued",           # "queued", "running", "done" or "failed"
+        "statusUrl": "/exports/9b1e...",
+        "downloadUrl": "/exports/9b1e.../download"
+    }
+    """
+    try:
+        data = request.json
+        if not isinstance(data, dict):
+            return jsonify({"success": False, "error": "Missing required data"}), 400
+        filename = os.path.basename(str(data.get("filename") or "")).replace('"', "")
+        if not filename.lower().endswith(".dxf"):
+            filename = (filename or "drawer") + ".dxf"
+
+        if "contours" in data:
+            contour_options = data["contours"] or {}
+            contour_format = RequestProcessor.parse_contour_format(contour_options)
+            inputs = {
+                "contours": PackedContours.decode(
+                    base64.b64decode(contour_options["data"]), contour_format
+                ),
+                "x_ratio": float(data["xRatio"]),
+                "y_ratio": float(data["yRatio"]),
+                "width_mm": float(data["realWidthMm"]),
+                "height_mm": float(data["realHeightMm"]),
+                "binary": data.get("dxfFormat") == "binary",
+            }
+            job = export_jobs.submit(inputs=inputs, filename=filename)
+        else:
+            is_valid, error = ImageProcessor.validate_input(data)
+            if not is_valid:
+                return jsonify({"success": False, "error": error}), 400
+            data, session, image_bytes = resolve_image_source(data)
+            job = export_jobs.submit(
+                lambda: prepare_export(data, session, image_bytes), filename=filename
+            )
+
+        description = job.describe()
+        return (
+            jsonify(
+                {
+                    "success": True,
+                    **description,
+                    "statusUrl": f"/exports/{job.export_id}",
+                    "downloadUrl": f"/exports/{job.export_id}/download",
+                }
+            ),
+            200 if description["status"] == "done" else 202,
+        )
+
+    except JOB_ERRORS as e:
+        return job_error_response(e)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/exports", methods=["GET"])
+def export_stats():
+    """Export job counts by status and DXF cache usage"""
+    return jsonify({"success": True, **export_jobs.stats()})
+
+
+@app.route("/exports/<export_id>", methods=["GET"])
+def get_export(export_id):
+    """Status of an export job, "error" is set when it failed"""
+    job = export_jobs.get(export_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Unknown or expired export"}), 404
+    return jsonify({"success": True, **job.describe()})
+
+
+@app.route("/exports/<export_id>/download", methods=["GET"])
+def download_export(export_id):
+    """Streams the DXF of a finished export, 409 while it is still running or failed"""
+    job = export_jobs.get(export_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Unknown or expired export"}), 404
+    if job.status != "done":
+        return jsonify({"success": False, **job.describe()}), 409
+
+    body = memoryview(job.body)
+
+    def chunks():
+        for start in range(0, len(body), 64 * 1024):
+            yield bytes(body[start:start + 64 * 1024])
+
+    return Response(
+        chunks(),
+        content_type="application/dxf",
+        headers={
+            "Content-Length": str(len(body)),
+            "Content-Disposition": f'attachment; filename="{job.filename}"',
+            "ETag": f'"{job.key}"',
+        },
+    )
+
+
+@app.route("/sweep-edges", methods=["POST"])
+def sweep_edges():
+    """
+    Evaluates a grid of edge detection settings in parallel
+
+    Expected JSON format (image, coordinates, dimensions, transformations,
+    preview and edgeDetectionSettings as for /process-image):
+    {
+        "sessionId": "3f2c...",       # Or "imageData"
+        "coordinates": [...],         # Optional
+        "realWidthMm": 530,
+        "realHeightMm": 330,
+        "preview": {"width": 1280, "height": 720},  # Optional, sweep on a proxy
+        "sweep": {                    # Lists, single values or inclusive ranges
+            "blurKernelSize": [[3, 3], [5, 5]],
+            "cannyLow": {"start": 10, "stop": 50, "step": 10},
+            "cannyHigh": [100, 130, 160],
+            "morphKernelSize": [3, 5]
+        },
+        "thumbnailSize": 160,         # Optional, longest thumbnail side
+        "includeTimings": false
+    }
+
+    Parameters missing from "sweep" come from "edgeDetectionSettings".
+
+    Returns (one entry per setting, contour areas at full resolution):
+    {
+        "success": true,
+        "count": 60,
+        "previewScale": float,
+        "results": [
+            {
+                "settings": {"blurKernelSize": [3, 3], "cannyLow": 10,
+                             "cannyHigh": 100, "morphKernelSize": [3, 3]},
+                "contourCount": 12,
+                "totalContourArea": 182734.5,
+                "totalContourAreaMm2": 5120.3,    # Only with real dimensions
+                "thumbnail": "data:image/jpeg;base64,..."
+            }
+        ]
+    }
+    """
+    try:
+        data = request.json
+
+        is_valid, error = ImageProcessor.validate_input(data)
+        if not is_valid:
+            return jsonify({"success": False, "error": error}), 400
+        data, session, image_bytes = resolve_image_source(data)
+
+        try:
+            SweepProcessor.parse_grid(data)
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        job = execute(data, session, image_bytes, SweepProcessor.process_job)
+        timer = job["timer"]
+        result = job["result"]
+
+        response = {
+            "success": True,
+            "count": len(result["results"]),
+            "xRatio": result.get("x_ratio"),
+            "yRatio": result.get("y_ratio"),
+            "previewScale": result.get("preview_scale"),
+            "results": result["results"],
         }
+        if data.get("includeTimings"):
+            response["timings"] = timer.as_milliseconds()
 
-        return jsonify(response)
+        http_response = jsonify(response)
+        http_response.headers["Server-Timing"] = timer.server_timing_header()
+        return http_response
 
+    except JOB_ERRORS as e:
+        return job_error_response(e)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
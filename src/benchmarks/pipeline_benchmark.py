@@ -0,0 +1,239 @@
+"""
+Benchmark suite for the detection and export pipeline
+
+Times every pipeline stage separately on the sample photos in images/ and on
+synthetically upscaled variants, reports throughput and peak traced memory
+and compares against stored baselines. Traced memory counts allocations made
+through Python and NumPy, which covers the arrays OpenCV returns but not the
+scratch buffers it allocates internally.
+
+Usage (from src/):
+    python -m benchmarks.pipeline_benchmark
+    python -m benchmarks.pipeline_benchmark --save-baseline benchmarks/baselines.json
+    python -m benchmarks.pipeline_benchmark --baseline benchmarks/baselines.json --threshold 0.2
+
+Baselines are machine specific, record them on the machine that runs the
+comparison. The process exits with status 1 when a stage regresses beyond the
+threshold in median time or peak traced memory.
+"""
+
+import argparse
+import base64
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import cv2 as cv
+import numpy as np
+
+from detection.drawer_detector import DrawerDetector
+from detection.edge_detecttor import EdgeDetector
+from processors.dxf_processor import contours_to_dxf_bytes
+from processors.image_processor import ImageProcessor
+
+IMAGES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "images")
+SYNTHETIC_MEGAPIXELS = [2, 8, 12, 24]
+
+REAL_WIDTH_MM = 540
+REAL_HEIGHT_MM = 340
+BLUR_KERNEL_SIZE = (5, 5)
+CANNY_LOW = 30
+CANNY_HIGH = 130
+MORPH_KERNEL_SIZE = (5, 5)
+
+# Memory differences below this are noise and never count as regression
+MIN_MEMORY_DELTA = 1024 * 1024
+
+
+def load_cases() -> List[Tuple[str, np.ndarray]]:
+    """Sample photos plus test_1 upscaled to every synthetic size"""
+    cases = []
+    paths = sorted(glob.glob(os.path.join(IMAGES_DIR, "test_*.jpg")))
+    for path in paths:
+        image = cv.imread(path, cv.IMREAD_COLOR)
+        if image is not None:
+            cases.append((os.path.splitext(os.path.basename(path))[0], image))
+
+    if not cases:
+        raise FileNotFoundError(f"No test_*.jpg images found in {IMAGES_DIR}")
+
+    base = cases[0][1]
+    height, width = base.shape[:2]
+    for megapixels in SYNTHETIC_MEGAPIXELS:
+        scale = (megapixels * 1e6 / (width * height)) ** 0.5
+        size = (round(width * scale), round(height * scale))
+        cases.append((f"synthetic_{megapixels}mp", cv.resize(base, size, interpolation=cv.INTER_CUBIC)))
+
+    return cases
+
+
+def default_corners(image: np.ndarray) -> np.ndarray:
+    """Slightly skewed drawer quadrilateral inside the image"""
+    height, width = image.shape[:2]
+    return np.array(
+        [
+            [0.06 * width, 0.05 * height],
+            [0.95 * width, 0.04 * height],
+            [0.97 * width, 0.94 * height],
+            [0.05 * width, 0.96 * height],
+        ]
+    )
+
+
+def measure(function: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """
+    Times function repeat times, then runs it once more under tracemalloc
+    for the peak of memory allocated during the call. OpenCV's internal
+    buffers bypass tracemalloc, so this is a lower bound of the real peak
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median": statistics.median(durations),
+        "min": min(durations),
+        "peakTracedBytes": peak,
+    }
+
+
+def benchmark_case(image: np.ndarray, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Runs every stage benchmark on one image"""
+    corners = DrawerDetector.order_corners(default_corners(image))
+    _, jpeg = cv.imencode(".jpg", image)
+    image_data = "data:image/jpeg;base64," + base64.b64encode(jpeg).decode("utf-8")
+
+    corrected, x_ratio, y_ratio = DrawerDetector.correct_perspective(
+        image, corners, REAL_WIDTH_MM, REAL_HEIGHT_MM
+    )
+    gray = EdgeDetector.to_grayscale(corrected)
+    blurred = EdgeDetector.blur(gray, BLUR_KERNEL_SIZE)
+    edges = EdgeDetector.detect_edges(blurred, CANNY_LOW, CANNY_HIGH)
+    closed = EdgeDetector.close_edges(edges, MORPH_KERNEL_SIZE)
+    contours = EdgeDetector.find_contours(closed)
+
+    stages = {
+        "decode_image": lambda: ImageProcessor.decode_image(image_data),
+        "process_transformations": lambda: ImageProcessor.process_transformations(
+            image, True, 90
+        ),
+        "correct_perspective": lambda: DrawerDetector.correct_perspective(
+            image, corners, REAL_WIDTH_MM, REAL_HEIGHT_MM
+        ),
+        "prepare_image.gray": lambda: EdgeDetector.to_grayscale(corrected),
+        "prepare_image.blur": lambda: EdgeDetector.blur(gray, BLUR_KERNEL_SIZE),
+        "prepare_image.canny": lambda: EdgeDetector.detect_edges(blurred, CANNY_LOW, CANNY_HIGH),
+        "prepare_image.close": lambda: EdgeDetector.close_edges(edges, MORPH_KERNEL_SIZE),
+        "find_contours": lambda: EdgeDetector.find_contours(closed),
+        "contours_to_dxf": lambda: contours_to_dxf_bytes(
+            contours, x_ratio, y_ratio, REAL_WIDTH_MM, REAL_HEIGHT_MM
+        ),
+        "encode_image": lambda: ImageProcessor.encode_image(corrected),
+    }
+
+    megapixels = image.shape[0] * image.shape[1] / 1e6
+    results = {}
+    for name, function in stages.items():
+        result = measure(function, repeat)
+        result["megapixelsPerSecond"] = megapixels / result["median"] if result["median"] else 0.0
+        results[name] = result
+    return results
+
+
+def run(repeat: int) -> Dict[str, Any]:
+    """Benchmarks all cases, keyed by "<case>/<stage>" """
+    results = {}
+    for case_name, image in load_cases():
+        megapixels = image.shape[0] * image.shape[1] / 1e6
+        print(f"{case_name} ({megapixels:.1f} MP)", file=sys.stderr)
+        for stage, result in benchmark_case(image, repeat).items():
+            results[f"{case_name}/{stage}"] = result
+
+    return {
+        "opencv": cv.__version__,
+        "numpy": np.__version__,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Lists every stage slower or more memory hungry than baseline * (1 + threshold)"""
+    regressions = []
+    for key, result in current["results"].items():
+        reference = baseline["results"].get(key)
+        if reference is None:
+            continue
+
+        if result["median"] > reference["median"] * (1 + threshold):
+            regressions.append(
+                f"{key}: median {result['median'] * 1000:.1f} ms, "
+                f"baseline {reference['median'] * 1000:.1f} ms"
+            )
+
+        reference_peak = reference["peakTracedBytes"]
+        memory_limit = max(reference_peak * (1 + threshold), reference_peak + MIN_MEMORY_DELTA)
+        if result["peakTracedBytes"] > memory_limit:
+            regressions.append(
+                f"{key}: traced peak {result['peakTracedBytes'] / 1e6:.1f} MB, "
+                f"baseline {reference_peak / 1e6:.1f} MB"
+            )
+    return regressions
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Human readable table of all results"""
+    print(f"{'case/stage':<52} {'median ms':>10} {'min ms':>10} {'MP/s':>9} {'traced MB':>9}")
+    for key, result in report["results"].items():
+        print(
+            f"{key:<52} {result['median'] * 1000:10.2f} {result['min'] * 1000:10.2f} "
+            f"{result['megapixelsPerSecond']:9.1f} {result['peakTracedBytes'] / 1e6:9.1f}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the detection and export pipeline")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per stage")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed relative regression, 0.2 = 20%%")
+    parser.add_argument("--save-baseline", help="Write results as new baseline JSON")
+    parser.add_argument("--output", help="Write results JSON to this path")
+    args = parser.parse_args()
+
+    report = run(args.repeat)
+    print_report(report)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as output_file:
+                json.dump(report, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Reusable scratch buffers for pipeline stages
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Idle buffers kept by all threads of a process together
+DEFAULT_MAX_BYTES = int(os.environ.get("ALIGNER_BUFFER_POOL_MB", "256")) * 1024 * 1024
+
+BufferKey = Tuple[Tuple[int, ...], str]
+
+
+class ThreadBuffers:
+    """
+    Free lists and byte counters of one thread. Its idle bytes leave the pool
+    total when the thread ends and its lists are dropped
+    """
+
+    def __init__(self, pool: "BufferPool"):
+        self.pool = pool
+        self.free: "OrderedDict[BufferKey, List[np.ndarray]]" = OrderedDict()
+        self.idle_bytes = 0
+        self.allocated_bytes = 0
+        self.reused_bytes = 0
+
+    def __del__(self):
+        self.pool._forget_idle(self.idle_bytes)
+
+
+class BufferPool:
+    """
+    Per thread free lists of arrays keyed by shape and dtype. Stages take a
+    buffer, let OpenCV write into it through dst= and give it back once the
+    next stage consumed it. Every thread has its own lists, only the shared
+    byte counters take a lock
+
+    Reuse across requests needs a long-lived thread: the worker processes of
+    serve.py run every job on the same thread, so steady traffic of similar
+    images stops allocating there. The threaded development server starts a
+    thread per request, its lists are dropped with the thread and only
+    buffers released and taken again within one request are reused
+
+    Args:
+        max_bytes: Idle buffer bytes kept by all threads together. A release
+            that exceeds it drops the least recently released buffers of
+            the releasing thread
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.idle_bytes = 0
+        self.allocated_bytes = 0
+        self.reused_bytes = 0
+
+    def _buffers(self) -> ThreadBuffers:
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = ThreadBuffers(self)
+        return buffers
+
+    def _forget_idle(self, nbytes: int) -> None:
+        with self._lock:
+            self.idle_bytes -= nbytes
+
+    def acquire(self, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """Uninitialized array of shape and dtype, reused when one is free"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        local = self._buffers()
+        free_buffers = local.free.get(key)
+        if free_buffers:
+            buffer = free_buffers.pop()
+            if not free_buffers:
+                del local.free[key]
+            local.idle_bytes -= buffer.nbytes
+            local.reused_bytes += buffer.nbytes
+            with self._lock:
+                self.idle_bytes -= buffer.nbytes
+                self.reused_bytes += buffer.nbytes
+            return buffer
+
+        buffer = np.empty(shape, dtype)
+        local.allocated_bytes += buffer.nbytes
+        with self._lock:
+            self.allocated_bytes += buffer.nbytes
+        return buffer
+
+    def release(self, *buffers: np.ndarray) -> None:
+        """Returns buffers from acquire, they must not be used afterwards"""
+        local = self._buffers()
+        released = 0
+        for buffer in buffers:
+            key = (buffer.shape, buffer.dtype.str)
+            local.free.setdefault(key, []).append(buffer)
+            local.free.move_to_end(key)
+            released += buffer.nbytes
+        local.idle_bytes += released
+
+        with self._lock:
+            self.idle_bytes += released
+            while self.idle_bytes > self.max_bytes and local.free:
+                key, oldest = next(iter(local.free.items()))
+                dropped = oldest.pop(0).nbytes
+                if not oldest:
+                    del local.free[key]
+                local.idle_bytes -= dropped
+                self.idle_bytes -= dropped
+
+    def thread_counters(self) -> Tuple[int, int]:
+        """(allocated, reused) bytes of the calling thread so far"""
+        local = self._buffers()
+        return local.allocated_bytes, local.reused_bytes
+
+    def stats(self) -> Dict[str, int]:
+        """Allocated and reused bytes of all threads, plus the idle bytes held"""
+        with self._lock:
+            return {
+                "allocatedBytes": self.allocated_bytes,
+                "reusedBytes": self.reused_bytes,
+                "idleBytes": self.idle_bytes,
+                "maxBytes": self.max_bytes,
+            }
+
+
+# Pool of this process, each worker process gets its own
+buffer_pool = BufferPool()
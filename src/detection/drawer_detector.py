@@ -2,7 +2,7 @@
 Drawer detection and perspective correction module
 """
 
-from typing import Tuple
+from typing import Optional, Tuple
 import cv2 as cv
 import numpy as np
 
@@ -93,31 +93,41 @@ class DrawerDetector:
         return x_ratio, y_ratio
 
     @staticmethod
-    def correct_perspective(
-        image: np.ndarray,
-        corners: np.ndarray,
-        real_width_mm: float,
-        real_height_mm: float,
-    ) -> Tuple[np.ndarray, float, float]:
+    def get_target_size(
+        corners: np.ndarray, real_width_mm: float, real_height_mm: float
+    ) -> Tuple[int, int]:
         """
-        Corrects perspective distortion in image based on drawer corners
+        Calculates the size of the perspective corrected image
 
         Args:
-            image: Original image
             corners: Ordered corners array
             real_width_mm: Actual drawer width in mm
             real_height_mm: Actual drawer height in mm
 
         Returns:
-            Tuple of (corrected_image, x_ratio, y_ratio)
+            Tuple of (width_px, height_px)
         """
         x_ratio, y_ratio = DrawerDetector.calculate_axis_ratios(
             corners, real_width_mm, real_height_mm
         )
 
-        target_width_px = int(real_width_mm * x_ratio)
-        target_height_px = int(real_height_mm * y_ratio)
+        return int(real_width_mm * x_ratio), int(real_height_mm * y_ratio)
+
+    @staticmethod
+    def get_perspective_matrix(
+        corners: np.ndarray, target_width_px: int, target_height_px: int
+    ) -> np.ndarray:
+        """
+        Homography mapping the drawer corners onto the corrected image
+
+        Args:
+            corners: Ordered corners array
+            target_width_px: Width of the corrected image
+            target_height_px: Height of the corrected image
 
+        Returns:
+            3x3 perspective matrix
+        """
         # Destination points: Rectangle
         dst_points = np.array(
             [
@@ -131,7 +141,85 @@ class DrawerDetector:
 
         src_point = corners.astype(np.float32)
 
-        perspective_matrix = cv.getPerspectiveTransform(src_point, dst_points)
+        return cv.getPerspectiveTransform(src_point, dst_points)
+
+    @staticmethod
+    def get_quad_roi(
+        corners: np.ndarray, image_shape: Tuple[int, ...]
+    ) -> Tuple[int, int, int, int]:
+        """
+        Bounding box of the drawer corners clipped to the image
+
+        Returns:
+            Tuple of (x_min, y_min, x_max, y_max), max values exclusive
+        """
+        height, width = image_shape[:2]
+        x_min, y_min = np.floor(corners.min(axis=0)).astype(int)
+        x_max, y_max = np.ceil(corners.max(axis=0)).astype(int) + 1
+
+        return (
+            int(np.clip(x_min, 0, width)),
+            int(np.clip(y_min, 0, height)),
+            int(np.clip(x_max, 0, width)),
+            int(np.clip(y_max, 0, height)),
+        )
+
+    @staticmethod
+    def get_quad_mask(corners: np.ndarray, roi: Tuple[int, int, int, int]) -> np.ndarray:
+        """
+        Mask of the drawer quadrilateral inside its bounding box
+
+        Args:
+            corners: Ordered corners array in image coordinates
+            roi: Bounding box from get_quad_roi
+
+        Returns:
+            uint8 mask, 255 inside the drawer
+        """
+        x_min, y_min, x_max, y_max = roi
+        mask = np.zeros((y_max - y_min, x_max - x_min), np.uint8)
+        points = np.round(corners - (x_min, y_min)).astype(np.int32)
+        cv.fillConvexPoly(mask, points, 255)
+        return mask
+
+    @staticmethod
+    def correct_perspective(
+        image: np.ndarray,
+        corners: np.ndarray,
+        real_width_mm: float,
+        real_height_mm: float,
+        scale: float = 1.0,
+        source_transform: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, float, float]:
+        """
+        Corrects perspective distortion in image based on drawer corners
+
+        Args:
+            image: Original image
+            corners: Ordered corners array
+            real_width_mm: Actual drawer width in mm
+            real_height_mm: Actual drawer height in mm
+            scale: Output size relative to the full resolution correction,
+                used for preview proxies
+            source_transform: 3x3 matrix from image pixels to the frame of
+                corners (mirroring/rotation), applied in the same warp
+
+        Returns:
+            Tuple of (corrected_image, x_ratio, y_ratio)
+        """
+        target_width_px, target_height_px = DrawerDetector.get_target_size(
+            corners, real_width_mm, real_height_mm
+        )
+
+        if scale != 1.0:
+            target_width_px = max(1, int(target_width_px * scale))
+            target_height_px = max(1, int(target_height_px * scale))
+
+        perspective_matrix = DrawerDetector.get_perspective_matrix(
+            corners, target_width_px, target_height_px
+        )
+        if source_transform is not None:
+            perspective_matrix = perspective_matrix @ source_transform
 
         corrected_image = cv.warpPerspective(
             image, perspective_matrix, (target_width_px, target_height_px)
@@ -148,6 +236,8 @@ class DrawerDetector:
         corners: np.ndarray,
         real_width_mm: float,
         real_height_mm: float,
+        scale: float = 1.0,
+        source_transform: Optional[np.ndarray] = None,
     ) -> Tuple[np.ndarray, float, float]:
         """
         Complete drawer processing workflow: orders corners, calculates ratios,
@@ -158,6 +248,8 @@ class DrawerDetector:
             corners: Unordered corners array
             real_width_mm: Drawer width in mm
             real_height_mm: Drawer height in mm
+            scale: Output size relative to the full resolution correction
+            source_transform: Matrix from image pixels to the corner frame
 
         Returns:
             Tuple of (corrected_image, x_ratio, y_ratio)
@@ -167,7 +259,7 @@ class DrawerDetector:
         ordered_corners = DrawerDetector.order_corners(corners)
 
         corrected_image, x_ratio, y_ratio = DrawerDetector.correct_perspective(
-            image, ordered_corners, real_width_mm, real_height_mm
+            image, ordered_corners, real_width_mm, real_height_mm, scale, source_transform
         )
 
         return corrected_image, x_ratio, y_ratio
@@ -2,16 +2,54 @@
 Edge detection processor module for finding edges and contours in images
 """
 
-from typing import List, Tuple
+import os
+from typing import Hashable, Optional, Tuple
 import numpy as np
 import cv2 as cv
 
+from detection.buffer_pool import BufferPool, buffer_pool
+from detection.packed_contours import PackedContours
+from detection.stage_cache import StageCache
+from monitoring.timing import StageTimer
+
+# Uncached images from this size on run through the tiled engine, 0 disables it
+TILED_MIN_PIXELS = int(float(os.environ.get("ALIGNER_TILED_MIN_MP", "24")) * 1e6)
+
 
 class EdgeDetector:
     """
     Handles edge detection operations on images
     """
 
+    @staticmethod
+    def to_grayscale(image: np.ndarray, dst: Optional[np.ndarray] = None) -> np.ndarray:
+        """Convert BGR image to grayscale, single channel images are returned as is"""
+        if image.ndim == 2:
+            return image
+        return cv.cvtColor(image, cv.COLOR_BGR2GRAY, dst=dst)
+
+    @staticmethod
+    def blur(
+        gray_image: np.ndarray, blur_kernel_size: Tuple[int, int], dst: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Apply gaussian blur"""
+        return cv.GaussianBlur(gray_image, tuple(blur_kernel_size), 0, dst=dst)
+
+    @staticmethod
+    def detect_edges(
+        blurred_image: np.ndarray, canny_low: int, canny_high: int, dst: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Detect edges using Canny"""
+        return cv.Canny(blurred_image, canny_low, canny_high, edges=dst)
+
+    @staticmethod
+    def close_edges(
+        edges_image: np.ndarray, morph_kernel_size: Tuple[int, int], dst: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Apply morphological closing, joins nearby edge fragments"""
+        kernel = cv.getStructuringElement(cv.MORPH_RECT, tuple(morph_kernel_size))
+        return cv.morphologyEx(edges_image, cv.MORPH_CLOSE, kernel, dst=dst)
+
     @staticmethod
     def prepare_image(
         image: np.ndarray,
@@ -19,46 +57,173 @@ class EdgeDetector:
         canny_low: int = 30,
         canny_high: int = 130,
         morph_kernel_size: Tuple[int, int] = (5, 5),
+        cache: Optional[StageCache] = None,
+        cache_key: Optional[Hashable] = None,
+        timer: Optional[StageTimer] = None,
     ) -> np.ndarray:
         """
         Prepares an image for contour detection by applying various filters
+
+        When cache and cache_key are given, every stage output is memoized by
+        cache_key (identifying the input image) plus the parameters of that
+        stage and all stages before it. Computed stages are recorded as
+        gray, blur, canny and close spans on timer
+
+        Without a cache the intermediate stages write into buffers of the
+        process buffer pool, only the closed output is a new array. Large
+        images without a cache go through TiledEdgeDetector, which gives the
+        same output with less memory and on several threads
+        """
+        if cache is None or cache_key is None:
+            if 0 < TILED_MIN_PIXELS <= image.shape[0] * image.shape[1]:
+                # Imported here, the tiled engine is built on this class
+                from detection.tiled_edge_detector import TiledEdgeDetector
+
+                return TiledEdgeDetector.prepare_image(
+                    image,
+                    blur_kernel_size,
+                    canny_low,
+                    canny_high,
+                    morph_kernel_size,
+                    timer=timer,
+                )
+            return EdgeDetector.prepare_pooled(
+                image, blur_kernel_size, canny_low, canny_high, morph_kernel_size, timer=timer
+            )
+        if timer is None:
+            timer = StageTimer()
+
+        blur_kernel_size = tuple(blur_kernel_size)
+        morph_kernel_size = tuple(morph_kernel_size)
+
+        gray_key = (cache_key,)
+        blur_key = gray_key + (blur_kernel_size,)
+        canny_key = blur_key + (canny_low, canny_high)
+        closed_key = canny_key + (morph_kernel_size,)
+
+        def gray():
+            with timer.span("gray"):
+                return EdgeDetector.to_grayscale(image)
+
+        def blurred():
+            gray_image = cache.get_or_compute("gray", gray_key, gray)
+            with timer.span("blur"):
+                return EdgeDetector.blur(gray_image, blur_kernel_size)
+
+        def edges():
+            blurred_image = cache.get_or_compute("blur", blur_key, blurred)
+            with timer.span("canny"):
+                return EdgeDetector.detect_edges(blurred_image, canny_low, canny_high)
+
+        def closed():
+            edges_image = cache.get_or_compute("canny", canny_key, edges)
+            with timer.span("close"):
+                return EdgeDetector.close_edges(edges_image, morph_kernel_size)
+
+        return cache.get_or_compute("close", closed_key, closed)
+
+    @staticmethod
+    def prepare_pooled(
+        image: np.ndarray,
+        blur_kernel_size: Tuple[int, int] = (5, 5),
+        canny_low: int = 30,
+        canny_high: int = 130,
+        morph_kernel_size: Tuple[int, int] = (5, 5),
+        pool: BufferPool = buffer_pool,
+        timer: Optional[StageTimer] = None,
+    ) -> np.ndarray:
         """
+        prepare_image without a cache, gray, blurred and Canny images live in
+        pool buffers (Canny reuses the gray one) and are released afterwards
+        """
+        if timer is None:
+            timer = StageTimer()
+
+        shape = image.shape[:2]
+        scratch = []
+        try:
+            with timer.span("gray"):
+                if image.ndim == 2:
+                    gray_image = image
+                else:
+                    gray_image = EdgeDetector.to_grayscale(image, pool.acquire(shape))
+                    scratch.append(gray_image)
+
+            with timer.span("blur"):
+                blurred_image = EdgeDetector.blur(
+                    gray_image, blur_kernel_size, pool.acquire(shape)
+                )
+                scratch.append(blurred_image)
 
-        # Convert to grayscale
-        gray_image = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
+            with timer.span("canny"):
+                if gray_image is image:
+                    edges_image = pool.acquire(shape)
+                    scratch.append(edges_image)
+                else:
+                    # The gray image is consumed by the blur, reuse its buffer
+                    edges_image = gray_image
+                EdgeDetector.detect_edges(blurred_image, canny_low, canny_high, edges_image)
 
-        # Apply gaussian blur
-        blurred_image = cv.GaussianBlur(gray_image, blur_kernel_size, 0)
+            with timer.span("close"):
+                return EdgeDetector.close_edges(
+                    edges_image, morph_kernel_size, np.empty(shape, np.uint8)
+                )
+        finally:
+            pool.release(*scratch)
 
-        # Detects edges using Canny
-        edges_image = cv.Canny(blurred_image, canny_low, canny_high)
+    @staticmethod
+    def scale_settings(settings: dict, scale: float) -> dict:
+        """
+        Scales process_image keyword arguments for an image resized by scale,
+        so a preview proxy finds roughly the same contours as the full image
+        """
+        if scale == 1.0:
+            return dict(settings)
 
-        # Apply morhpological closing
-        kernel = cv.getStructuringElement(cv.MORPH_RECT, morph_kernel_size)
-        closed_edges = cv.morphologyEx(edges_image, cv.MORPH_CLOSE, kernel)
+        def scale_kernel(size: Tuple[int, int], odd: bool) -> Tuple[int, int]:
+            scaled = []
+            for value in size:
+                value = max(1, round(value * scale))
+                if odd and value % 2 == 0:
+                    value += 1
+                scaled.append(value)
+            return tuple(scaled)
 
-        return closed_edges
+        scaled = dict(settings)
+        if "blur_kernel_size" in settings:
+            # Gaussian kernels have to stay odd
+            scaled["blur_kernel_size"] = scale_kernel(settings["blur_kernel_size"], True)
+        if "morph_kernel_size" in settings:
+            scaled["morph_kernel_size"] = scale_kernel(settings["morph_kernel_size"], False)
+        if "min_contour_area" in settings:
+            scaled["min_contour_area"] = settings["min_contour_area"] * scale * scale
+        return scaled
 
     @staticmethod
-    def find_contours(image: np.ndarray, min_area: float = 1000) -> List[np.ndarray]:
+    def find_contours(image: np.ndarray, min_area: Optional[float] = 1000) -> PackedContours:
         """
-        Finds contours in a binary image and filters by minimum area
+        Finds contours in a binary image and filters by minimum area, None
+        keeps all of them
         """
         contours, _ = cv.findContours(image, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
-        filtered_contours = [cnt for cnt in contours if cv.contourArea(cnt) > min_area]
-        return filtered_contours
+        packed = PackedContours.from_contours(contours)
+        if min_area is None:
+            return packed
+        return packed.filter(packed.areas() > min_area)
 
     @staticmethod
     def draw_contours(
         image: np.ndarray,
-        contours: List[np.ndarray],
+        contours: PackedContours,
         thickness: int = 3,
+        in_place: bool = False,
     ) -> np.ndarray:
         """
-        Draws contours on the original image
+        Draws contours on the original image, or directly on image with
+        in_place when the caller no longer needs it
         """
-        result = image.copy()
-        cv.drawContours(result, contours, -1, (0, 255, 0), thickness)
+        result = image if in_place else image.copy()
+        cv.drawContours(result, contours.to_list(), -1, (0, 255, 0), thickness)
         return result
 
     @staticmethod
@@ -66,14 +231,24 @@ class EdgeDetector:
         image: np.ndarray,
         min_contour_area: float = 1000,
         return_edges: bool = False,
+        draw: bool = True,
         blur_kernel_size: Tuple[int, int] = (5, 5),
         canny_low: int = 30,
         canny_high: int = 130,
         morph_kernel_size: Tuple[int, int] = (5, 5),
+        cache: Optional[StageCache] = None,
+        cache_key: Optional[Hashable] = None,
+        timer: Optional[StageTimer] = None,
     ) -> dict:
         """
         Complete edge detection, all in one
+
+        With a cache the unfiltered contours are memoized next to the edge
+        stages, a change of min_contour_area alone only refilters them
         """
+        if timer is None:
+            timer = StageTimer()
+
         # Process the image to find edges
         edge_image = EdgeDetector.prepare_image(
             image,
@@ -81,13 +256,36 @@ class EdgeDetector:
             canny_low=canny_low,
             canny_high=canny_high,
             morph_kernel_size=morph_kernel_size,
+            cache=cache,
+            cache_key=cache_key,
+            timer=timer,
         )
 
         # Find contours
-        contours = EdgeDetector.find_contours(edge_image, min_contour_area)
+        def all_contours():
+            with timer.span("contours"):
+                return EdgeDetector.find_contours(edge_image, None)
+
+        if cache is not None and cache_key is not None:
+            contours_key = (
+                cache_key,
+                tuple(blur_kernel_size),
+                canny_low,
+                canny_high,
+                tuple(morph_kernel_size),
+            )
+            found = cache.get_or_compute("contours", contours_key, all_contours)
+        else:
+            found = all_contours()
+
+        with timer.span("filter"):
+            contours = found.filter(found.areas() > min_contour_area)
 
-        # Draw contours on original image
-        contoured_image = EdgeDetector.draw_contours(image, contours)
+        # Draw contours on original image, skipped when nobody needs it
+        contoured_image = None
+        if draw:
+            with timer.span("draw"):
+                contoured_image = EdgeDetector.draw_contours(image, contours)
 
         # Prepare result dictionary
         result = {"contoured_image": contoured_image, "contours": contours}
@@ -0,0 +1,270 @@
+"""
+Packed contour storage: all vertices in one buffer plus offsets
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import cv2 as cv
+import numpy as np
+
+# Binary contour encodings, mapped to their MIME types
+CONTOUR_MIME_TYPES = {
+    "packed": "application/x-contours-packed",
+    "delta": "application/x-contours-delta",
+}
+
+# Longest varint of a 64 bit value
+MAX_VARINT_BYTES = 10
+
+
+def encode_varints(values: np.ndarray) -> bytes:
+    """Unsigned LEB128 encoding of a uint64 array, vectorized per byte position"""
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), np.int64)
+    for position in range(1, MAX_VARINT_BYTES):
+        lengths += values >= np.uint64(1) << np.uint64(7 * position)
+    starts = np.cumsum(lengths) - lengths
+
+    encoded = np.empty(int(lengths.sum()), np.uint8)
+    for position in range(int(lengths.max(initial=0))):
+        selected = lengths > position
+        chunk = (values[selected] >> np.uint64(7 * position)) & np.uint64(0x7F)
+        more = (lengths[selected] > position + 1).astype(np.uint64) << np.uint64(7)
+        encoded[starts[selected] + position] = chunk | more
+    return encoded.tobytes()
+
+
+def decode_varints(body: bytes) -> np.ndarray:
+    """Inverse of encode_varints"""
+    encoded = np.frombuffer(body, np.uint8)
+    ends = np.flatnonzero(encoded < 0x80)
+    if len(ends) == 0 or ends[-1] != len(encoded) - 1:
+        raise ValueError("Truncated varint data")
+
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    value_index = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shifts = 7 * (np.arange(len(encoded)) - starts[value_index])
+    if shifts.max(initial=0) >= 64:
+        raise ValueError("Varint longer than 64 bits")
+
+    values = np.zeros(len(ends), np.uint64)
+    np.bitwise_or.at(
+        values, value_index, (encoded & 0x7F).astype(np.uint64) << shifts.astype(np.uint64)
+    )
+    return values
+
+
+class PackedContours:
+    """
+    Contours stored as one contiguous (M, 2) float32 vertex buffer and an
+    offsets array, contour i owns vertices[offsets[i]:offsets[i + 1]].
+    Per contour measurements are computed for all contours at once
+
+    Args:
+        vertices: (M, 2) vertex coordinates in pixels
+        offsets: (K + 1,) start index of every contour plus the total count
+    """
+
+    def __init__(self, vertices: np.ndarray, offsets: np.ndarray):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 2)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @staticmethod
+    def from_contours(contours: Sequence[np.ndarray]) -> "PackedContours":
+        """Packs OpenCV style (N, 1, 2) contour arrays"""
+        if len(contours) == 0:
+            return PackedContours(np.empty((0, 2), np.float32), np.zeros(1, np.int64))
+
+        point_arrays = [np.asarray(contour).reshape(-1, 2) for contour in contours]
+        offsets = np.zeros(len(point_arrays) + 1, np.int64)
+        np.cumsum([len(points) for points in point_arrays], out=offsets[1:])
+        return PackedContours(np.concatenate(point_arrays), offsets)
+
+    @staticmethod
+    def concatenate(parts: Sequence["PackedContours"]) -> "PackedContours":
+        """All contours of parts in one instance, in order"""
+        if len(parts) == 0:
+            return PackedContours(np.empty((0, 2), np.float32), np.zeros(1, np.int64))
+
+        counts = np.concatenate([part.counts for part in parts])
+        offsets = np.zeros(len(counts) + 1, np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return PackedContours(np.concatenate([part.vertices for part in parts]), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def counts(self) -> np.ndarray:
+        """Vertex count per contour"""
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        return self.vertices.nbytes + self.offsets.nbytes
+
+    def contour(self, index: int) -> np.ndarray:
+        """(N, 2) view of the vertices of one contour"""
+        return self.vertices[self.offsets[index]:self.offsets[index + 1]]
+
+    def split(self) -> List[np.ndarray]:
+        """(N, 2) views of the vertices of every contour"""
+        return np.split(self.vertices, self.offsets[1:-1])
+
+    def to_list(self) -> List[np.ndarray]:
+        """OpenCV style (N, 1, 2) int32 contours, e.g. for cv.drawContours"""
+        points = np.round(self.vertices).astype(np.int32).reshape(-1, 1, 2)
+        return np.split(points, self.offsets[1:-1])
+
+    def _next_indices(self) -> np.ndarray:
+        """Index of the following vertex, wrapping to the start of each contour"""
+        next_indices = np.arange(1, len(self.vertices) + 1)
+        next_indices[self.offsets[1:] - 1] = self.offsets[:-1]
+        return next_indices
+
+    def _sum_per_contour(self, values: np.ndarray) -> np.ndarray:
+        # Contours without vertices would break reduceat, findContours never returns them
+        return np.add.reduceat(values, self.offsets[:-1])
+
+    def areas(self) -> np.ndarray:
+        """Enclosed area per contour (shoelace formula, as cv.contourArea)"""
+        if len(self) == 0:
+            return np.empty(0, np.float64)
+
+        points = self.vertices.astype(np.float64)
+        following = points[self._next_indices()]
+        cross = points[:, 0] * following[:, 1] - following[:, 0] * points[:, 1]
+        return np.abs(self._sum_per_contour(cross)) * 0.5
+
+    def lengths(self) -> np.ndarray:
+        """Closed outline length per contour"""
+        if len(self) == 0:
+            return np.empty(0, np.float64)
+
+        points = self.vertices.astype(np.float64)
+        segments = np.linalg.norm(points[self._next_indices()] - points, axis=1)
+        return self._sum_per_contour(segments)
+
+    def bounding_boxes(self) -> np.ndarray:
+        """(K, 4) array of x_min, y_min, x_max, y_max per contour"""
+        if len(self) == 0:
+            return np.empty((0, 4), np.float32)
+
+        starts = self.offsets[:-1]
+        return np.hstack(
+            (
+                np.minimum.reduceat(self.vertices, starts),
+                np.maximum.reduceat(self.vertices, starts),
+            )
+        )
+
+    def filter(self, mask: np.ndarray) -> "PackedContours":
+        """Contours selected by a boolean mask of length len(self)"""
+        mask = np.asarray(mask, dtype=bool)
+        counts = self.counts[mask]
+        offsets = np.zeros(len(counts) + 1, np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return PackedContours(self.vertices[np.repeat(mask, self.counts)], offsets)
+
+    def scaled(self, x_scale: float, y_scale: Optional[float] = None) -> "PackedContours":
+        """Contours with coordinates multiplied by x_scale and y_scale"""
+        if y_scale is None:
+            y_scale = x_scale
+        return PackedContours(
+            self.vertices * np.array([x_scale, y_scale], np.float32), self.offsets
+        )
+
+    def simplify(self, tolerance_mm: float, x_ratio: float, y_ratio: float) -> "PackedContours":
+        """
+        Douglas-Peucker simplification with a tolerance in millimetres
+
+        Vertices are converted to mm with the pixel/mm ratios first, so the
+        tolerance is the same in both directions even when x_ratio != y_ratio
+
+        Args:
+            tolerance_mm: Maximum distance of the simplified outline from the
+                original one
+            x_ratio: Pixels per mm horizontally
+            y_ratio: Pixels per mm vertically
+        """
+        if tolerance_mm <= 0 or len(self) == 0:
+            return self
+
+        mm_per_px = np.array([1.0 / x_ratio, 1.0 / y_ratio], np.float32)
+        points_mm = self.vertices * mm_per_px
+
+        simplified = [
+            cv.approxPolyDP(points_mm[start:end].reshape(-1, 1, 2), tolerance_mm, True)
+            for start, end in zip(self.offsets[:-1], self.offsets[1:])
+        ]
+        packed = PackedContours.from_contours(simplified)
+        packed.vertices /= mm_per_px
+        return packed
+
+    def encode(self, contour_format: str = "packed") -> bytes:
+        """
+        Compact binary form of the contours, e.g. for drawing overlays on
+        the client
+
+        "packed": little endian uint32 contour count, uint32 vertex count
+        per contour, then float32 x, y per vertex.
+        "delta": varints of the contour count and vertex counts, then the
+        zigzag varints of x, y per vertex rounded to whole pixels, the first
+        vertex of a contour absolute and the others relative to the previous
+        vertex. Typically 2-3 bytes per vertex
+        """
+        if contour_format == "packed":
+            header = np.concatenate(([len(self)], self.counts)).astype("<u4")
+            return header.tobytes() + self.vertices.astype("<f4").tobytes()
+
+        if contour_format == "delta":
+            points = np.round(self.vertices).astype(np.int64)
+            deltas = points.copy()
+            deltas[1:] -= points[:-1]
+            starts = self.offsets[:-1][self.counts > 0]
+            deltas[starts] = points[starts]
+            zigzag = (deltas << 1) ^ (deltas >> 63)
+            return encode_varints(
+                np.concatenate(([len(self)], self.counts, zigzag.reshape(-1))).astype(np.uint64)
+            )
+
+        raise ValueError(f"Unsupported contour format: {contour_format}")
+
+    @staticmethod
+    def decode(body: bytes, contour_format: str = "packed") -> "PackedContours":
+        """Inverse of encode, "delta" restores the rounded coordinates"""
+        if contour_format == "packed":
+            count = int(np.frombuffer(body, "<u4", count=1)[0])
+            counts = np.frombuffer(body, "<u4", count=count, offset=4)
+            vertices = np.frombuffer(body, "<f4", offset=4 * (count + 1))
+        elif contour_format == "delta":
+            values = decode_varints(body)
+            count = int(values[0])
+            counts = values[1:count + 1]
+            deltas = values[count + 1:].astype(np.int64)
+            deltas = ((deltas >> 1) ^ -(deltas & 1)).reshape(-1, 2)
+            vertices = None
+        else:
+            raise ValueError(f"Unsupported contour format: {contour_format}")
+
+        offsets = np.zeros(count + 1, np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        if contour_format == "delta":
+            # Running sum restarting at every contour start
+            totals = np.cumsum(deltas, axis=0)
+            starts = offsets[:-1][counts > 0]
+            restart = totals[starts] - deltas[starts]
+            vertices = totals - np.repeat(restart, counts[counts > 0].astype(np.int64), axis=0)
+
+        if len(vertices.reshape(-1, 2)) != offsets[-1]:
+            raise ValueError("Contour data does not match the vertex counts")
+        return PackedContours(vertices, offsets)
+
+    def to_mm(
+        self, x_ratio: float, y_ratio: float, origin: Tuple[float, float] = (0, 0)
+    ) -> np.ndarray:
+        """(M, 2) float64 vertices in mm with the y axis pointing up"""
+        # Flipping y axis, since CV2 uses top left origin, ezdxf uses bottom left
+        return self.vertices.astype(np.float64) / np.array([x_ratio, -y_ratio]) + np.asarray(
+            origin, dtype=np.float64
+        )
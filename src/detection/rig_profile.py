@@ -0,0 +1,320 @@
+"""
+Fixed camera rig profiles
+
+Photos from a fixed camera stand share corners, real dimensions and image
+size. A rig profile precomputes the full perspective mapping (including
+mirroring and rotation) once as fixed-point remap tables, later photos of
+the rig are corrected with a plain cv.remap
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2 as cv
+import numpy as np
+
+from detection.drawer_detector import DrawerDetector
+
+DEFAULT_DIRECTORY = os.environ.get(
+    "ALIGNER_RIG_DIR", os.path.join(tempfile.gettempdir(), "aligner-rigs")
+)
+
+RIG_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class RigProfile:
+    """
+    Geometry of one rig plus its remap tables
+
+    Args:
+        rig_id: Profile name, letters, digits, "_" and "-"
+        image_size: (width, height) of the rig photos
+        coordinates: Drawer corners as in /process-image, they refer to the
+            mirrored/rotated photo
+        real_width_mm: Drawer width in mm
+        real_height_mm: Drawer height in mm
+        transformations: {"mirrored": bool, "rotation": int}
+        source_transform: Matrix from photo pixels to the mirrored/rotated
+            frame of the coordinates, ImageProcessor.get_transformation_matrix
+            of the transformations
+        maps: (map1, map2) from build_maps, computed when omitted
+    """
+
+    def __init__(
+        self,
+        rig_id: str,
+        image_size: Tuple[int, int],
+        coordinates: List[Dict[str, float]],
+        real_width_mm: float,
+        real_height_mm: float,
+        transformations: Dict[str, Any],
+        source_transform: np.ndarray,
+        maps: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    ):
+        if not RIG_ID_PATTERN.match(rig_id):
+            raise ValueError(f"Invalid rig id: {rig_id}")
+
+        self.rig_id = rig_id
+        self.image_size = (int(image_size[0]), int(image_size[1]))
+        self.coordinates = [{"x": float(point["x"]), "y": float(point["y"])} for point in coordinates]
+        self.real_width_mm = float(real_width_mm)
+        self.real_height_mm = float(real_height_mm)
+        self.transformations = {
+            "mirrored": bool(transformations.get("mirrored", False)),
+            "rotation": int(transformations.get("rotation", 0)),
+        }
+        self.source_transform = np.asarray(source_transform, np.float64)
+
+        self.corners = DrawerDetector.order_corners(
+            np.array([[point["x"], point["y"]] for point in self.coordinates], np.float64)
+        )
+        self.target_size = DrawerDetector.get_target_size(
+            self.corners, self.real_width_mm, self.real_height_mm
+        )
+        self.maps = maps if maps is not None else self.build_maps()
+
+    def scaled_target_size(self, scale: float = 1.0) -> Tuple[int, int]:
+        """Corrected image size at scale, rounded as in correct_perspective"""
+        if scale == 1.0:
+            return self.target_size
+        return (
+            max(1, int(self.target_size[0] * scale)),
+            max(1, int(self.target_size[1] * scale)),
+        )
+
+    def build_maps(self, scale: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fixed-point remap tables (CV_16SC2 plus interpolation weights) of the
+        homography composed with the mirror/rotation matrix. With identity
+        camera matrices initUndistortRectifyMap maps every target pixel
+        through the inverse of the given transform
+
+        Args:
+            scale: Output size relative to the full resolution correction
+        """
+        target_width, target_height = self.scaled_target_size(scale)
+        matrix = (
+            DrawerDetector.get_perspective_matrix(self.corners, target_width, target_height)
+            @ self.source_transform
+        )
+        return cv.initUndistortRectifyMap(
+            np.eye(3), None, matrix, np.eye(3), (target_width, target_height), cv.CV_16SC2
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return self.maps[0].nbytes + self.maps[1].nbytes
+
+    @property
+    def ratios(self) -> Tuple[float, float]:
+        """Pixels per mm of the corrected image"""
+        return (
+            self.target_size[0] / self.real_width_mm,
+            self.target_size[1] / self.real_height_mm,
+        )
+
+    def matches(self, image: np.ndarray) -> bool:
+        """True when image has the rig photo size"""
+        return (image.shape[1], image.shape[0]) == self.image_size
+
+    def correct(self, image: np.ndarray) -> Tuple[np.ndarray, float, float]:
+        """
+        DrawerDetector.process_drawer_image with the rig geometry, through
+        the precomputed tables. Equivalent up to interpolation precision:
+        the fixed-point tables round source positions to 1/32 pixel, which
+        moves a few percent of the pixels by a few grey levels
+
+        Returns:
+            Tuple of (corrected_image, x_ratio, y_ratio)
+        """
+        if not self.matches(image):
+            raise ValueError(
+                f"Image is {image.shape[1]}x{image.shape[0]}, rig {self.rig_id} expects "
+                f"{self.image_size[0]}x{self.image_size[1]}"
+            )
+        corrected_image = cv.remap(image, self.maps[0], self.maps[1], cv.INTER_LINEAR)
+        return (corrected_image, *self.ratios)
+
+    def request_fields(self) -> Dict[str, Any]:
+        """Geometry as /process-image request fields"""
+        return {
+            "coordinates": [dict(point) for point in self.coordinates],
+            "realWidthMm": self.real_width_mm,
+            "realHeightMm": self.real_height_mm,
+            "transformations": dict(self.transformations),
+        }
+
+    def describe(self) -> Dict[str, Any]:
+        """JSON description without the tables"""
+        return {
+            "rigId": self.rig_id,
+            "imageWidth": self.image_size[0],
+            "imageHeight": self.image_size[1],
+            "targetWidth": self.target_size[0],
+            "targetHeight": self.target_size[1],
+            "mapBytes": self.nbytes,
+            **self.request_fields(),
+        }
+
+    def save(self, directory: str) -> None:
+        """Writes <rig_id>.json and <rig_id>.npz, each replaced atomically"""
+        os.makedirs(directory, exist_ok=True)
+        metadata = self.describe()
+        for suffix, write in (
+            (
+                ".npz",
+                lambda handle: np.savez(
+                    handle,
+                    map1=self.maps[0],
+                    map2=self.maps[1],
+                    source_transform=self.source_transform,
+                ),
+            ),
+            (".json", lambda handle: handle.write(json.dumps(metadata).encode("utf-8"))),
+        ):
+            handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(handle, "wb") as temp_file:
+                write(temp_file)
+            os.replace(temp_path, os.path.join(directory, self.rig_id + suffix))
+
+    @staticmethod
+    def load(directory: str, rig_id: str) -> "RigProfile":
+        """Reads a profile written by save"""
+        with open(os.path.join(directory, rig_id + ".json"), "r", encoding="utf-8") as meta_file:
+            metadata = json.load(meta_file)
+        with np.load(os.path.join(directory, rig_id + ".npz"), allow_pickle=False) as stored:
+            maps = (stored["map1"], stored["map2"])
+            source_transform = stored["source_transform"]
+
+        profile = RigProfile(
+            rig_id,
+            (metadata["imageWidth"], metadata["imageHeight"]),
+            metadata["coordinates"],
+            metadata["realWidthMm"],
+            metadata["realHeightMm"],
+            metadata["transformations"],
+            source_transform,
+            maps,
+        )
+        if maps[0].shape[:2] != (profile.target_size[1], profile.target_size[0]):
+            raise ValueError(f"Remap tables of rig {rig_id} do not match its geometry")
+        return profile
+
+
+class RigStore:
+    """
+    Rig profiles of a directory, loaded at startup. Every process keeps its
+    own copies, profiles registered by another process (e.g. the server for
+    its worker pool) are loaded on first use and reloaded when their files
+    change
+
+    Args:
+        directory: Profile directory, created if missing
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY):
+        self.directory = directory
+        self._profiles: Dict[str, Tuple[float, RigProfile]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".json"):
+                try:
+                    self.get(name[: -len(".json")])
+                except (OSError, ValueError, KeyError):
+                    continue
+
+    def _mtime(self, rig_id: str) -> Optional[float]:
+        try:
+            return os.stat(os.path.join(self.directory, rig_id + ".npz")).st_mtime
+        except OSError:
+            return None
+
+    def get(self, rig_id: str) -> Optional[RigProfile]:
+        """Profile by id, None when unknown"""
+        if not RIG_ID_PATTERN.match(rig_id):
+            return None
+
+        mtime = self._mtime(rig_id)
+        with self._lock:
+            cached = self._profiles.get(rig_id)
+            if mtime is None:
+                self._profiles.pop(rig_id, None)
+                return None
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+        profile = RigProfile.load(self.directory, rig_id)
+        with self._lock:
+            self._profiles[rig_id] = (mtime, profile)
+        return profile
+
+    def register(self, profile: RigProfile) -> None:
+        """Stores a profile, replacing one with the same id"""
+        profile.save(self.directory)
+        with self._lock:
+            self._profiles[profile.rig_id] = (self._mtime(profile.rig_id), profile)
+
+    def delete(self, rig_id: str) -> bool:
+        """Removes a profile, returns False if it did not exist"""
+        if not RIG_ID_PATTERN.match(rig_id):
+            return False
+
+        with self._lock:
+            self._profiles.pop(rig_id, None)
+        removed = False
+        for suffix in (".npz", ".json"):
+            try:
+                os.remove(os.path.join(self.directory, rig_id + suffix))
+                removed = True
+            except OSError:
+                pass
+        return removed
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Descriptions of all profiles on disk"""
+        profiles = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                profile = self.get(name[: -len(".json")])
+            except (OSError, ValueError, KeyError):
+                continue
+            if profile is not None:
+                profiles.append(profile.describe())
+        return profiles
+
+    def expand_request(self, data: Dict) -> Dict:
+        """
+        Request data with the geometry of data["rigId"] filled in, so the
+        result cache key and the pipeline see the actual corners
+
+        Raises:
+            ValueError: For an unknown rig id
+        """
+        rig_id = data.get("rigId")
+        if not rig_id:
+            return data
+
+        profile = self.get(str(rig_id))
+        if profile is None:
+            raise ValueError(f"Unknown rig: {rig_id}")
+        return {**data, **profile.request_fields()}
+
+
+_default_store: Optional[RigStore] = None
+_default_lock = threading.Lock()
+
+
+def get_rig_store() -> RigStore:
+    """RigStore of ALIGNER_RIG_DIR for this process, created on first use"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = RigStore()
+        return _default_store
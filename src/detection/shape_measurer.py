@@ -0,0 +1,179 @@
+"""
+Per contour measurements in millimetres, e.g. for laying out foam inserts
+"""
+
+from typing import Any, Dict, List, Tuple
+
+import cv2 as cv
+import numpy as np
+
+from detection.packed_contours import PackedContours
+
+# Longest side of the raster used for the inscribed circles
+MAX_RASTER_SIZE = 4096
+
+
+class ShapeMeasurer:
+    """
+    Measures all contours of a drawer in one pass
+
+    Coordinates are in mm in the DXF frame (x to the right, y up, the drawer
+    top left corner at origin), so the results line up with the exported
+    DXF. Area and perimeter are computed for all contours at once on the
+    packed vertices, the rectangles and enclosing circles per contour and
+    all inscribed circles from a single distance transform
+    """
+
+    @staticmethod
+    def inscribed_circles(
+        contours: PackedContours, pixels_per_mm: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Largest inscribed circle of every contour, accurate to one raster pixel
+
+        All contours are filled into one label raster with their outlines
+        drawn as background, so touching parts stay separated, and one
+        distance transform gives the distance of every pixel to the nearest
+        outline. The circle of a contour is the maximum inside its label
+
+        Args:
+            contours: Contours in mm (DXF frame)
+            pixels_per_mm: Raster resolution, lowered for very large drawers
+
+        Returns:
+            Tuple of ((K, 2) centers in mm, (K,) diameters in mm)
+        """
+        count = len(contours)
+        centers = np.zeros((count, 2), np.float64)
+        diameters = np.zeros(count, np.float64)
+        if count == 0:
+            return centers, diameters
+
+        # Raster with y pointing down, covering all contours plus a margin
+        x_min = float(contours.vertices[:, 0].min())
+        y_max = float(contours.vertices[:, 1].max())
+        extent = contours.vertices.max(axis=0) - contours.vertices.min(axis=0)
+        pixels_per_mm = min(pixels_per_mm, (MAX_RASTER_SIZE - 4) / max(float(extent.max()), 1e-6))
+        raster_vertices = (contours.vertices - np.array([x_min, y_max], np.float32)) * np.array(
+            [pixels_per_mm, -pixels_per_mm], np.float32
+        ) + 2
+        raster = PackedContours(raster_vertices, contours.offsets)
+        width, height = (np.ceil(extent * pixels_per_mm).astype(int) + 4).tolist()
+
+        labels = np.zeros((height, width), np.int32)
+        outlines = raster.to_list()
+        for index, outline in enumerate(outlines):
+            cv.fillPoly(labels, [outline], index + 1)
+        cv.polylines(labels, outlines, True, 0)
+
+        distances = cv.distanceTransform(
+            (labels > 0).astype(np.uint8), cv.DIST_L2, cv.DIST_MASK_PRECISE
+        )
+
+        boxes = raster.bounding_boxes()
+        for index, (bx_min, by_min, bx_max, by_max) in enumerate(boxes):
+            x0, y0 = max(0, int(bx_min)), max(0, int(by_min))
+            x1, y1 = min(width, int(bx_max) + 1), min(height, int(by_max) + 1)
+            inside = (labels[y0:y1, x0:x1] == index + 1).astype(np.uint8)
+            if not inside.any():
+                continue  # Thinner than a raster pixel
+            _, radius, _, location = cv.minMaxLoc(distances[y0:y1, x0:x1], inside)
+            diameters[index] = 2 * radius / pixels_per_mm
+            centers[index] = (
+                x_min + (x0 + location[0] - 2) / pixels_per_mm,
+                y_max - (y0 + location[1] - 2) / pixels_per_mm,
+            )
+
+        return centers, diameters
+
+    @staticmethod
+    def measure(
+        contours: PackedContours,
+        x_ratio: float,
+        y_ratio: float,
+        origin: Tuple[float, float] = (0, 0),
+    ) -> Dict[str, np.ndarray]:
+        """
+        Measurements of every contour, one array row per contour
+
+        Args:
+            contours: Contours in pixels of the corrected image
+            x_ratio: Pixels per mm horizontally
+            y_ratio: Pixels per mm vertically
+            origin: DXF position of the drawer top left corner
+
+        Returns:
+            Dictionary of arrays: "area" (mm²), "perimeter" (mm),
+            "circularity" (4πA/P², 1 for a circle), "rect_center",
+            "rect_size" (mm, width along the rect angle) and "rect_angle"
+            (degrees) of the minimum area rectangle, "enclosing_center" and
+            "enclosing_diameter", "inscribed_center" and "inscribed_diameter"
+        """
+        points = contours.to_mm(x_ratio, y_ratio, origin).astype(np.float32)
+        contours_mm = PackedContours(points, contours.offsets)
+        count = len(contours_mm)
+
+        areas = contours_mm.areas()
+        perimeters = contours_mm.lengths()
+        circularity = np.zeros(count)
+        np.divide(4 * np.pi * areas, perimeters**2, out=circularity, where=perimeters > 0)
+
+        rect_centers = np.zeros((count, 2))
+        rect_sizes = np.zeros((count, 2))
+        rect_angles = np.zeros(count)
+        enclosing_centers = np.zeros((count, 2))
+        enclosing_diameters = np.zeros(count)
+        for index in range(count):
+            outline = contours_mm.contour(index)
+            center, size, angle = cv.minAreaRect(outline)
+            rect_centers[index], rect_sizes[index], rect_angles[index] = center, size, angle
+            center, radius = cv.minEnclosingCircle(outline)
+            enclosing_centers[index], enclosing_diameters[index] = center, 2 * radius
+
+        inscribed_centers, inscribed_diameters = ShapeMeasurer.inscribed_circles(
+            contours_mm, max(x_ratio, y_ratio)
+        )
+
+        return {
+            "area": areas,
+            "perimeter": perimeters,
+            "circularity": circularity,
+            "rect_center": rect_centers,
+            "rect_size": rect_sizes,
+            "rect_angle": rect_angles,
+            "enclosing_center": enclosing_centers,
+            "enclosing_diameter": enclosing_diameters,
+            "inscribed_center": inscribed_centers,
+            "inscribed_diameter": inscribed_diameters,
+        }
+
+    @staticmethod
+    def to_records(measurements: Dict[str, np.ndarray], decimals: int = 3) -> List[Dict[str, Any]]:
+        """JSON friendly list with one dictionary per contour"""
+
+        def pair(values: np.ndarray) -> List[float]:
+            return np.round(values, decimals).tolist()
+
+        records = []
+        for index in range(len(measurements["area"])):
+            records.append(
+                {
+                    "areaMm2": round(float(measurements["area"][index]), decimals),
+                    "perimeterMm": round(float(measurements["perimeter"][index]), decimals),
+                    "circularity": round(float(measurements["circularity"][index]), decimals),
+                    "minAreaRect": {
+                        "center": pair(measurements["rect_center"][index]),
+                        "size": pair(measurements["rect_size"][index]),
+                        "angle": round(float(measurements["rect_angle"][index]), decimals),
+                    },
+                    "enclosingCircle": {
+                        "center": pair(measurements["enclosing_center"][index]),
+                        "diameter": round(float(measurements["enclosing_diameter"][index]), decimals),
+                    },
+                    "inscribedCircle": {
+                        "center": pair(measurements["inscribed_center"][index]),
+                        "diameter": round(float(measurements["inscribed_diameter"][index]), decimals),
+                    },
+                }
+            )
+        return records
@@ -0,0 +1,81 @@
+"""
+Memoization of intermediate edge detection stages
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Union
+
+import numpy as np
+
+from detection.packed_contours import PackedContours
+
+# Stage outputs: images, or the contours found in them
+StageOutput = Union[np.ndarray, PackedContours]
+
+
+class StageCache:
+    """
+    Small LRU caches for pipeline stage outputs, one per stage name, keyed by
+    a description of the stage input and its parameters. Separate LRUs keep
+    the early stages (gray, blur) that later stage hits skip from being
+    evicted by a series of late parameter changes
+
+    Args:
+        max_entries: Entries kept per stage
+    """
+
+    def __init__(self, max_entries: int = 4):
+        self.max_entries = max_entries
+        self._stages: "Dict[str, OrderedDict[Hashable, StageOutput]]" = {}
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by cached outputs"""
+        with self._lock:
+            return sum(
+                entry.nbytes for entries in self._stages.values() for entry in entries.values()
+            )
+
+    def get_or_compute(
+        self, stage: str, key: Hashable, compute: Callable[[], StageOutput]
+    ) -> StageOutput:
+        """
+        Returns cached stage output or computes and stores it
+
+        Args:
+            stage: Stage name, used for hit/miss accounting
+            key: Hashable description of the stage input and parameters
+            compute: Produces the stage output on a miss
+        """
+        with self._lock:
+            entries = self._stages.setdefault(stage, OrderedDict())
+            result = entries.get(key)
+            if result is not None:
+                entries.move_to_end(key)
+                self.hits[stage] = self.hits.get(stage, 0) + 1
+                return result
+            self.misses[stage] = self.misses.get(stage, 0) + 1
+
+        result = compute()
+
+        with self._lock:
+            entries = self._stages.setdefault(stage, OrderedDict())
+            entries[key] = result
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+        return result
+
+    def clear(self) -> None:
+        """Drops all cached stage outputs, keeps the counters"""
+        with self._lock:
+            self._stages.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit and miss counts per stage"""
+        with self._lock:
+            return {"hits": dict(self.hits), "misses": dict(self.misses)}
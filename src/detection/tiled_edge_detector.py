@@ -0,0 +1,222 @@
+"""
+Tiled edge detection for very large images
+
+Splits the image into tiles with halos wide enough for the blur, Canny and
+closing footprints and processes them on a thread pool. The result is bit
+identical to EdgeDetector.prepare_image, but only one full size candidate
+map (reused as edge image) and the output are allocated instead of full
+size gray, blurred, edge and closed images plus the Canny buffers
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import cv2 as cv
+import numpy as np
+
+from detection.edge_detecttor import EdgeDetector
+from monitoring.timing import StageTimer
+
+DEFAULT_TILE_SIZE = 1024
+
+# Extra halo for Canny: Sobel reads 1 pixel, non-maximum suppression compares
+# with the neighbouring gradient magnitudes, one more pixel as safety margin
+CANNY_HALO = 3
+
+# Values in the candidate map
+CANDIDATE = 255
+EDGE = 128
+
+Tile = Tuple[int, int, int, int]
+
+
+class TiledEdgeDetector:
+    """
+    Tiled, multi-threaded equivalent of EdgeDetector.prepare_image
+
+    Canny hysteresis is the only non-local stage. Every tile computes the
+    candidate pixels (Canny with both thresholds at low) and the strong
+    pixels (both at high), which only depend on a small neighbourhood.
+    Edges are the candidate components that contain a strong pixel: each
+    tile resolves the components inside its own area, components crossing
+    tile borders are joined by flood filling the stitched candidate map
+    from the candidates next to edge pixels on the tile borders
+    """
+
+    @staticmethod
+    def get_tiles(width: int, height: int, tile_size: int) -> List[Tile]:
+        """Tile areas (x_min, y_min, x_max, y_max) covering the image"""
+        return [
+            (x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in range(0, height, tile_size)
+            for x in range(0, width, tile_size)
+        ]
+
+    @staticmethod
+    def expand(tile: Tile, halo: int, width: int, height: int) -> Tile:
+        """Tile area grown by halo, clipped to the image"""
+        x_min, y_min, x_max, y_max = tile
+        return (
+            max(0, x_min - halo),
+            max(0, y_min - halo),
+            min(width, x_max + halo),
+            min(height, y_max + halo),
+        )
+
+    @staticmethod
+    def detect_tile(
+        image: np.ndarray,
+        candidates: np.ndarray,
+        tile: Tile,
+        halo: int,
+        blur_kernel_size: Tuple[int, int],
+        canny_low: int,
+        canny_high: int,
+    ) -> List[Tuple[int, int]]:
+        """
+        Writes the candidate map of one tile: CANDIDATE for candidate pixels,
+        EDGE for those connected to a strong pixel inside the tile
+
+        Returns:
+            (x, y) of EDGE pixels on the tile border, seeds for joining
+            components across tiles
+        """
+        height, width = candidates.shape
+        x_min, y_min, x_max, y_max = tile
+        outer = TiledEdgeDetector.expand(tile, halo, width, height)
+        core = (slice(y_min - outer[1], y_max - outer[1]), slice(x_min - outer[0], x_max - outer[0]))
+
+        gray = EdgeDetector.to_grayscale(image[outer[1]:outer[3], outer[0]:outer[2]])
+        blurred = EdgeDetector.blur(gray, blur_kernel_size)
+        weak = EdgeDetector.detect_edges(blurred, canny_low, canny_low)[core]
+        strong = EdgeDetector.detect_edges(blurred, canny_high, canny_high)[core]
+
+        # Candidate components of this tile that hold a strong pixel
+        count, labels = cv.connectedComponents(weak, connectivity=8)
+        values = np.full(count, CANDIDATE, np.uint8)
+        values[labels[strong > 0]] = EDGE
+        values[0] = 0
+
+        tile_map = candidates[y_min:y_max, x_min:x_max]
+        np.take(values, labels, out=tile_map)
+
+        border = np.zeros(tile_map.shape, bool)
+        border[[0, -1], :] = True
+        border[:, [0, -1]] = True
+        ys, xs = np.nonzero(border & (tile_map == EDGE))
+        return list(zip((xs + x_min).tolist(), (ys + y_min).tolist()))
+
+    @staticmethod
+    def join_tiles(candidates: np.ndarray, seed_lists: List[List[Tuple[int, int]]]) -> None:
+        """
+        Marks candidates next to an edge pixel across a tile border as EDGE.
+        The flood fill only walks candidate pixels, so every component is
+        traversed at most once
+        """
+        for seeds in seed_lists:
+            for x, y in seeds:
+                x_start, y_start = max(0, x - 1), max(0, y - 1)
+                window = candidates[y_start:y + 2, x_start:x + 2]
+                for dy, dx in zip(*np.nonzero(window == CANDIDATE)):
+                    if window[dy, dx] != CANDIDATE:
+                        continue  # Joined by an earlier fill
+                    cv.floodFill(
+                        candidates,
+                        None,
+                        (int(x_start + dx), int(y_start + dy)),
+                        EDGE,
+                        0,
+                        0,
+                        8 | cv.FLOODFILL_FIXED_RANGE,
+                    )
+
+    @staticmethod
+    def close_tile(
+        edges: np.ndarray,
+        closed: np.ndarray,
+        tile: Tile,
+        morph_kernel_size: Tuple[int, int],
+    ) -> None:
+        """Morphological closing of one tile, reading a halo of one kernel size"""
+        height, width = edges.shape
+        x_min, y_min, x_max, y_max = tile
+        outer = TiledEdgeDetector.expand(tile, max(morph_kernel_size), width, height)
+
+        result = EdgeDetector.close_edges(
+            edges[outer[1]:outer[3], outer[0]:outer[2]], morph_kernel_size
+        )
+        closed[y_min:y_max, x_min:x_max] = result[
+            y_min - outer[1]:y_max - outer[1], x_min - outer[0]:x_max - outer[0]
+        ]
+
+    @staticmethod
+    def prepare_image(
+        image: np.ndarray,
+        blur_kernel_size: Tuple[int, int] = (5, 5),
+        canny_low: int = 30,
+        canny_high: int = 130,
+        morph_kernel_size: Tuple[int, int] = (5, 5),
+        tile_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        timer: Optional[StageTimer] = None,
+    ) -> np.ndarray:
+        """
+        Same output as EdgeDetector.prepare_image without a cache
+
+        Args:
+            tile_size: Tile side in pixels, raised to a multiple of the halo
+            workers: Threads, defaults to the OpenCV thread count
+            timer: Collects canny (gray, blur and Canny of all tiles),
+                hysteresis and close spans
+        """
+        if timer is None:
+            timer = StageTimer()
+        if workers is None:
+            workers = max(1, cv.getNumThreads())
+
+        blur_kernel_size = tuple(blur_kernel_size)
+        morph_kernel_size = tuple(morph_kernel_size)
+        if canny_low > canny_high:
+            # cv.Canny swaps the thresholds as well
+            canny_low, canny_high = canny_high, canny_low
+
+        halo = max(blur_kernel_size) // 2 + CANNY_HALO
+        tile_size = max(tile_size or DEFAULT_TILE_SIZE, 8 * max(halo, max(morph_kernel_size)))
+        height, width = image.shape[:2]
+        tiles = TiledEdgeDetector.get_tiles(width, height, tile_size)
+
+        candidates = np.empty((height, width), np.uint8)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            with timer.span("canny"):
+                seed_lists = list(
+                    executor.map(
+                        lambda tile: TiledEdgeDetector.detect_tile(
+                            image,
+                            candidates,
+                            tile,
+                            halo,
+                            blur_kernel_size,
+                            canny_low,
+                            canny_high,
+                        ),
+                        tiles,
+                    )
+                )
+
+            with timer.span("hysteresis"):
+                TiledEdgeDetector.join_tiles(candidates, seed_lists)
+                # In place, the candidate map becomes the edge image
+                edges = cv.compare(candidates, EDGE, cv.CMP_EQ, dst=candidates)
+
+            with timer.span("close"):
+                closed = np.empty_like(edges)
+                list(
+                    executor.map(
+                        lambda tile: TiledEdgeDetector.close_tile(
+                            edges, closed, tile, morph_kernel_size
+                        ),
+                        tiles,
+                    )
+                )
+
+        return closed
@@ -23,3 +23,27 @@ class Error:
         """Raise FileNotFound"""
         error_msg = f"Could not find file: {path}"
         raise TypeError(error_msg)
+
+
+class InvalidImageError(ValueError):
+    """Image data could not be decoded"""
+
+
+class InvalidCoordinatesError(ValueError):
+    """Drawer corner coordinates lie outside the image"""
+
+
+class NotFoundError(LookupError):
+    """Session or rig named by a request does not exist (anymore)"""
+
+
+class QueueFullError(RuntimeError):
+    """Worker pool job queue is full, the request should be retried later"""
+
+
+class JobTimeoutError(TimeoutError):
+    """Worker pool job exceeded its time limit and was cancelled"""
+
+
+class JobCancelledError(RuntimeError):
+    """Job was superseded by a newer request before it finished"""
@@ -1,64 +1,56 @@
-import numpy as np
+"""
+Batch entry point: converts a directory of drawer photos to DXF files
 
-from file_conversion.dxf_exporter import contours_to_dxf
-from image_processing.coin_detection import detect_circles
-from image_processing.drawer_detection import (correct_perspective,
-                                               draw_contour_line,
-                                               find_inscribed_circle_diameter,
-                                               measure_object_in_drawer,
-                                               select_drawer_corners)
-from image_processing.utils import (find_contours, load_image, prepare_image,
-                                    view_image)
+Usage:
+    python main.py IMAGE_DIR MANIFEST [--output DIR] [--workers N]
 
+See BatchProcessor for the manifest format
+"""
 
-def main():  # Load Image
-    image = load_image("images/test_14.jpg")
+import argparse
+import json
 
-    # User selects drawer corners
-    corners = select_drawer_corners(image)
+from processors.batch_processor import STAGES, BatchProcessor
 
-    # Auto select corners for test_14.jpg
-    # corners = np.array([[149, 82], [1939, 75], [1995, 1213], [115, 1240]])
 
-    # Image perspective gets corrected
-    irl_width = 540
-    irl_length = 340
-    corrected_image, x_ratio, y_ratio = correct_perspective(
-        image, corners, irl_width, irl_length
-    )
-
-    # Prepare corrected image for contour finding (Grayscale, canny, closeing edges)
-    prepared_image = prepare_image(corrected_image)
+def print_result(result: dict) -> None:
+    """Prints one line per finished image"""
+    if "error" in result:
+        print(f"FAILED {result['file']}: {result['error']}")
+        return
 
-    # Find contours
-    contours = find_contours(prepared_image)
+    total = sum(result["timings"].values())
+    print(f"done   {result['file']} -> {result['output']} "
+          f"({result['contours']} contours, {total:.2f}s)")
 
-    view_image(corrected_image, contours)
 
-    # output_path = contours_to_dxf(
-    #     contours, "output_file.dxf", x_ratio, y_ratio, irl_width, irl_length
-    # )
-    # print(f"DXF file saved to: {output_path}")
-    #
-    # # Get all circles in image
-    # circles = detect_circles(contours)
-    #
-    # circles_image = corrected_image.copy()
-    #
+def main():
+    parser = argparse.ArgumentParser(description="Convert drawer photos to DXF files")
+    parser.add_argument("image_dir", help="Directory with the drawer photos")
+    parser.add_argument("manifest", help="JSON manifest with corners, dimensions and settings")
+    parser.add_argument("--output", default="output", help="Directory for the DXF files")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes, defaults to the core count")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the summary as JSON")
+    args = parser.parse_args()
 
-    # # Drawes the inscribed diameter of all circles
-    # for circle in circles:
-    #     find_inscribed_circle_diameter(circles_image, circle, x_ratio, y_ratio)
-    #
-    # view_image(circles_image)
-    #
+    summary = BatchProcessor.run(
+        args.image_dir, args.manifest, args.output, args.workers, print_result
+    )
 
-    # Draw the largest line in contour for tests
-    for contour in contours:
-        draw_contour_line(corrected_image, contour, x_ratio, y_ratio)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
 
-    # Allows user to measure
-    measure_object_in_drawer(corrected_image, x_ratio, y_ratio)
+    print()
+    print(f"{summary['succeeded']}/{summary['images']} images in "
+          f"{summary['wallSeconds']:.2f}s: {summary['imagesPerSecond']:.2f} images/sec, "
+          f"{summary['megapixelsPerSecond']:.1f} MP/sec")
+    for stage in STAGES:
+        print(f"  {stage:<12} total {summary['stageSeconds'][stage]:8.2f}s  "
+              f"mean {summary['stageMeanSeconds'][stage]:6.3f}s")
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Process wide metrics rendered in the Prometheus text exposition format
+"""
+
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def format_labels(labels: Labels) -> str:
+    """Formats labels as {name="value",...}"""
+    if not labels:
+        return ""
+    escaped = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Adds one observation"""
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class MetricsRegistry:
+    """
+    Thread safe store of counters, gauges and histograms
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    @staticmethod
+    def _labels(labels: Optional[Dict[str, str]]) -> Labels:
+        return tuple(sorted((labels or {}).items()))
+
+    def describe(self, name: str, metric_type: str, help_text: str) -> None:
+        """Registers HELP and TYPE lines of a metric"""
+        with self._lock:
+            self._help[name] = (metric_type, help_text)
+
+    def inc(self, name: str, value: float = 1.0, labels: Optional[Dict[str, str]] = None) -> None:
+        """Increments a counter"""
+        key = self._labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        """Adds an observation to a histogram"""
+        key = self._labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def observe_stages(self, name: str, totals: Dict[str, float]) -> None:
+        """Adds one observation per stage of a StageTimer"""
+        for stage, seconds in totals.items():
+            self.observe(name, seconds, {"stage": stage})
+
+    def render(self, gauges: Optional[Dict[str, Tuple[str, Dict[Labels, float]]]] = None) -> str:
+        """
+        Renders all metrics in the Prometheus text format
+
+        Args:
+            gauges: Point in time values collected by the caller, as
+                {name: (help_text, {labels: value})}
+        """
+        lines: List[str] = []
+
+        def header(name: str, metric_type: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric_type, help_text = self._help.get(name, ("counter", name))
+                header(name, metric_type, help_text)
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                metric_type, help_text = self._help.get(name, ("histogram", name))
+                header(name, metric_type, help_text)
+                for labels, histogram in sorted(series.items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        bucket_labels = labels + (("le", repr(bound)),)
+                        lines.append(f"{name}_bucket{format_labels(bucket_labels)} {count}")
+                    inf_labels = labels + (("le", "+Inf"),)
+                    lines.append(f"{name}_bucket{format_labels(inf_labels)} {histogram.count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+        for name, (help_text, series) in sorted((gauges or {}).items()):
+            header(name, "gauge", help_text)
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,42 @@
+"""
+Per request timing spans for pipeline stages
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+
+class StageTimer:
+    """
+    Collects named timing spans of one request
+    """
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Times the enclosed block as stage name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, time.perf_counter() - start))
+
+    def totals(self) -> Dict[str, float]:
+        """Seconds per stage, repeated spans of a stage are summed"""
+        totals: Dict[str, float] = {}
+        for name, seconds in self.spans:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def as_milliseconds(self) -> Dict[str, float]:
+        """Stage totals in milliseconds, rounded for JSON responses"""
+        return {name: round(seconds * 1000, 3) for name, seconds in self.totals().items()}
+
+    def server_timing_header(self) -> str:
+        """Stage totals formatted as Server-Timing header value"""
+        return ", ".join(
+            f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.totals().items()
+        )
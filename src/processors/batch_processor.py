@@ -0,0 +1,226 @@
+"""
+Batch conversion of drawer photos to DXF files across a process pool
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2 as cv
+
+from detection.drawer_detector import DrawerDetector
+from detection.edge_detecttor import EdgeDetector
+from detection.rig_profile import get_rig_store
+from processors.dxf_processor import contours_to_dxf
+from processors.image_processor import ImageProcessor
+from processors.request_processor import RequestProcessor
+
+STAGES = ["read", "perspective", "edges", "dxf"]
+
+
+def init_worker() -> None:
+    """Keeps OpenCV single threaded in pool workers, the pool already uses all cores"""
+    cv.setNumThreads(1)
+
+
+class BatchProcessor:
+    """
+    Runs the drawer → edges → DXF pipeline for every image of a manifest
+
+    Expected manifest format:
+    {
+        "defaults": {                 # Optional, merged into every image entry
+            "realWidthMm": 540,
+            "realHeightMm": 340,
+            "edgeDetectionSettings": {"cannyLow": 30, "cannyHigh": 130}
+        },
+        "images": [
+            {
+                "file": "test_1.jpg",       # Relative to the image directory
+                "output": "drawer_1.dxf",   # Optional, defaults to <file>.dxf
+                "rigId": "bench-1",         # Optional, geometry of a stored rig instead
+                                            # of coordinates, sizes and transformations
+                "coordinates": [{"x": 100, "y": 200}, ...],
+                "realWidthMm": 530,
+                "realHeightMm": 330,
+                "transformations": {"mirrored": false, "rotation": 0},
+                "edgeDetectionSettings": {...},
+                "simplifyToleranceMm": 0.2    # Optional, Douglas-Peucker tolerance
+            }
+        ]
+    }
+    """
+
+    @staticmethod
+    def load_manifest(manifest_path: str) -> List[Dict[str, Any]]:
+        """Reads manifest and returns image entries with defaults applied"""
+        with open(manifest_path, "r", encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+
+        defaults = manifest.get("defaults", {})
+        entries = []
+        for entry in manifest.get("images", []):
+            merged = {**defaults, **entry}
+            merged["edgeDetectionSettings"] = {
+                **defaults.get("edgeDetectionSettings", {}),
+                **entry.get("edgeDetectionSettings", {}),
+            }
+            entries.append(merged)
+        return entries
+
+    @staticmethod
+    def process_entry(image_dir: str, output_dir: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Processes one manifest entry and writes its DXF, runs in a pool worker
+
+        Returns:
+            Dictionary with file, output path, contour count, megapixels and
+            per stage timings in seconds, or file and error on failure
+        """
+        timings = {}
+        try:
+            start = time.perf_counter()
+            image = cv.imread(os.path.join(image_dir, entry["file"]), cv.IMREAD_COLOR)
+            if image is None:
+                raise ValueError(f"Could not read image: {entry['file']}")
+            timings["read"] = time.perf_counter() - start
+
+            rig = None
+            if entry.get("rigId"):
+                rig = get_rig_store().get(str(entry["rigId"]))
+                if rig is None:
+                    raise ValueError(f"Unknown rig: {entry['rigId']}")
+                entry = {**entry, **rig.request_fields()}
+
+            real_width_mm = float(entry["realWidthMm"])
+            real_height_mm = float(entry["realHeightMm"])
+
+            if rig is not None and rig.matches(image):
+                # Precomputed remap tables of the rig
+                start = time.perf_counter()
+                corrected_image, x_ratio, y_ratio = rig.correct(image)
+                timings["perspective"] = time.perf_counter() - start
+            else:
+                transformations = entry.get(
+                    "transformations", RequestProcessor.get_default_transformations()
+                )
+                # Mirroring and rotation become part of the perspective warp
+                start = time.perf_counter()
+                source_transform, _ = ImageProcessor.get_transformation_matrix(
+                    image.shape[1],
+                    image.shape[0],
+                    bool(transformations["mirrored"]),
+                    int(transformations["rotation"]),
+                )
+                corrected_image, x_ratio, y_ratio = DrawerDetector.process_drawer_image(
+                    image,
+                    ImageProcessor.parse_coordinates(entry["coordinates"]),
+                    real_width_mm,
+                    real_height_mm,
+                    source_transform=source_transform,
+                )
+                timings["perspective"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            edge_results = EdgeDetector.process_image(
+                corrected_image,
+                draw=False,
+                **RequestProcessor.parse_edge_settings(entry),
+            )
+            contours = edge_results["contours"]
+            simplify_tolerance = float(entry.get("simplifyToleranceMm") or 0)
+            if simplify_tolerance > 0:
+                contours = contours.simplify(simplify_tolerance, x_ratio, y_ratio)
+            timings["edges"] = time.perf_counter() - start
+
+            output_name = entry.get("output") or os.path.splitext(entry["file"])[0] + ".dxf"
+            start = time.perf_counter()
+            output_path = contours_to_dxf(
+                contours,
+                os.path.join(output_dir, output_name),
+                x_ratio,
+                y_ratio,
+                real_width_mm,
+                real_height_mm,
+            )
+            timings["dxf"] = time.perf_counter() - start
+            if not output_path:
+                raise IOError(f"Could not write DXF file: {output_name}")
+
+            return {
+                "file": entry["file"],
+                "output": output_path,
+                "contours": len(contours),
+                "megapixels": image.shape[0] * image.shape[1] / 1e6,
+                "timings": timings,
+            }
+
+        except Exception as e:
+            return {"file": entry.get("file"), "error": str(e), "timings": timings}
+
+    @staticmethod
+    def run(
+        image_dir: str,
+        manifest_path: str,
+        output_dir: str,
+        workers: Optional[int] = None,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Processes all manifest entries on a process pool, every DXF is written
+        by its worker as soon as it is done
+
+        Args:
+            image_dir: Directory the manifest file names are relative to
+            manifest_path: Path to the JSON manifest
+            output_dir: Directory for the DXF files
+            workers: Pool size, defaults to the number of cores
+            on_result: Called in the parent process for every finished entry
+
+        Returns:
+            Summary with counts, wall time, throughput in images/sec and
+            total and mean seconds per stage
+        """
+        entries = BatchProcessor.load_manifest(manifest_path)
+        os.makedirs(output_dir, exist_ok=True)
+
+        results = []
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+            futures = [
+                executor.submit(BatchProcessor.process_entry, image_dir, output_dir, entry)
+                for entry in entries
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+        wall_time = time.perf_counter() - start
+
+        succeeded = [result for result in results if "error" not in result]
+        stage_totals = {
+            stage: sum(result["timings"].get(stage, 0.0) for result in succeeded)
+            for stage in STAGES
+        }
+
+        return {
+            "images": len(results),
+            "succeeded": len(succeeded),
+            "failed": len(results) - len(succeeded),
+            "wallSeconds": wall_time,
+            "imagesPerSecond": len(succeeded) / wall_time if wall_time > 0 else 0.0,
+            "megapixelsPerSecond": (
+                sum(result["megapixels"] for result in succeeded) / wall_time
+                if wall_time > 0
+                else 0.0
+            ),
+            "stageSeconds": stage_totals,
+            "stageMeanSeconds": {
+                stage: total / len(succeeded) if succeeded else 0.0
+                for stage, total in stage_totals.items()
+            },
+            "results": results,
+        }
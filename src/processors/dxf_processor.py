@@ -1,75 +1,181 @@
-from typing import Tuple
+import io
+from typing import Any, Dict, List, Sequence, Tuple, Union
 
 import cv2 as cv
 import ezdxf
 import numpy as np
+from ezdxf.document import Drawing
 
+from detection.packed_contours import PackedContours
 
-def contours_to_dxf(
-    contours: np.ndarray,
-    file_path: str,
+Contours = Union[PackedContours, Sequence[np.ndarray]]
+
+
+def contours_to_mm(
+    contours: Contours,
     x_ratio: float,
     y_ratio: float,
-    irl_width: float,
-    irl_length: float,
     origin: Tuple[float, float] = (0, 0),
-) -> str:
-    """Convert contours to DXF file with measurments"""
+) -> List[np.ndarray]:
+    """
+    Convert pixel contours (packed or a list of arrays) to mm point arrays
+    with one NumPy operation over all contour points
+    """
+    if len(contours) == 0:
+        return []
 
-    if not file_path.lower().endswith(".dxf"):
-        file_path += ".dxf"
+    if not isinstance(contours, PackedContours):
+        contours = PackedContours.from_contours(contours)
 
-    doc = ezdxf.new("R2010")
+    points_mm = contours.to_mm(x_ratio, y_ratio, origin)
+    return np.split(points_mm, contours.offsets[1:-1])
 
+
+def add_drawer(
+    doc: Drawing,
+    contours: Contours,
+    x_ratio: float,
+    y_ratio: float,
+    irl_width: float,
+    irl_length: float,
+    origin: Tuple[float, float] = (0, 0),
+    layer_prefix: str = "",
+) -> None:
+    """
+    Adds the contours in mm and the boundary of one drawer to doc, on the
+    layers CONTOURS, DIMENSIONS and BOUNDARIES prefixed by layer_prefix
+    """
     msp = doc.modelspace()
 
     # Layers for different elements
-    doc.layers.add(name="CONTOURS", dxfattribs={"color": 2})
-    doc.layers.add(name="DIMENSIONS", dxfattribs={"color": 1})
-    doc.layers.add(name="BOUNDARIES", dxfattribs={"color": 3}) 
+    contours_layer = layer_prefix + "CONTOURS"
+    boundaries_layer = layer_prefix + "BOUNDARIES"
+    doc.layers.add(name=contours_layer, dxfattribs={"color": 2})
+    doc.layers.add(name=layer_prefix + "DIMENSIONS", dxfattribs={"color": 1})
+    doc.layers.add(name=boundaries_layer, dxfattribs={"color": 3})
 
     # Process each contour
-    for contour in contours:
-        # Convert to mm using ratios
-        points_mm = []
-        for point in contour:
-            x_px, y_px = point[0]
-            x_mm = x_px / x_ratio + origin[0]
-            # Flipping y axis, since CV2 uses top left origin, ezdxf uses bottom left
-            y_mm = -y_px / y_ratio + origin[1]
-            points_mm.append((x_mm, y_mm))
-
-        polyline = msp.add_lwpolyline(points_mm, dxfattribs={"layer": "CONTOURS"})
-        polyline.close(True)
+    for points_mm in contours_to_mm(contours, x_ratio, y_ratio, origin):
+        msp.add_lwpolyline(
+            points_mm.tolist(), format="xy", close=True, dxfattribs={"layer": contours_layer}
+        )
 
     # Bottom line
     msp.add_line(
         start=(origin[0], origin[1]),
         end=(origin[0] + irl_width, origin[1]),
-        dxfattribs={"layer": "BOUNDARIES"}
+        dxfattribs={"layer": boundaries_layer}
     )
     # Right line
     msp.add_line(
         start=(origin[0] + irl_width, origin[1]),
         end=(origin[0] + irl_width, origin[1] - irl_length), 
-        dxfattribs={"layer": "BOUNDARIES"}
+        dxfattribs={"layer": boundaries_layer}
     )
     # Top line
     msp.add_line(
         start=(origin[0] + irl_width, origin[1] - irl_length),  
         end=(origin[0], origin[1] - irl_length), 
-        dxfattribs={"layer": "BOUNDARIES"}
+        dxfattribs={"layer": boundaries_layer}
     )
     # Left line
     msp.add_line(
         start=(origin[0], origin[1] - irl_length),  
         end=(origin[0], origin[1]),
-        dxfattribs={"layer": "BOUNDARIES"}
+        dxfattribs={"layer": boundaries_layer}
     )
 
+
+def build_dxf_document(
+    contours: Contours,
+    x_ratio: float,
+    y_ratio: float,
+    irl_width: float,
+    irl_length: float,
+    origin: Tuple[float, float] = (0, 0),
+) -> Drawing:
+    """Build DXF document with contours in mm and the drawer boundary"""
+    doc = ezdxf.new("R2010")
+    add_drawer(doc, contours, x_ratio, y_ratio, irl_width, irl_length, origin)
+    return doc
+
+
+def build_layered_dxf_document(drawers: Sequence[Dict[str, Any]], gap_mm: float = 50) -> Drawing:
+    """
+    One DXF document with several drawers side by side, left to right with
+    gap_mm between them, every drawer on its own "<name>_" prefixed layers
+
+    Args:
+        drawers: Dictionaries with "name", "contours", "x_ratio", "y_ratio",
+            "width_mm" and "height_mm"
+    """
+    doc = ezdxf.new("R2010")
+    x_offset = 0.0
+    for drawer in drawers:
+        add_drawer(
+            doc,
+            drawer["contours"],
+            drawer["x_ratio"],
+            drawer["y_ratio"],
+            drawer["width_mm"],
+            drawer["height_mm"],
+            (x_offset, 0),
+            drawer["name"] + "_",
+        )
+        x_offset += drawer["width_mm"] + gap_mm
+    return doc
+
+
+def document_to_bytes(doc: Drawing, binary: bool = False) -> bytes:
+    """Serializes doc in memory as ASCII or binary DXF"""
+    if binary:
+        stream = io.BytesIO()
+        doc.write(stream, fmt="bin")
+        return stream.getvalue()
+
+    stream = io.StringIO()
+    doc.write(stream)
+    return stream.getvalue().encode(doc.output_encoding)
+
+
+def contours_to_dxf(
+    contours: Contours,
+    file_path: str,
+    x_ratio: float,
+    y_ratio: float,
+    irl_width: float,
+    irl_length: float,
+    origin: Tuple[float, float] = (0, 0),
+) -> str:
+    """Convert contours to DXF file with measurments"""
+
+    if not file_path.lower().endswith(".dxf"):
+        file_path += ".dxf"
+
+    doc = build_dxf_document(contours, x_ratio, y_ratio, irl_width, irl_length, origin)
+
     try:
         doc.saveas(file_path)
         return file_path
     except IOError as e:
         print(f"Error saving DXF file: {e}")
         return ""
+
+
+def contours_to_dxf_bytes(
+    contours: Contours,
+    x_ratio: float,
+    y_ratio: float,
+    irl_width: float,
+    irl_length: float,
+    origin: Tuple[float, float] = (0, 0),
+    binary: bool = False,
+) -> bytes:
+    """
+    Convert contours to DXF file content in memory, no temporary file
+
+    Args:
+        binary: Serialize as binary DXF instead of ASCII
+    """
+    doc = build_dxf_document(contours, x_ratio, y_ratio, irl_width, irl_length, origin)
+    return document_to_bytes(doc, binary)
@@ -0,0 +1,212 @@
+"""
+Deferred DXF exports
+
+Interactive requests only need contours, the DXF document is built when a
+user actually downloads it. Export jobs run on a small background thread
+pool, finished files are cached by a hash of the contours plus the
+dimensions, so repeated exports of the same result are immediate
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from detection.packed_contours import PackedContours
+from processors.dxf_processor import contours_to_dxf_bytes
+
+DEFAULT_MAX_BYTES = int(os.environ.get("ALIGNER_EXPORT_CACHE_MB", "128")) * 1024 * 1024
+
+# Seconds finished jobs stay downloadable
+DEFAULT_RETENTION_SECONDS = 3600
+
+# Export inputs: "contours" (PackedContours in corrected pixels), "x_ratio",
+# "y_ratio", "width_mm", "height_mm" and "binary"
+ExportInputs = Dict[str, Any]
+
+
+class ExportJob:
+    """State of one export, body is set once status is "done" """
+
+    def __init__(self, filename: str):
+        self.export_id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.key: Optional[str] = None
+        self.body: Optional[bytes] = None
+        self.cached = False
+        self.created = time.time()
+        self.finished: Optional[float] = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "exportId": self.export_id,
+            "status": self.status,
+            "error": self.error,
+            "filename": self.filename,
+            "bytes": len(self.body) if self.body is not None else None,
+            "cached": self.cached,
+            "key": self.key,
+        }
+
+
+class ExportJobStore:
+    """
+    Export jobs by id plus the DXF cache
+
+    Args:
+        max_bytes: Cached DXF bytes, least recently used files are dropped first
+        workers: Background threads building DXFs
+        retention_seconds: Lifetime of finished jobs
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        workers: int = 2,
+        retention_seconds: float = DEFAULT_RETENTION_SECONDS,
+    ):
+        self.max_bytes = max_bytes
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export")
+        self._jobs: Dict[str, ExportJob] = {}
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(inputs: ExportInputs) -> str:
+        """Hash of the contour vertices and offsets, ratios, dimensions and format"""
+        contours: PackedContours = inputs["contours"]
+        digest = hashlib.sha256()
+        digest.update(contours.vertices.tobytes())
+        digest.update(contours.offsets.tobytes())
+        digest.update(
+            json.dumps(
+                [
+                    float(inputs["x_ratio"]),
+                    float(inputs["y_ratio"]),
+                    float(inputs["width_mm"]),
+                    float(inputs["height_mm"]),
+                    bool(inputs.get("binary", False)),
+                ]
+            ).encode("utf-8")
+        )
+        return digest.hexdigest()
+
+    def _cached(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._cache.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def _store(self, key: str, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._cache.pop(key, None)
+            if previous is not None:
+                self._cache_bytes -= len(previous)
+            self._cache[key] = body
+            self._cache_bytes += len(body)
+            while self._cache_bytes > self.max_bytes:
+                _, oldest = self._cache.popitem(last=False)
+                self._cache_bytes -= len(oldest)
+
+    def _finish(self, job: ExportJob, inputs: ExportInputs) -> None:
+        """Takes the DXF from the cache or builds it"""
+        key = ExportJobStore.make_key(inputs)
+        body = self._cached(key)
+        cached = body is not None
+        if body is None:
+            body = contours_to_dxf_bytes(
+                inputs["contours"],
+                inputs["x_ratio"],
+                inputs["y_ratio"],
+                inputs["width_mm"],
+                inputs["height_mm"],
+                binary=bool(inputs.get("binary", False)),
+            )
+            self._store(key, body)
+        with self._lock:
+            job.key = key
+            job.body = body
+            job.cached = cached
+            job.status = "done"
+            job.finished = time.time()
+
+    def _run(self, job: ExportJob, prepare: Callable[[], ExportInputs]) -> None:
+        with self._lock:
+            job.status = "running"
+        try:
+            self._finish(job, prepare())
+        except Exception as e:
+            with self._lock:
+                job.status = "failed"
+                job.error = str(e)
+                job.finished = time.time()
+
+    def submit(
+        self,
+        prepare: Optional[Callable[[], ExportInputs]] = None,
+        inputs: Optional[ExportInputs] = None,
+        filename: str = "drawer.dxf",
+    ) -> ExportJob:
+        """
+        Starts an export of inputs, or of the inputs returned by prepare (e.g.
+        running the pipeline first) on the background pool. Exports of
+        cached inputs are done on return
+        """
+        job = ExportJob(filename)
+        with self._lock:
+            self._prune()
+            self._jobs[job.export_id] = job
+
+        if inputs is not None:
+            with self._lock:
+                known = ExportJobStore.make_key(inputs) in self._cache
+            if known:
+                self._finish(job, inputs)
+                return job
+            self._executor.submit(self._run, job, lambda: inputs)
+        else:
+            self._executor.submit(self._run, job, prepare)
+        return job
+
+    def get(self, export_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(export_id)
+
+    def _prune(self) -> None:
+        """Drops jobs finished longer than the retention ago, needs _lock"""
+        deadline = time.time() - self.retention_seconds
+        for export_id, job in list(self._jobs.items()):
+            if job.finished is not None and job.finished < deadline:
+                del self._jobs[export_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            statuses: Dict[str, int] = {}
+            for job in self._jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+            return {
+                "jobs": statuses,
+                "cachedFiles": len(self._cache),
+                "cacheBytes": self._cache_bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
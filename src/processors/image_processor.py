@@ -2,6 +2,21 @@ from typing import Dict, List, Optional, Tuple
 import cv2 as cv
 import numpy as np
 import base64
+import struct
+
+# Supported preview encodings and their MIME types
+IMAGE_MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+# imdecode flags per reduction factor
+DECODE_FLAGS = {
+    1: cv.IMREAD_COLOR,
+    2: cv.IMREAD_REDUCED_COLOR_2,
+    4: cv.IMREAD_REDUCED_COLOR_4,
+    8: cv.IMREAD_REDUCED_COLOR_8,
+}
+
+# JPEG start of frame markers, all SOFn except DHT (C4), JPG (C8) and DAC (CC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
 
 
 class ImageProcessor:
@@ -10,32 +25,67 @@ class ImageProcessor:
     def process_transformations(
         image: np.ndarray, is_mirror: bool, rotation: int
     ) -> np.ndarray:
-        """Apply transformation to image
+        """Apply transformation to image, mirroring first, then the rotation
         Args:
                image: Input image as a NumPy array in OpenCV format (BGR)
                is_mirror: Whether to apply horizontal mirroring (left-right flip)
                rotation: Rotation angle in degrees (must be 0, 90, 180, or 270)
         """
-        processed_image = image.copy()
+        # No copy, callers never modify the result in place
+        processed_image = image
 
         # Apply mirroring
         if is_mirror:
-            processed_image = cv.flip(image, 1)
+            processed_image = cv.flip(processed_image, 1)
 
         # Apply rotation
         if rotation == 90:
-            processed_image = cv.rotate(image, cv.ROTATE_90_CLOCKWISE)
+            processed_image = cv.rotate(processed_image, cv.ROTATE_90_CLOCKWISE)
         elif rotation == 180:
-            processed_image = cv.rotate(image, cv.ROTATE_180)
+            processed_image = cv.rotate(processed_image, cv.ROTATE_180)
         elif rotation == 270:
-            processed_image = cv.rotate(image, cv.ROTATE_90_COUNTERCLOCKWISE)
+            processed_image = cv.rotate(processed_image, cv.ROTATE_90_COUNTERCLOCKWISE)
 
         return processed_image
 
+    @staticmethod
+    def get_transformation_matrix(
+        width: int, height: int, is_mirror: bool, rotation: int
+    ) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """
+        process_transformations as a matrix, so it can be composed with a
+        perspective warp instead of resampling the image twice
+
+        Args:
+            width: Width of the untransformed image
+            height: Height of the untransformed image
+
+        Returns:
+            Tuple of (3x3 matrix mapping untransformed to transformed pixel
+            coordinates, (width, height) of the transformed image)
+        """
+        matrix = np.eye(3)
+        if is_mirror:
+            matrix = np.array([[-1, 0, width - 1], [0, 1, 0], [0, 0, 1]], np.float64)
+
+        size = (width, height)
+        if rotation == 90:
+            rotation_matrix = [[0, -1, height - 1], [1, 0, 0], [0, 0, 1]]
+            size = (height, width)
+        elif rotation == 180:
+            rotation_matrix = [[-1, 0, width - 1], [0, -1, height - 1], [0, 0, 1]]
+        elif rotation == 270:
+            rotation_matrix = [[0, 1, 0], [-1, 0, width - 1], [0, 0, 1]]
+            size = (height, width)
+        else:
+            rotation_matrix = np.eye(3)
+
+        return np.asarray(rotation_matrix, np.float64) @ matrix, size
+
     @staticmethod
     def validate_input(data: Dict) -> Tuple[bool, Optional[str]]:
         """Validate the input data structure"""
-        if not data or "imageData" not in data:
+        if not data or ("imageData" not in data and "sessionId" not in data):
             return False, "Missing required data"
         return True, None
 
@@ -46,34 +96,262 @@ class ImageProcessor:
         return np.array(coordinate_list)
 
     @staticmethod
-    def decode_image(image_data: str) -> np.ndarray:
-        """Decode base64 image data to OpenCV format"""
+    def decode_base64(image_data: str) -> bytes:
+        """Decode base64 image data (optionally a data URL) to raw encoded bytes"""
         if "," in image_data:
             _, encoded = image_data.split(",", 1)
         else:
             encoded = image_data
 
-        binary = base64.b64decode(encoded)
-        image = np.asarray(bytearray(binary), dtype=np.uint8)
-        return cv.imdecode(image, cv.IMREAD_COLOR)
+        return base64.b64decode(encoded)
+
+    @staticmethod
+    def decode_image(image_data: str) -> np.ndarray:
+        """Decode base64 image data to OpenCV format"""
+        return ImageProcessor.decode_image_bytes(ImageProcessor.decode_base64(image_data))
+
+    @staticmethod
+    def decode_image_bytes(buffer: bytes, reduction: int = 1) -> Optional[np.ndarray]:
+        """
+        Decode raw encoded image bytes to OpenCV format without copying them
+
+        Args:
+            buffer: Encoded JPEG/PNG/WebP bytes
+            reduction: 1, 2, 4 or 8, decode at 1/reduction of the size. JPEG
+                downscales while decoding (DCT scaling), which is much cheaper
+                than a full decode
+        """
+        if not buffer:
+            return None
+        flags = DECODE_FLAGS[int(reduction)]
+        return cv.imdecode(np.frombuffer(buffer, dtype=np.uint8), flags)
+
+    @staticmethod
+    def read_image_size(buffer: bytes) -> Optional[Tuple[int, int]]:
+        """
+        Reads the image size from the PNG, JPEG or WebP header without
+        decoding. JPEG EXIF orientation is applied like cv.imdecode does
+
+        Returns:
+            Tuple of (width, height) of the decoded image, None when the
+            format or header is not recognised
+        """
+        try:
+            if buffer[:8] == b"\x89PNG\r\n\x1a\n" and buffer[12:16] == b"IHDR":
+                return struct.unpack(">II", buffer[16:24])
+            if buffer[:2] == b"\xff\xd8":
+                return ImageProcessor.read_jpeg_size(buffer)
+            if buffer[:4] == b"RIFF" and buffer[8:12] == b"WEBP":
+                return ImageProcessor.read_webp_size(buffer)
+        except (struct.error, IndexError):
+            return None
+        return None
+
+    @staticmethod
+    def read_jpeg_size(buffer: bytes) -> Optional[Tuple[int, int]]:
+        """Walks the JPEG marker segments up to the frame header"""
+        orientation = 1
+        offset = 2
+        while offset + 4 <= len(buffer):
+            if buffer[offset] != 0xFF:
+                return None
+            marker = buffer[offset + 1]
+            if marker == 0xFF:
+                # Fill byte before the marker
+                offset += 1
+                continue
+            if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                # Standalone markers without length
+                offset += 2
+                continue
+            if marker == 0xDA:
+                # Start of scan before any frame header
+                return None
+
+            (length,) = struct.unpack(">H", buffer[offset + 2:offset + 4])
+            segment = buffer[offset + 4:offset + 2 + length]
+            if marker == 0xE1 and segment[:6] == b"Exif\x00\x00":
+                orientation = ImageProcessor.read_exif_orientation(segment[6:])
+            elif marker in JPEG_SOF_MARKERS:
+                height, width = struct.unpack(">HH", segment[1:5])
+                # Orientations 5 to 8 rotate by 90 degrees
+                if orientation >= 5:
+                    return height, width
+                return width, height
+            offset += 2 + length
+        return None
+
+    @staticmethod
+    def read_exif_orientation(tiff: bytes) -> int:
+        """Orientation tag (0x0112) of the first EXIF IFD, 1 if missing"""
+        if tiff[:2] == b"II":
+            order = "<"
+        elif tiff[:2] == b"MM":
+            order = ">"
+        else:
+            return 1
+
+        (ifd_offset,) = struct.unpack(order + "I", tiff[4:8])
+        (entries,) = struct.unpack(order + "H", tiff[ifd_offset:ifd_offset + 2])
+        for index in range(entries):
+            entry = ifd_offset + 2 + index * 12
+            (tag,) = struct.unpack(order + "H", tiff[entry:entry + 2])
+            if tag == 0x0112:
+                (orientation,) = struct.unpack(order + "H", tiff[entry + 8:entry + 10])
+                return orientation if 1 <= orientation <= 8 else 1
+        return 1
 
     @staticmethod
-    def validate_coordinates(
-        image: np.ndarray, coordinates: List[Dict]
+    def read_webp_size(buffer: bytes) -> Optional[Tuple[int, int]]:
+        """Size from the first WebP chunk (lossy, lossless or extended)"""
+        chunk = buffer[12:16]
+        if chunk == b"VP8X":
+            width = int.from_bytes(buffer[24:27], "little") + 1
+            height = int.from_bytes(buffer[27:30], "little") + 1
+            return width, height
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", buffer[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(buffer[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        return None
+
+    @staticmethod
+    def validate_corner_positions(
+        width: int, height: int, coordinates: List[Dict]
     ) -> Tuple[bool, Optional[str]]:
-        """Check if all coordinates are within image boundaries"""
-        height, width = image.shape[:2]
+        """
+        Check if all corner positions lie on an image of width x height,
+        edges included (the corner selection UI clamps corners to them)
+        """
         for point in coordinates:
-            x, y = point["x"], point["y"]
-            if x < 0 or x >= width or y < 0 or y >= height:
+            x, y = float(point["x"]), float(point["y"])
+            if not (0 <= x <= width and 0 <= y <= height):
                 return False, (
-                    f"Coordinate ({x}, {y}) is outside image boundaries "
+                    f"Coordinate ({point['x']}, {point['y']}) is outside image boundaries "
                     f"(width: {width}, height: {height})"
                 )
         return True, None
 
     @staticmethod
-    def encode_image(image: np.ndarray) -> str:
-        """Encode OpenCV image to base64 string"""
-        _, buffer = cv.imencode(".png", image)
-        return f"data:image/png;base64,{base64.b64encode(buffer).decode('utf-8')}"
+    def parse_encoding(options: Optional[Dict]) -> Dict:
+        """
+        Convert per-artifact encoding options from JSON format to
+        encode_image_bytes keyword arguments
+
+        Expected format (all keys optional):
+            {"format": "jpeg", "quality": 80, "compression": 3, "maxDimension": 1024}
+        """
+        options = options or {}
+        image_format = str(options.get("format", "png")).lower()
+        if image_format == "jpg":
+            image_format = "jpeg"
+        if image_format not in IMAGE_MIME_TYPES:
+            raise ValueError(f"Unsupported image format: {image_format}")
+
+        parsed = {"image_format": image_format}
+        if options.get("quality") is not None:
+            parsed["quality"] = int(options["quality"])
+        if options.get("compression") is not None:
+            parsed["compression"] = int(options["compression"])
+        if options.get("maxDimension") is not None:
+            parsed["max_dimension"] = int(options["maxDimension"])
+        return parsed
+
+    @staticmethod
+    def resize_to_max_dimension(image: np.ndarray, max_dimension: int) -> np.ndarray:
+        """Downscale image so its longer side is at most max_dimension"""
+        height, width = image.shape[:2]
+        longest = max(height, width)
+        if max_dimension <= 0 or longest <= max_dimension:
+            return image
+
+        scale = max_dimension / longest
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv.resize(image, size, interpolation=cv.INTER_AREA)
+
+    @staticmethod
+    def get_preview_scale(width: int, height: int, preview: Dict) -> float:
+        """
+        Scale that fits an image of width x height into the preview viewport
+
+        Expected preview format, either key is optional:
+            {"width": 1280, "height": 720} or {"maxDimension": 1280}
+        """
+        scales = [1.0]
+        if preview.get("width"):
+            scales.append(float(preview["width"]) / width)
+        if preview.get("height"):
+            scales.append(float(preview["height"]) / height)
+        if preview.get("maxDimension"):
+            scales.append(float(preview["maxDimension"]) / max(width, height))
+        return min(scales)
+
+    @staticmethod
+    def pyramid_down(image: np.ndarray, scale: float) -> Tuple[np.ndarray, float]:
+        """
+        Halves the image with pyrDown as long as it stays at or above scale
+
+        Returns:
+            Tuple of (pyramid_level, level_scale), level_scale >= scale
+        """
+        level_scale = 1.0
+        while level_scale / 2 >= scale and min(image.shape[:2]) >= 2:
+            image = cv.pyrDown(image)
+            level_scale /= 2
+        return image, level_scale
+
+    @staticmethod
+    def build_proxy(image: np.ndarray, scale: float) -> np.ndarray:
+        """Downscaled copy of image, built from its pyramid and resized to scale"""
+        if scale >= 1.0:
+            return image
+
+        height, width = image.shape[:2]
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        level, _ = ImageProcessor.pyramid_down(image, scale)
+        if level.shape[1] == size[0] and level.shape[0] == size[1]:
+            return level
+        return cv.resize(level, size, interpolation=cv.INTER_AREA)
+
+    @staticmethod
+    def encode_image(image: np.ndarray, image_format: str = "png", **options) -> str:
+        """Encode OpenCV image to base64 data URL"""
+        buffer = ImageProcessor.encode_image_bytes(image, image_format, **options)
+        mime_type = IMAGE_MIME_TYPES[image_format]
+        return f"data:{mime_type};base64,{base64.b64encode(buffer).decode('utf-8')}"
+
+    @staticmethod
+    def encode_image_bytes(
+        image: np.ndarray,
+        image_format: str = "png",
+        quality: Optional[int] = None,
+        compression: Optional[int] = None,
+        max_dimension: Optional[int] = None,
+    ) -> bytes:
+        """
+        Encode OpenCV image to raw bytes
+
+        Args:
+            image: Image to encode
+            image_format: "png", "jpeg" or "webp"
+            quality: JPEG/WebP quality (0-100)
+            compression: PNG compression level (0-9)
+            max_dimension: Optional limit for the longer side, for previews
+        """
+        if max_dimension is not None:
+            image = ImageProcessor.resize_to_max_dimension(image, max_dimension)
+
+        params = []
+        if image_format == "jpeg" and quality is not None:
+            params = [cv.IMWRITE_JPEG_QUALITY, quality]
+        elif image_format == "webp" and quality is not None:
+            params = [cv.IMWRITE_WEBP_QUALITY, quality]
+        elif image_format == "png" and compression is not None:
+            params = [cv.IMWRITE_PNG_COMPRESSION, compression]
+
+        success, buffer = cv.imencode(f".{image_format}", image, params)
+        if not success:
+            raise ValueError(f"Could not encode image as {image_format}")
+        return buffer.tobytes()
@@ -0,0 +1,218 @@
+"""
+Live tuning channel of an image session
+
+Slider drags send parameter updates much faster than the pipeline runs.
+Updates are coalesced latest-wins: only the newest pending update is
+processed, a running computation is cancelled at its next stage boundary
+once it is superseded, and results are pushed to subscribers (server-sent
+events) as they complete
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from errors.error import JobCancelledError
+from monitoring.timing import StageTimer
+
+# Seconds a channel without updates and subscribers is kept
+DEFAULT_IDLE_SECONDS = 600
+
+
+class CancellableTimer(StageTimer):
+    """
+    StageTimer that raises JobCancelledError when a span starts after the
+    job became stale, so superseded jobs stop between pipeline stages
+
+    Args:
+        is_stale: Returns True once the job result is no longer wanted
+    """
+
+    def __init__(self, is_stale: Callable[[], bool]):
+        super().__init__()
+        self.is_stale = is_stale
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        if self.is_stale():
+            raise JobCancelledError(f"Cancelled before {name}")
+        with super().span(name):
+            yield
+
+
+class LiveSession:
+    """
+    Latest-wins processing queue of one image session
+
+    Every update gets the next generation number. A single worker thread,
+    started on demand, always processes the newest update, results of older
+    generations are never published
+
+    Args:
+        handler: Computes the event payload of an update, called as
+            handler(data, timer) with a CancellableTimer
+    """
+
+    def __init__(self, handler: Callable[[Dict, StageTimer], Dict[str, Any]]):
+        self.handler = handler
+        self.generation = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.coalesced = 0
+        self.last_active = time.monotonic()
+        self.subscribers = 0
+        self._pending: Optional[Dict] = None
+        self._running = False
+        self._event: Optional[Dict[str, Any]] = None
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def submit(self, data: Dict) -> int:
+        """Queues an update, replacing a pending one, and returns its generation"""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Live session is closed")
+            if self._pending is not None:
+                self.coalesced += 1
+            self.generation += 1
+            self._pending = data
+            self.last_active = time.monotonic()
+            if not self._running:
+                self._running = True
+                threading.Thread(target=self._run, daemon=True).start()
+            return self.generation
+
+    def _run(self) -> None:
+        """Worker loop, exits once no update is pending"""
+        while True:
+            with self._condition:
+                data = self._pending
+                if data is None or self._closed:
+                    self._running = False
+                    return
+                self._pending = None
+                generation = self.generation
+
+            timer = CancellableTimer(lambda: self.generation != generation or self._closed)
+            try:
+                event = {"event": "result", **self.handler(data, timer)}
+            except JobCancelledError:
+                with self._condition:
+                    self.cancelled += 1
+                continue
+            except Exception as e:
+                event = {"event": "error", "success": False, "error": str(e)}
+
+            with self._condition:
+                if generation != self.generation:
+                    # Superseded after the last stage, nobody wants it
+                    self.cancelled += 1
+                    continue
+                self.completed += 1
+                self._event = dict(event, generation=generation)
+                self._condition.notify_all()
+
+    def wait(self, after: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Blocks until a result newer than generation after is published
+
+        Returns:
+            The latest event (with "generation"), or None on timeout or close
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not self._closed:
+                if self._event is not None and self._event["generation"] > after:
+                    return self._event
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            return None
+
+    @contextmanager
+    def subscription(self) -> Iterator[None]:
+        """Counts an event stream as subscriber while it is open"""
+        with self._condition:
+            self.subscribers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.subscribers -= 1
+                self.last_active = time.monotonic()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self) -> None:
+        """Stops the worker after its current stage and wakes all subscribers"""
+        with self._condition:
+            self._closed = True
+            self._pending = None
+            self._condition.notify_all()
+
+    def is_idle(self, idle_seconds: float) -> bool:
+        with self._condition:
+            return (
+                not self._running
+                and self.subscribers == 0
+                and time.monotonic() - self.last_active > idle_seconds
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            return {
+                "generation": self.generation,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "coalesced": self.coalesced,
+                "subscribers": self.subscribers,
+            }
+
+
+class LiveSessionRegistry:
+    """
+    Live channels by session id, idle channels are dropped on access
+
+    Args:
+        idle_seconds: Lifetime of channels without updates and subscribers
+    """
+
+    def __init__(self, idle_seconds: float = DEFAULT_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._channels: Dict[str, LiveSession] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(
+        self, session_id: str, handler: Callable[[Dict, StageTimer], Dict[str, Any]]
+    ) -> LiveSession:
+        """Channel of a session, created with handler if missing"""
+        with self._lock:
+            self._prune()
+            channel = self._channels.get(session_id)
+            if channel is None or channel.closed:
+                channel = LiveSession(handler)
+                self._channels[session_id] = channel
+            return channel
+
+    def get(self, session_id: str) -> Optional[LiveSession]:
+        with self._lock:
+            self._prune()
+            return self._channels.get(session_id)
+
+    def close(self, session_id: str) -> None:
+        """Closes and drops the channel of a session, if any"""
+        with self._lock:
+            channel = self._channels.pop(session_id, None)
+        if channel is not None:
+            channel.close()
+
+    def _prune(self) -> None:
+        """Drops idle channels, needs _lock"""
+        for session_id, channel in list(self._channels.items()):
+            if channel.closed or channel.is_idle(self.idle_seconds):
+                channel.close()
+                del self._channels[session_id]
@@ -0,0 +1,204 @@
+"""
+Several drawers of one photo, e.g. a whole cabinet section, in one request.
+The image is decoded once and the drawers run concurrently
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+from detection.packed_contours import PackedContours
+from monitoring.timing import StageTimer
+from processors.dxf_processor import build_layered_dxf_document, document_to_bytes
+from processors.request_processor import RequestProcessor
+from processors.session_store import ImageSession
+from processors.worker_pool import available_cores
+
+# Upper bound on drawers per request
+MAX_DRAWERS = 32
+
+DXF_MODES = ("separate", "combined")
+
+# Request fields every drawer inherits, drawer entries override them
+SHARED_FIELDS = (
+    "transformations",
+    "outputs",
+    "encoding",
+    "dxfFormat",
+    "simplifyToleranceMm",
+    "measure",
+    "perspectiveMode",
+)
+
+
+class MultiDrawerProcessor:
+    """
+    Runs RequestProcessor.process_request for every drawer of data["drawers"]
+    on a thread pool (OpenCV releases the GIL), sharing the decoded image.
+    DXFs are returned per drawer or as one document with a layer set per
+    drawer
+    """
+
+    @staticmethod
+    def parse_drawers(data: Dict) -> List[Dict[str, Any]]:
+        """
+        Request data of every drawer: the shared fields of data merged with
+        the drawer entry, edgeDetectionSettings merged key by key, and a
+        unique "name" usable as DXF layer prefix
+
+        Raises:
+            ValueError: For a missing or malformed drawer list
+        """
+        drawers = data.get("drawers")
+        if not isinstance(drawers, list) or not drawers:
+            raise ValueError("drawers must be a non-empty list")
+        if len(drawers) > MAX_DRAWERS:
+            raise ValueError(f"{len(drawers)} drawers, at most {MAX_DRAWERS} are allowed")
+
+        shared = {key: data[key] for key in SHARED_FIELDS if key in data}
+        parsed = []
+        names = set()
+        for index, drawer in enumerate(drawers):
+            if not isinstance(drawer, dict):
+                raise ValueError(f"Drawer {index + 1} is not an object")
+
+            merged = {**shared, **drawer}
+            merged["edgeDetectionSettings"] = {
+                **(data.get("edgeDetectionSettings") or {}),
+                **(drawer.get("edgeDetectionSettings") or {}),
+            }
+            missing = [
+                key for key in ("coordinates", "realWidthMm", "realHeightMm") if key not in merged
+            ]
+            if missing:
+                raise ValueError(f"Drawer {index + 1} is missing {', '.join(missing)}")
+            if len(merged["coordinates"]) != 4:
+                raise ValueError(
+                    f"Drawer {index + 1} needs 4 coordinates, got {len(merged['coordinates'])}"
+                )
+
+            try:
+                RequestProcessor.parse_outputs(merged)
+            except ValueError as e:
+                raise ValueError(f"Drawer {index + 1}: {e}") from None
+
+            name = re.sub(r"[^A-Za-z0-9_-]", "_", str(drawer.get("name") or f"drawer_{index + 1}"))
+            if name in names:
+                raise ValueError(f"Duplicate drawer name: {name}")
+            names.add(name)
+            merged["name"] = name
+            parsed.append(merged)
+        return parsed
+
+    @staticmethod
+    def process_job(
+        data: Dict,
+        session: Optional[ImageSession] = None,
+        image: Optional[np.ndarray] = None,
+        image_bytes: Optional[bytes] = None,
+        timer: Optional[StageTimer] = None,
+    ) -> Dict:
+        """
+        Decodes the image once and processes all drawers at full resolution
+
+        "dxfMode": "separate" (default) returns a DXF per drawer, "combined"
+        one DXF with the drawers side by side on "<name>_" prefixed layers.
+        Every drawer gets the artifacts of its own (merged) "outputs", the
+        combined DXF holds the drawers whose outputs include "dxf"
+
+        Returns:
+            Dictionary with "result" ("drawers": process_request metadata
+            with "name" per drawer, "dxf_mode", "megapixels"), "artifacts"
+            (build_artifacts output per drawer named "<name>/<artifact>", the
+            combined DXF as "dxf"), "contours" (all drawers, in drawer order)
+            and "spans" (timing spans as (stage, seconds), summed over the
+            concurrent drawers)
+        """
+        if timer is None:
+            timer = StageTimer()
+        drawers = MultiDrawerProcessor.parse_drawers(data)
+        dxf_mode = data.get("dxfMode", "separate")
+        if dxf_mode not in DXF_MODES:
+            raise ValueError(f"Unknown dxfMode: {dxf_mode}")
+        # Drawers may override "outputs", e.g. colour images for one drawer only
+        drawer_outputs = [RequestProcessor.parse_outputs(drawer) for drawer in drawers]
+
+        if session is not None:
+            image = session.image
+        elif image is None:
+            # Always full resolution, a preview would only shrink the decode
+            full_data = {key: value for key, value in data.items() if key != "preview"}
+            image, _ = RequestProcessor.decode_request_image(full_data, image_bytes, timer)
+        for drawer in drawers:
+            RequestProcessor.check_coordinates(drawer, image.shape[1], image.shape[0])
+
+        def process(drawer: Dict[str, Any], outputs: Set[str]) -> Dict:
+            drawer_data = dict(drawer)
+            drawer_data.pop("preview", None)
+            if dxf_mode == "combined":
+                drawer_data["outputs"] = [name for name in outputs if name != "dxf"]
+            result = RequestProcessor.process_request(drawer_data, session, image, timer)
+            return {
+                "result": result,
+                "artifacts": RequestProcessor.build_artifacts(result, drawer_data, timer),
+            }
+
+        workers = max(1, min(len(drawers), available_cores()))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            processed = list(executor.map(process, drawers, drawer_outputs))
+
+        artifacts = []
+        metadata = []
+        for drawer, job in zip(drawers, processed):
+            result = job["result"]
+            metadata.append(
+                {
+                    "name": drawer["name"],
+                    "coordinates": drawer["coordinates"],
+                    **{
+                        key: value
+                        for key, value in result.items()
+                        if key not in ("dxf_bytes", "contours")
+                        and not isinstance(value, np.ndarray)
+                    },
+                }
+            )
+            for name, content_type, body in job["artifacts"]:
+                artifacts.append((f"{drawer['name']}/{name}", content_type, body))
+
+        # The combined DXF holds the drawers that ask for "dxf"
+        layered = [
+            (drawer, job)
+            for drawer, outputs, job in zip(drawers, drawer_outputs, processed)
+            if "dxf" in outputs
+        ]
+        if dxf_mode == "combined" and layered:
+            with timer.span("dxf"):
+                doc = build_layered_dxf_document(
+                    [
+                        {
+                            "name": drawer["name"],
+                            "contours": job["result"]["contours"],
+                            "x_ratio": job["result"]["x_ratio"],
+                            "y_ratio": job["result"]["y_ratio"],
+                            "width_mm": float(drawer["realWidthMm"]),
+                            "height_mm": float(drawer["realHeightMm"]),
+                        }
+                        for drawer, job in layered
+                    ]
+                )
+                body = document_to_bytes(doc, data.get("dxfFormat") == "binary")
+            artifacts.append(("dxf", "application/dxf", body))
+
+        return {
+            "result": {
+                "drawers": metadata,
+                "dxf_mode": dxf_mode,
+                "megapixels": image.shape[0] * image.shape[1] / 1e6,
+            },
+            "artifacts": artifacts,
+            "contours": PackedContours.concatenate([job["result"]["contours"] for job in processed]),
+            "spans": timer.spans,
+        }
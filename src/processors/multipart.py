@@ -0,0 +1,49 @@
+"""
+Multipart response encoding for binary artifact transport
+"""
+
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+# (name, content_type, body)
+Part = Tuple[str, str, bytes]
+
+
+def encode_multipart(
+    metadata: Dict[str, Any], parts: List[Part], boundary: Optional[str] = None
+) -> Tuple[bytes, str]:
+    """
+    Builds a multipart/mixed body, the first part is JSON metadata and the
+    following parts carry raw artifact bytes
+
+    Args:
+        metadata: JSON serializable response metadata
+        parts: Artifacts as (name, content_type, body)
+        boundary: Optional fixed boundary, random if not given
+
+    Returns:
+        Tuple of (body, content_type header value)
+    """
+    if boundary is None:
+        boundary = uuid.uuid4().hex
+
+    all_parts = [("metadata", "application/json", json.dumps(metadata).encode("utf-8"))]
+    all_parts.extend(parts)
+
+    chunks = []
+    for name, content_type, body in all_parts:
+        chunks.append(
+            (
+                f"--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f'Content-Disposition: attachment; name="{name}"\r\n'
+                f"Content-Length: {len(body)}\r\n"
+                "\r\n"
+            ).encode("ascii")
+        )
+        chunks.append(body)
+        chunks.append(b"\r\n")
+    chunks.append(f"--{boundary}--\r\n".encode("ascii"))
+
+    return b"".join(chunks), f"multipart/mixed; boundary={boundary}"
@@ -1,12 +1,35 @@
-from typing import Dict, Any
+from typing import Dict, Any, Hashable, List, Optional, Set, Tuple
+from detection.buffer_pool import buffer_pool
 from detection.edge_detecttor import EdgeDetector
+from detection.packed_contours import CONTOUR_MIME_TYPES, PackedContours
+from detection.rig_profile import get_rig_store
+from detection.shape_measurer import ShapeMeasurer
+import cv2 as cv
 import numpy as np
-from processors.image_processor import ImageProcessor
+from processors.image_processor import IMAGE_MIME_TYPES, ImageProcessor
 from detection.drawer_detector import DrawerDetector
-from processors.dxf_processor import contours_to_dxf
-import tempfile
-import base64
-import os
+from processors.dxf_processor import contours_to_dxf_bytes
+from processors.session_store import ImageSession
+from monitoring.timing import StageTimer
+from errors.error import InvalidCoordinatesError, InvalidImageError
+
+
+# Artifacts a request can ask for, mapped to their key in the result dictionary
+OUTPUT_KEYS = {
+    "processedImage": "image",
+    "edgeImage": "edge_image",
+    "contouredImage": "contoured_image",
+    "dxf": "dxf_bytes",
+    "contours": "contours",
+}
+
+# Artifacts produced when a request has no "outputs" list. The DXF and the
+# vector contours are opt-in, downloads go through /exports
+DEFAULT_OUTPUTS = ("processedImage", "edgeImage", "contouredImage")
+
+# "image" warps the photo before edge detection, "contours" detects edges in
+# the drawer area of the photo and only maps the contour vertices
+PERSPECTIVE_MODES = ("image", "contours")
 
 
 class RequestProcessor:
@@ -15,40 +38,73 @@ class RequestProcessor:
         return {"mirrored": False, "rotation": 0}
 
     @staticmethod
-    def process_request(data: Dict) -> Dict:
-        """Main processing pipeline"""
-        transformations = data.get(
-            "transformations", RequestProcessor.get_default_transformations()
-        )
+    def parse_outputs(data: Dict) -> Set[str]:
+        """Artifacts requested by the "outputs" list, DEFAULT_OUTPUTS by default"""
+        outputs = data.get("outputs")
+        if outputs is None:
+            return set(DEFAULT_OUTPUTS)
 
-        image = ImageProcessor.decode_image(data["imageData"])
-        x_ratio = None
-        y_ratio = None
-        
-        # Handle coordinates if present (for initial processing)
-        if "coordinates" in data:
-            coordinates = ImageProcessor.parse_coordinates(data["coordinates"])
-            # Apply transformations
-            transformed_image = ImageProcessor.process_transformations(
-                image, bool(transformations["mirrored"]), int(transformations["rotation"])
-            )
+        unknown = [name for name in outputs if name not in OUTPUT_KEYS]
+        if unknown:
+            raise ValueError(f"Unknown outputs: {', '.join(map(str, unknown))}")
+        return set(outputs)
 
-            # Process drawer image
-            corrected_image, x_ratio, y_ratio = DrawerDetector.process_drawer_image(
-                transformed_image,
-                coordinates,
-                float(data["realWidthMm"]),
-                float(data["realHeightMm"]),
-            )
-        else:
-            # For edge detection updates, use the image as is
-            corrected_image = image
-            # Calculate ratios based on image size and real dimensions if available
-            if "realWidthMm" in data and "realHeightMm" in data:
-                height, width = image.shape[:2]
-                x_ratio = width / float(data["realWidthMm"])
-                y_ratio = height / float(data["realHeightMm"])
+    @staticmethod
+    def build_artifacts(
+        result: Dict, data: Dict, timer: Optional[StageTimer] = None
+    ) -> List[Tuple[str, str, bytes]]:
+        """
+        Encodes the requested artifacts of a processing result
+
+        Image artifacts use the per-artifact options from data["encoding"],
+        e.g. {"processedImage": {"format": "jpeg", "quality": 80}}, the
+        contours {"contours": {"format": "delta"}} (see PackedContours.encode)
+
+        Returns:
+            List of (name, content_type, body) in OUTPUT_KEYS order
+        """
+        outputs = RequestProcessor.parse_outputs(data)
+        encodings = data.get("encoding") or {}
+        if timer is None:
+            timer = StageTimer()
+
+        artifacts = []
+        for name, key in OUTPUT_KEYS.items():
+            if name not in outputs or result.get(key) is None:
+                continue
+
+            if name == "dxf":
+                artifacts.append((name, "application/dxf", result[key]))
+                continue
+
+            if name == "contours":
+                contour_format = RequestProcessor.parse_contour_format(encodings.get(name))
+                with timer.span("encode"):
+                    body = result[key].encode(contour_format)
+                artifacts.append((name, CONTOUR_MIME_TYPES[contour_format], body))
+                continue
+
+            options = ImageProcessor.parse_encoding(encodings.get(name))
+            with timer.span("encode"):
+                body = ImageProcessor.encode_image_bytes(result[key], **options)
+            artifacts.append((name, IMAGE_MIME_TYPES[options["image_format"]], body))
+
+        return artifacts
 
+    @staticmethod
+    def parse_contour_format(options: Optional[Dict]) -> str:
+        """Contour encoding from {"format": "packed" | "delta"}, packed by default"""
+        contour_format = str((options or {}).get("format", "packed")).lower()
+        if contour_format not in CONTOUR_MIME_TYPES:
+            raise ValueError(f"Unsupported contour format: {contour_format}")
+        return contour_format
+
+    @staticmethod
+    def parse_edge_settings(data: Dict) -> Dict[str, Any]:
+        """
+        Convert "edgeDetectionSettings" to EdgeDetector.process_image keyword
+        arguments, invalid values fall back to defaults
+        """
         # Extract edge detection settings if provided
         edge_settings = data.get("edgeDetectionSettings", {})
         
@@ -71,44 +127,574 @@ class RequestProcessor:
             morph_kernel = [5, 5]
         morph_kernel_size = (int(morph_kernel[0]), int(morph_kernel[1]))
 
-        # Run edge detection and find contours
-        edge_results = EdgeDetector.process_image(
-            corrected_image,
-            min_contour_area=1000,
-            return_edges=True,
-            blur_kernel_size=blur_kernel_size,
-            canny_low=canny_low,
-            canny_high=canny_high,
-            morph_kernel_size=morph_kernel_size,
+        try:
+            min_contour_area = float(edge_settings.get("minContourArea", 1000))
+        except (TypeError, ValueError):
+            min_contour_area = 1000
+
+        return {
+            "blur_kernel_size": blur_kernel_size,
+            "canny_low": canny_low,
+            "canny_high": canny_high,
+            "morph_kernel_size": morph_kernel_size,
+            "min_contour_area": min_contour_area,
+        }
+
+    @staticmethod
+    def get_correction_key(
+        data: Dict, transformations: Dict[str, Any], scale: float = 1.0
+    ) -> Hashable:
+        """Key identifying the perspective correction requested by data"""
+        return (
+            tuple((float(point["x"]), float(point["y"])) for point in data["coordinates"]),
+            float(data["realWidthMm"]),
+            float(data["realHeightMm"]),
+            bool(transformations["mirrored"]),
+            int(transformations["rotation"]),
+            scale,
         )
 
-        # Generate DXF file if we have valid ratios and dimensions
-        dxf_data = None
-        if x_ratio is not None and y_ratio is not None and "realWidthMm" in data and "realHeightMm" in data:
-            # Create temporary file for DXF
-            with tempfile.NamedTemporaryFile(suffix='.dxf', delete=False) as tmp_file:
-                dxf_path = contours_to_dxf(
-                    edge_results["contours"],
-                    tmp_file.name,
+    @staticmethod
+    def process_job(
+        data: Dict,
+        session: Optional[ImageSession] = None,
+        image: Optional[np.ndarray] = None,
+        image_bytes: Optional[bytes] = None,
+        timer: Optional[StageTimer] = None,
+    ) -> Dict:
+        """
+        Decodes the image, runs the pipeline and encodes the requested
+        artifacts. Entry point for worker pool jobs, only encoded bytes and
+        plain values are returned, so results are cheap to send between
+        processes
+
+        Args:
+            data: Request data, "imageData" is only read when no image,
+                image bytes or session is given
+            session: Image session holding the already decoded image
+            image: Already decoded image
+            image_bytes: Raw encoded JPEG/PNG bytes
+            timer: Collects the stage spans, e.g. a timer that cancels the job
+
+        Returns:
+            Dictionary with "result" (process_request result without arrays,
+            contours and DXF bytes, plus the buffer pool bytes allocated and
+            reused by the job as "pool_buffer_bytes", other allocations are
+            not counted), "artifacts" (build_artifacts output),
+            "contours" (PackedContours) and "spans" (timing spans as
+            (stage, seconds))
+        """
+        if timer is None:
+            timer = StageTimer()
+        allocated_before, reused_before = buffer_pool.thread_counters()
+        image_scale = 1.0
+        if session is None and image is None:
+            image, image_scale = RequestProcessor.decode_request_image(data, image_bytes, timer)
+        else:
+            source = session.image if session is not None else image
+            RequestProcessor.check_coordinates(data, source.shape[1], source.shape[0])
+
+        result = RequestProcessor.process_request(data, session, image, timer, image_scale)
+        artifacts = RequestProcessor.build_artifacts(result, data, timer)
+
+        metadata = {
+            key: value
+            for key, value in result.items()
+            if key not in ("dxf_bytes", "contours") and not isinstance(value, np.ndarray)
+        }
+        allocated_after, reused_after = buffer_pool.thread_counters()
+        metadata["pool_buffer_bytes"] = {
+            "allocated": allocated_after - allocated_before,
+            "reused": reused_after - reused_before,
+        }
+        return {
+            "result": metadata,
+            "artifacts": artifacts,
+            "contours": result["contours"],
+            "spans": timer.spans,
+        }
+
+    @staticmethod
+    def check_coordinates(data: Dict, width: int, height: int) -> None:
+        """
+        Raises InvalidCoordinatesError when the corners in data lie outside
+        an image of width x height, corners refer to the rotated image
+        """
+        if "coordinates" not in data:
+            return
+
+        transformations = data.get(
+            "transformations", RequestProcessor.get_default_transformations()
+        )
+        if int(transformations["rotation"]) in (90, 270):
+            width, height = height, width
+
+        is_valid, error = ImageProcessor.validate_corner_positions(
+            width, height, data["coordinates"]
+        )
+        if not is_valid:
+            raise InvalidCoordinatesError(error)
+
+    @staticmethod
+    def plan_decode(data: Dict, image_size: Optional[Tuple[int, int]]) -> int:
+        """
+        Cheapest decode reduction that still serves the request
+
+        Preview requests decode at the largest reduction (1/2, 1/4 or 1/8)
+        that keeps at least the preview resolution, the same choice
+        pyramid_down makes. Images are always decoded in colour: a grayscale
+        JPEG decode differs slightly from converting the colour decode, so
+        detection would depend on the requested outputs
+
+        Args:
+            data: Request data
+            image_size: (width, height) from the image header, if known
+
+        Returns:
+            Reduction factor for ImageProcessor.decode_image_bytes
+        """
+        preview = None if data.get("commit") else data.get("preview")
+        if not preview or image_size is None:
+            return 1
+
+        if "coordinates" in data:
+            width, height = DrawerDetector.get_target_size(
+                DrawerDetector.order_corners(
+                    ImageProcessor.parse_coordinates(data["coordinates"]).astype(np.float64)
+                ),
+                float(data["realWidthMm"]),
+                float(data["realHeightMm"]),
+            )
+        else:
+            width, height = image_size
+
+        scale = ImageProcessor.get_preview_scale(width, height, preview)
+        for reduction in (8, 4, 2):
+            if 1 / reduction >= scale:
+                return reduction
+        return 1
+
+    @staticmethod
+    def decode_request_image(
+        data: Dict,
+        image_bytes: Optional[bytes] = None,
+        timer: Optional[StageTimer] = None,
+    ) -> Tuple[np.ndarray, float]:
+        """
+        Decodes the request image once, as small as the request allows.
+        The header is read first, so invalid coordinates are rejected before
+        paying for the decode
+
+        Args:
+            data: Request data, "imageData" is only read without image_bytes
+            image_bytes: Raw encoded image bytes
+            timer: Collects the decode span
+
+        Returns:
+            Tuple of (image, image_scale), image_scale is the decoded size
+            relative to the encoded image
+        """
+        if timer is None:
+            timer = StageTimer()
+
+        with timer.span("decode"):
+            if image_bytes is None:
+                image_bytes = ImageProcessor.decode_base64(data["imageData"])
+            image_size = ImageProcessor.read_image_size(image_bytes)
+            if image_size is not None:
+                RequestProcessor.check_coordinates(data, *image_size)
+
+            reduction = RequestProcessor.plan_decode(data, image_size)
+            image = ImageProcessor.decode_image_bytes(image_bytes, reduction=reduction)
+        if image is None:
+            raise InvalidImageError("Invalid image data")
+
+        if image_size is None:
+            RequestProcessor.check_coordinates(data, image.shape[1], image.shape[0])
+            return image, 1.0
+        return image, image.shape[1] / image_size[0]
+
+    @staticmethod
+    def correct_image(
+        data: Dict,
+        image: np.ndarray,
+        transformations: Dict[str, Any],
+        preview: Optional[Dict] = None,
+        session: Optional[ImageSession] = None,
+        timer: Optional[StageTimer] = None,
+        image_scale: float = 1.0,
+    ) -> Tuple[np.ndarray, Optional[float], Optional[float], float, Hashable]:
+        """
+        Perspective corrects the image (or builds a preview proxy of it when
+        no coordinates are given), reusing corrections cached in the session
+
+        Args:
+            image_scale: Size of image relative to the uploaded image (reduced
+                decode), coordinates in data refer to the uploaded image
+
+        Returns:
+            (corrected image, x ratio, y ratio, preview scale relative to the
+            uploaded image, stage cache key identifying the corrected image)
+        """
+        if timer is None:
+            timer = StageTimer()
+
+        x_ratio = None
+        y_ratio = None
+        scale = 1.0
+        
+        # Handle coordinates if present (for initial processing)
+        if "coordinates" in data:
+            coordinates = ImageProcessor.parse_coordinates(data["coordinates"]) * image_scale
+            real_width_mm = float(data["realWidthMm"])
+            real_height_mm = float(data["realHeightMm"])
+
+            if preview:
+                target_width, target_height = DrawerDetector.get_target_size(
+                    DrawerDetector.order_corners(coordinates), real_width_mm, real_height_mm
+                )
+                scale = ImageProcessor.get_preview_scale(target_width, target_height, preview)
+
+            correction_key = RequestProcessor.get_correction_key(data, transformations, scale)
+            correction = None
+            if session is not None:
+                correction = session.get_correction(correction_key)
+
+            # Full resolution corrections of a known rig use its remap tables
+            rig = None
+            if correction is None and data.get("rigId") and scale == image_scale == 1.0:
+                rig = get_rig_store().get(str(data["rigId"]))
+                if rig is not None and not rig.matches(image):
+                    rig = None
+
+            if correction is None:
+                if rig is not None:
+                    with timer.span("remap"):
+                        correction = rig.correct(image)
+                else:
+                    with timer.span("warp"):
+                        # Sample the proxy from the smallest sufficient pyramid level
+                        level_image, level_scale = ImageProcessor.pyramid_down(image, scale)
+
+                        # Mirroring and rotation are folded into the perspective
+                        # warp, the image is resampled once
+                        source_transform, _ = ImageProcessor.get_transformation_matrix(
+                            level_image.shape[1],
+                            level_image.shape[0],
+                            bool(transformations["mirrored"]),
+                            int(transformations["rotation"]),
+                        )
+                        correction = DrawerDetector.process_drawer_image(
+                            level_image,
+                            coordinates * level_scale,
+                            real_width_mm,
+                            real_height_mm,
+                            scale / level_scale,
+                            source_transform,
+                        )
+                if session is not None:
+                    session.set_correction(correction_key, correction)
+
+            corrected_image, x_ratio, y_ratio = correction
+            stage_cache_key = correction_key
+        else:
+            # For edge detection updates, use the image as is
+            height, width = image.shape[:2]
+            if preview:
+                scale = ImageProcessor.get_preview_scale(width, height, preview)
+            stage_cache_key = ("original", scale)
+            corrected_image = None
+            if session is not None and scale != 1.0:
+                correction = session.get_correction(stage_cache_key)
+                if correction is not None:
+                    corrected_image = correction[0]
+            if corrected_image is None:
+                with timer.span("proxy"):
+                    corrected_image = ImageProcessor.build_proxy(image, scale)
+                if session is not None and scale != 1.0:
+                    session.set_correction(stage_cache_key, (corrected_image, None, None))
+            # Calculate ratios based on image size and real dimensions if available
+            if "realWidthMm" in data and "realHeightMm" in data:
+                height, width = corrected_image.shape[:2]
+                x_ratio = width / float(data["realWidthMm"])
+                y_ratio = height / float(data["realHeightMm"])
+
+        return corrected_image, x_ratio, y_ratio, scale * image_scale, stage_cache_key
+
+    @staticmethod
+    def detect_in_drawer(
+        data: Dict,
+        image: np.ndarray,
+        transformations: Dict[str, Any],
+        outputs: Set[str],
+        session: Optional[ImageSession] = None,
+        timer: Optional[StageTimer] = None,
+    ) -> Dict:
+        """
+        Contour space perspective mode: runs edge detection inside the drawer
+        quadrilateral of the uncorrected image and maps only the contour
+        vertices through the perspective homography. The image is warped
+        only when "processedImage" or "contouredImage" is requested, the edge
+        image only when "edgeImage" is
+
+        Returns:
+            Dictionary with "image" and "edge_image" (corrected arrays or
+            None), "contours" in corrected image pixels, the corrected
+            "image_size" as [width, height], "x_ratio" and "y_ratio"
+        """
+        if timer is None:
+            timer = StageTimer()
+
+        real_width_mm = float(data["realWidthMm"])
+        real_height_mm = float(data["realHeightMm"])
+        edge_settings = RequestProcessor.parse_edge_settings(data)
+        min_contour_area = edge_settings.pop("min_contour_area")
+
+        corners = DrawerDetector.order_corners(
+            ImageProcessor.parse_coordinates(data["coordinates"]).astype(np.float64)
+        )
+        target_width, target_height = DrawerDetector.get_target_size(
+            corners, real_width_mm, real_height_mm
+        )
+
+        # Corners refer to the mirrored/rotated image, the image itself is
+        # never transformed: corners are mapped back into it and the
+        # transformation becomes part of the homography
+        source_transform, _ = ImageProcessor.get_transformation_matrix(
+            image.shape[1],
+            image.shape[0],
+            bool(transformations["mirrored"]),
+            int(transformations["rotation"]),
+        )
+        source_corners = cv.perspectiveTransform(
+            corners.reshape(-1, 1, 2), np.linalg.inv(source_transform)
+        ).reshape(-1, 2)
+        matrix = (
+            DrawerDetector.get_perspective_matrix(corners, target_width, target_height)
+            @ source_transform
+        )
+        roi = DrawerDetector.get_quad_roi(source_corners, image.shape)
+        x_min, y_min, x_max, y_max = roi
+
+        # Edge detection on the drawer bounding box only, edges outside the
+        # drawer are masked after closing so the mask adds no edges itself
+        cache = session.stage_cache if session is not None else None
+        cache_key = ("drawer",) + RequestProcessor.get_correction_key(data, transformations)
+        closed = EdgeDetector.prepare_image(
+            image[y_min:y_max, x_min:x_max],
+            **edge_settings,
+            cache=cache,
+            cache_key=cache_key,
+            timer=timer,
+        )
+
+        with timer.span("mask"):
+            edges = cv.bitwise_and(closed, DrawerDetector.get_quad_mask(source_corners, roi))
+
+        def mapped_contours():
+            with timer.span("contours"):
+                found = EdgeDetector.find_contours(edges, 0)
+
+            with timer.span("map"):
+                vertices = found.vertices + np.array([x_min, y_min], np.float32)
+                mapped = cv.perspectiveTransform(vertices.reshape(-1, 1, 2), matrix)
+                return PackedContours(mapped, found.offsets)
+
+        if cache is not None:
+            contours_key = (cache_key,) + tuple(edge_settings.values())
+            contours = cache.get_or_compute("contours", contours_key, mapped_contours)
+            session.notify_change()
+        else:
+            contours = mapped_contours()
+
+        # Area filter in corrected pixels, as in the image warping mode
+        with timer.span("filter"):
+            contours = contours.filter(contours.areas() > min_contour_area)
+
+        corrected_image = None
+        if "processedImage" in outputs or "contouredImage" in outputs:
+            corrected_image = RequestProcessor.correct_image(
+                data, image, transformations, None, session, timer
+            )[0]
+
+        edge_image = None
+        if "edgeImage" in outputs:
+            with timer.span("warp"):
+                # The edge mask is cropped, shift it back into the image first
+                offset = np.array([[1, 0, x_min], [0, 1, y_min], [0, 0, 1]], np.float64)
+                edge_image = cv.warpPerspective(
+                    edges, matrix @ offset, (target_width, target_height), flags=cv.INTER_NEAREST
+                )
+
+        return {
+            "image": corrected_image,
+            "edge_image": edge_image,
+            "contours": contours,
+            "image_size": [target_width, target_height],
+            "x_ratio": target_width / real_width_mm,
+            "y_ratio": target_height / real_height_mm,
+        }
+
+    @staticmethod
+    def process_request(
+        data: Dict,
+        session: Optional[ImageSession] = None,
+        image: Optional[np.ndarray] = None,
+        timer: Optional[StageTimer] = None,
+        image_scale: float = 1.0,
+    ) -> Dict:
+        """
+        Main processing pipeline
+
+        With "preview" in data (and no "commit": true) the pipeline runs on a
+        downscaled proxy sized to the preview viewport, edge settings are
+        scaled to match and no DXF is generated. A commit request runs the
+        exact full resolution pass.
+
+        "simplifyToleranceMm" simplifies the contours (Douglas-Peucker) before
+        they are drawn and exported, it needs real dimensions for the ratios.
+
+        "measure": true adds ShapeMeasurer measurements in mm of every
+        contour ("measurements"), it needs real dimensions as well.
+
+        "perspectiveMode": "contours" runs full resolution requests with
+        coordinates through detect_in_drawer, so DXF only requests never
+        warp the image.
+
+        Args:
+            data: Request data, "imageData" is only read when no image is given
+            session: Image session holding the already decoded image
+            image: Already decoded image, e.g. from a binary upload
+            timer: Collects decode, warp, edge stage, contours,
+                simplify, measure, draw and dxf spans
+            image_scale: Size of image relative to the uploaded image, below
+                1.0 for reduced preview decodes
+
+        Returns:
+            Dictionary with the corrected, contoured and edge images as arrays
+            (None when not produced), the contours (PackedContours) and the
+            [width, height] of the corrected image they refer to
+            ("image_size"), the contour measurements ("measurements", None
+            unless "measure" is set), ratios, transformations, the raw DXF
+            bytes ("dxf_bytes"), the preview scale ("preview_scale", 1.0 at
+            full resolution) and the input size in megapixels ("megapixels").
+            The contoured image and DXF are None unless listed in "outputs"
+        """
+        transformations = data.get(
+            "transformations", RequestProcessor.get_default_transformations()
+        )
+        outputs = RequestProcessor.parse_outputs(data)
+        preview = None if data.get("commit") else data.get("preview")
+        if timer is None:
+            timer = StageTimer()
+
+        if session is not None:
+            image = session.image
+        elif image is None:
+            with timer.span("decode"):
+                image = ImageProcessor.decode_image(data["imageData"])
+
+        perspective_mode = data.get("perspectiveMode", "image")
+        if perspective_mode not in PERSPECTIVE_MODES:
+            raise ValueError(f"Unknown perspectiveMode: {perspective_mode}")
+
+        if perspective_mode == "contours" and "coordinates" in data and not preview:
+            scale = 1.0
+            drawer_results = RequestProcessor.detect_in_drawer(
+                data, image, transformations, outputs, session, timer
+            )
+            corrected_image = drawer_results["image"]
+            edge_image = drawer_results["edge_image"]
+            contours = drawer_results["contours"]
+            image_size = drawer_results["image_size"]
+            x_ratio = drawer_results["x_ratio"]
+            y_ratio = drawer_results["y_ratio"]
+        else:
+            corrected_image, x_ratio, y_ratio, scale, stage_cache_key = (
+                RequestProcessor.correct_image(
+                    data, image, transformations, preview, session, timer, image_scale
+                )
+            )
+
+            edge_settings = EdgeDetector.scale_settings(
+                RequestProcessor.parse_edge_settings(data), scale
+            )
+
+            # Run edge detection and find contours, drawn after simplification
+            edge_results = EdgeDetector.process_image(
+                corrected_image,
+                return_edges=True,
+                draw=False,
+                **edge_settings,
+                cache=session.stage_cache if session is not None else None,
+                cache_key=stage_cache_key,
+                timer=timer,
+            )
+            if session is not None:
+                session.notify_change()
+
+            edge_image = edge_results["edge_image"]
+            contours = edge_results["contours"]
+            image_size = [corrected_image.shape[1], corrected_image.shape[0]]
+
+        simplify_tolerance = float(data.get("simplifyToleranceMm") or 0)
+        if simplify_tolerance > 0 and x_ratio is not None and y_ratio is not None:
+            with timer.span("simplify"):
+                contours = contours.simplify(simplify_tolerance, x_ratio, y_ratio)
+
+        measurements = None
+        if data.get("measure") and x_ratio is not None and y_ratio is not None:
+            with timer.span("measure"):
+                measurements = ShapeMeasurer.to_records(
+                    ShapeMeasurer.measure(contours, x_ratio, y_ratio)
+                )
+
+        contoured_image = None
+        if "contouredImage" in outputs:
+            # A corrected image of our own that is not returned can be drawn on
+            in_place = (
+                "processedImage" not in outputs
+                and session is None
+                and corrected_image is not image
+            )
+            with timer.span("draw"):
+                contoured_image = EdgeDetector.draw_contours(
+                    corrected_image, contours, in_place=in_place
+                )
+
+        # Generate DXF in memory if we have valid ratios and dimensions
+        dxf_bytes = None
+        if (
+            "dxf" in outputs
+            and scale == 1.0
+            and x_ratio is not None
+            and y_ratio is not None
+            and "realWidthMm" in data
+            and "realHeightMm" in data
+        ):
+            with timer.span("dxf"):
+                dxf_bytes = contours_to_dxf_bytes(
+                    contours,
                     x_ratio,
                     y_ratio,
                     float(data["realWidthMm"]),
-                    float(data["realHeightMm"])
+                    float(data["realHeightMm"]),
+                    binary=data.get("dxfFormat") == "binary",
                 )
-                # Read the DXF file and encode it as base64
-                with open(dxf_path, 'rb') as dxf_file:
-                    dxf_data = base64.b64encode(dxf_file.read()).decode('utf-8')
-                # Clean up the temporary file
-                os.unlink(dxf_path)
 
         result = {
             "image": corrected_image,
-            "contoured_image": edge_results["contoured_image"],
-            "edge_image": ImageProcessor.encode_image(edge_results["edge_image"]),
+            "contoured_image": contoured_image,
+            "edge_image": edge_image,
+            "contours": contours,
+            "image_size": image_size,
+            "measurements": measurements,
             "transformations": transformations,
             "x_ratio": x_ratio,
             "y_ratio": y_ratio,
-            "dxf_data": dxf_data
+            "dxf_bytes": dxf_bytes,
+            "preview_scale": scale,
+            "megapixels": image.shape[0] * image.shape[1] / image_scale**2 / 1e6,
         }
 
         # Include coordinates if they were provided
@@ -0,0 +1,213 @@
+"""
+Content addressed, disk backed cache of processing results
+
+Entries are keyed by a hash of the image bytes plus every processing
+parameter, so an unchanged drawer reopened later (or by another client)
+skips the pipeline. The same key serves as HTTP ETag
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from detection.packed_contours import PackedContours
+
+DEFAULT_DIRECTORY = os.environ.get(
+    "ALIGNER_RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "aligner-results")
+)
+DEFAULT_MAX_BYTES = int(os.environ.get("ALIGNER_RESULT_CACHE_MB", "1024")) * 1024 * 1024
+
+# Request fields that do not change the produced result
+VOLATILE_FIELDS = ("imageData", "sessionId", "includeTimings")
+
+# Part of every key, bump it whenever a change alters the results of
+# unchanged requests (decoding, correction, edge detection, encoding) so
+# stale entries on disk are no longer served
+PIPELINE_VERSION = "4"
+
+
+class ResultCache:
+    """
+    Stores job results (metadata, encoded artifacts and contours) as one
+    .npz file per key, evicting the least recently used files once the
+    directory exceeds max_bytes. Hits refresh the file mtime, so the LRU
+    order survives restarts. Unreadable entries count as misses
+
+    Args:
+        directory: Cache directory, created if missing
+        max_bytes: Size cap of all entries, 0 disables the cache
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+            self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def hash_content(buffer: bytes) -> str:
+        """Hash of encoded image bytes"""
+        return hashlib.sha256(buffer).hexdigest()
+
+    @staticmethod
+    def make_key(content_hash: str, data: Dict, kind: str = "process") -> str:
+        """
+        Key of a request: pipeline version, image hash, job kind and the
+        canonical JSON of all parameters except the image itself, the session
+        id and timing flags
+        """
+        params = {name: value for name, value in data.items() if name not in VOLATILE_FIELDS}
+        canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+        digest = hashlib.sha256()
+        for part in (PIPELINE_VERSION, content_hash, kind, canonical):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".npz")
+
+    def _load_index(self) -> None:
+        """Rebuilds the LRU index from the files on disk, oldest first"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npz"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name[: -len(".npz")], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._bytes += size
+        self._evict()
+
+    def _evict(self) -> None:
+        """Removes least recently used files until the size cap is met, needs _lock"""
+        while self._bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _discard(self, key: str) -> None:
+        with self._lock:
+            size = self._entries.pop(key, None)
+            if size is not None:
+                self._bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached job for key as {"result", "artifacts", "contours"},
+        or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            known = key in self._entries
+            if known:
+                self._entries.move_to_end(key)
+        if not known:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as stored:
+                meta = json.loads(stored["meta"].tobytes().decode("utf-8"))
+                artifacts = [
+                    (name, content_type, stored[f"artifact_{index}"].tobytes())
+                    for index, (name, content_type) in enumerate(meta["artifacts"])
+                ]
+                contours = PackedContours(stored["vertices"], stored["offsets"])
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            self._discard(key)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return {"result": meta["result"], "artifacts": artifacts, "contours": contours}
+
+    def put(self, key: str, job: Dict[str, Any]) -> None:
+        """Stores a job result, write failures only skip caching"""
+        if not self.enabled:
+            return
+
+        meta = {
+            "result": job["result"],
+            "artifacts": [[name, content_type] for name, content_type, _ in job["artifacts"]],
+        }
+        arrays = {
+            "meta": np.frombuffer(json.dumps(meta).encode("utf-8"), np.uint8),
+            "vertices": job["contours"].vertices,
+            "offsets": job["contours"].offsets,
+        }
+        for index, (_, _, body) in enumerate(job["artifacts"]):
+            arrays[f"artifact_{index}"] = np.frombuffer(body, np.uint8)
+
+        path = self._path(key)
+        try:
+            # Written next to the target and renamed, readers never see partial files
+            handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(handle, "wb") as temp_file:
+                np.savez(temp_file, **arrays)
+            os.replace(temp_path, path)
+            size = os.path.getsize(path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        """Current cache usage and hit/miss counts"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
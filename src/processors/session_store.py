@@ -0,0 +1,160 @@
+"""
+In-process image session cache
+
+Keeps decoded uploads and their perspective corrected variants in memory, so
+follow up requests only need to send a session id instead of the whole photo
+"""
+
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+from detection.stage_cache import StageCache
+
+DEFAULT_MAX_BYTES = int(os.environ.get("ALIGNER_SESSION_CACHE_MB", "512")) * 1024 * 1024
+
+
+class ImageSession:
+    """
+    Decoded image of one upload plus its last perspective corrected variants
+    (e.g. a preview proxy and the full resolution one) and the memoized edge
+    detection stages computed on them
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        image: np.ndarray,
+        on_change: Optional[Callable[[], None]] = None,
+        max_corrections: int = 2,
+        content_hash: Optional[str] = None,
+    ):
+        self.session_id = session_id
+        self.image = image
+        self.content_hash = content_hash
+        self.max_corrections = max_corrections
+        self._on_change = on_change
+        self._corrections: "OrderedDict[Hashable, Tuple[np.ndarray, float, float]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self.stage_cache = StageCache(max_entries=4)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the session arrays"""
+        total = self.image.nbytes + self.stage_cache.nbytes
+        with self._lock:
+            total += sum(
+                correction[0].nbytes for correction in self._corrections.values()
+            )
+        return total
+
+    def notify_change(self) -> None:
+        """Lets the owning store re-check its memory cap"""
+        if self._on_change is not None:
+            self._on_change()
+
+    def get_correction(
+        self, key: Hashable
+    ) -> Optional[Tuple[np.ndarray, float, float]]:
+        """
+        Returns cached (corrected_image, x_ratio, y_ratio) for key, if present
+        """
+        with self._lock:
+            correction = self._corrections.get(key)
+            if correction is not None:
+                self._corrections.move_to_end(key)
+            return correction
+
+    def set_correction(
+        self, key: Hashable, correction: Tuple[np.ndarray, float, float]
+    ) -> None:
+        """
+        Caches a perspective corrected image, the least recently used one is
+        dropped once more than max_corrections are held
+        """
+        with self._lock:
+            self._corrections[key] = correction
+            while len(self._corrections) > self.max_corrections:
+                self._corrections.popitem(last=False)
+        self.notify_change()
+
+
+class SessionStore:
+    """
+    LRU cache of image sessions bounded by the total memory of their arrays
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, ImageSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def create(self, image: np.ndarray, content_hash: Optional[str] = None) -> ImageSession:
+        """
+        Stores a decoded image and returns its new session
+
+        Args:
+            image: Decoded image
+            content_hash: Hash of the encoded upload, enables the result cache
+        """
+        session = ImageSession(
+            uuid.uuid4().hex, image, self.enforce_limit, content_hash=content_hash
+        )
+        with self._lock:
+            self._sessions[session.session_id] = session
+        self.enforce_limit()
+        return session
+
+    def get(self, session_id: str) -> Optional[ImageSession]:
+        """Returns session by id and marks it as most recently used"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        """Drops a session, returns False if it did not exist"""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def enforce_limit(self) -> None:
+        """
+        Evicts least recently used sessions until the memory cap is met.
+        The most recent session is always kept, even if it alone exceeds the cap
+        """
+        with self._lock:
+            total = sum(session.nbytes for session in self._sessions.values())
+            while total > self.max_bytes and len(self._sessions) > 1:
+                _, evicted = self._sessions.popitem(last=False)
+                total -= evicted.nbytes
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Current cache usage and stage cache hit/miss totals"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+
+        hits: Dict[str, int] = {}
+        misses: Dict[str, int] = {}
+        for session in sessions:
+            stage_stats = session.stage_cache.stats()
+            for stage, count in stage_stats["hits"].items():
+                hits[stage] = hits.get(stage, 0) + count
+            for stage, count in stage_stats["misses"].items():
+                misses[stage] = misses.get(stage, 0) + count
+
+        return {
+            "sessions": len(sessions),
+            "bytes": sum(session.nbytes for session in sessions),
+            "maxBytes": self.max_bytes,
+            "evictions": self.evictions,
+            "stageCache": {"hits": hits, "misses": misses},
+        }
@@ -0,0 +1,348 @@
+"""
+Continuous contour detection on a video source (camera device or file)
+
+A capture thread keeps only the newest frame, so processing that falls
+behind skips frames instead of queueing them. The processing loop corrects
+each frame with the remap tables of the drawer geometry, averages the
+corrected frames over time so contours do not flicker, and runs the usual
+edge detection. A DXF of the latest contours can be taken at any time
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+import cv2 as cv
+import numpy as np
+
+from detection.edge_detecttor import EdgeDetector
+from detection.packed_contours import PackedContours
+from detection.rig_profile import RigProfile
+from monitoring.timing import StageTimer
+from processors.dxf_processor import contours_to_dxf_bytes
+
+# Frame rate assumed for sources that do not report one
+DEFAULT_SOURCE_FPS = 30.0
+
+
+class FrameGrabber:
+    """
+    Capture thread with a single latest-frame slot
+
+    Args:
+        source: Device index, device path (e.g. /dev/video0) or video file
+        paced: Deliver file frames at the file frame rate like a live
+            camera, frames the consumer misses are dropped. Unpaced files
+            hand over every frame and wait for the consumer, for
+            reproducible offline runs. Devices are always paced
+    """
+
+    def __init__(self, source: Union[int, str], paced: bool = True):
+        self.source = source
+        self.is_device = isinstance(source, int) or str(source).startswith("/dev/")
+        self.paced = paced or self.is_device
+        if isinstance(source, int):
+            # V4L2 directly on Linux, the default backend elsewhere
+            backend = cv.CAP_V4L2 if hasattr(cv, "CAP_V4L2") else cv.CAP_ANY
+            self.capture = cv.VideoCapture(source, backend)
+        else:
+            self.capture = cv.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise ValueError(f"Could not open video source: {source}")
+
+        fps = self.capture.get(cv.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else DEFAULT_SOURCE_FPS
+        self.captured = 0
+        self.ended = False
+        self._frame: Optional[Tuple[int, float, np.ndarray]] = None
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "FrameGrabber":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        """Reads frames until the source ends or stop is called"""
+        start = time.monotonic()
+        index = 0
+        try:
+            while not self._stopped:
+                ok, frame = self.capture.read()
+                if not ok:
+                    break
+
+                if self.paced and not self.is_device:
+                    delay = start + index / self.fps - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                with self._condition:
+                    # Paced frames replace a frame that was not taken yet
+                    while not self.paced and self._frame is not None and not self._stopped:
+                        self._condition.wait()
+                    self._frame = (index, time.monotonic(), frame)
+                    self.captured += 1
+                    self._condition.notify_all()
+                index += 1
+        finally:
+            self.capture.release()
+            with self._condition:
+                self.ended = True
+                self._condition.notify_all()
+
+    def read(self, timeout: float = 1.0) -> Optional[Tuple[int, float, np.ndarray]]:
+        """
+        Takes the newest frame, waiting up to timeout for one
+
+        Returns:
+            Tuple of (frame index, capture time, frame), or None when no frame
+            arrived in time or the source ended
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._frame is None:
+                remaining = deadline - time.monotonic()
+                if self.ended or remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            frame, self._frame = self._frame, None
+            self._condition.notify_all()
+            return frame
+
+    @property
+    def finished(self) -> bool:
+        """True once the source ended and its last frame was taken"""
+        with self._condition:
+            return self.ended and self._frame is None
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join(timeout=5)
+
+
+class TemporalStabilizer:
+    """
+    Exponential moving average of the corrected grayscale frames. Sensor
+    noise averages out, so edges close to the Canny thresholds stop
+    toggling between frames. A large change (a part was moved, the drawer
+    swapped) restarts the average instead of showing ghosts
+
+    Args:
+        alpha: Weight of the newest frame, 1 disables the averaging
+        reset_threshold: Mean absolute grey level difference to the average
+            that restarts it
+    """
+
+    def __init__(self, alpha: float = 0.3, reset_threshold: float = 12.0):
+        self.alpha = alpha
+        self.reset_threshold = reset_threshold
+        self.resets = 0
+        self._average: Optional[np.ndarray] = None
+        self._output: Optional[np.ndarray] = None
+
+    def update(self, gray_image: np.ndarray) -> np.ndarray:
+        """Adds a frame and returns the stabilized 8 bit image"""
+        if (
+            self._average is None
+            or self._average.shape != gray_image.shape
+            or self.alpha >= 1.0
+        ):
+            return self._reset(gray_image)
+
+        cv.convertScaleAbs(self._average, self._output)
+        if cv.mean(cv.absdiff(gray_image, self._output))[0] > self.reset_threshold:
+            self.resets += 1
+            return self._reset(gray_image)
+
+        cv.accumulateWeighted(gray_image, self._average, self.alpha)
+        return cv.convertScaleAbs(self._average, self._output)
+
+    def _reset(self, gray_image: np.ndarray) -> np.ndarray:
+        self._average = gray_image.astype(np.float32)
+        self._output = gray_image.copy()
+        return self._output
+
+
+class StreamProcessor:
+    """
+    Latest-frame contour detection loop for a fixed drawer geometry
+
+    Frames run on a single processing thread: the moving average needs
+    them in order, OpenCV spreads each stage over the available cores
+
+    Args:
+        profile: Drawer geometry, e.g. a stored rig, photos must have its size
+        edge_settings: RequestProcessor.parse_edge_settings output
+        scale: Processing size relative to the full resolution correction,
+            lower it when the target frame rate is not reached
+        alpha: TemporalStabilizer weight of the newest frame
+        target_fps: Upper bound of processed frames per second, 0 for none
+        keep_image: Also correct the colour frame (for display), otherwise
+            only its grayscale version is remapped
+    """
+
+    def __init__(
+        self,
+        profile: RigProfile,
+        edge_settings: Dict[str, Any],
+        scale: float = 1.0,
+        alpha: float = 0.3,
+        target_fps: float = 15.0,
+        keep_image: bool = False,
+    ):
+        self.profile = profile
+        self.keep_image = keep_image
+        self.scale = scale
+        self.target_fps = target_fps
+        self.maps = profile.build_maps(scale)
+        self.target_size = profile.scaled_target_size(scale)
+        self.x_ratio = self.target_size[0] / profile.real_width_mm
+        self.y_ratio = self.target_size[1] / profile.real_height_mm
+        self.edge_settings = EdgeDetector.scale_settings(edge_settings, scale)
+        self.stabilizer = TemporalStabilizer(alpha)
+
+        self.processed = 0
+        self.skipped = 0
+        self.latency_seconds = 0.0
+        self.stage_seconds: Dict[str, float] = {}
+        self.started: Optional[float] = None
+        self._latest: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def process_frame(self, frame: np.ndarray, timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+        """
+        Corrects, stabilizes and detects the contours of one frame
+
+        Returns:
+            Dictionary with "image" (corrected colour frame with keep_image,
+            else None), "contours" (in corrected pixels) and "timer"
+        """
+        if timer is None:
+            timer = StageTimer()
+        if not self.profile.matches(frame):
+            raise ValueError(
+                f"Frame is {frame.shape[1]}x{frame.shape[0]}, expected "
+                f"{self.profile.image_size[0]}x{self.profile.image_size[1]}"
+            )
+
+        corrected_image = None
+        with timer.span("remap"):
+            if self.keep_image:
+                corrected_image = cv.remap(frame, self.maps[0], self.maps[1], cv.INTER_LINEAR)
+                gray_image = EdgeDetector.to_grayscale(corrected_image)
+            else:
+                gray_image = cv.remap(
+                    EdgeDetector.to_grayscale(frame), self.maps[0], self.maps[1], cv.INTER_LINEAR
+                )
+        with timer.span("stabilize"):
+            stabilized = self.stabilizer.update(gray_image)
+
+        result = EdgeDetector.process_image(
+            stabilized, draw=False, timer=timer, **self.edge_settings
+        )
+        return {"image": corrected_image, "contours": result["contours"], "timer": timer}
+
+    def run(
+        self,
+        grabber: FrameGrabber,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+        duration: Optional[float] = None,
+        max_frames: Optional[int] = None,
+    ) -> None:
+        """
+        Processes the newest frame of grabber until the source ends, stop is
+        called, duration seconds passed or max_frames frames were processed
+
+        Args:
+            on_result: Called on this thread with every result, which has
+                "index", "latency" (seconds since capture), "image",
+                "contours" and "timer"
+        """
+        self.started = time.monotonic()
+        last_index = -1
+        next_start = self.started
+        while not self._stopped.is_set():
+            if duration is not None and time.monotonic() - self.started >= duration:
+                break
+            if max_frames is not None and self.processed >= max_frames:
+                break
+
+            # Pace to the target rate, the grabber keeps the newest frame meanwhile
+            if self.target_fps > 0:
+                delay = next_start - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_start = max(next_start + 1 / self.target_fps, time.monotonic())
+
+            frame = grabber.read(timeout=1.0)
+            if frame is None:
+                if grabber.finished:
+                    break
+                continue
+            index, captured, image = frame
+            self.skipped += index - last_index - 1
+            last_index = index
+
+            result = self.process_frame(image)
+            result["index"] = index
+            result["latency"] = time.monotonic() - captured
+            with self._lock:
+                self.processed += 1
+                self.latency_seconds += result["latency"]
+                for stage, seconds in result["timer"].spans:
+                    self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+                self._latest = result
+            if on_result is not None:
+                on_result(result)
+
+    def stop(self) -> None:
+        """Ends run after the current frame, callable from any thread"""
+        self._stopped.set()
+
+    def latest_contours(self) -> Optional[PackedContours]:
+        with self._lock:
+            return self._latest["contours"] if self._latest is not None else None
+
+    def snapshot_dxf(self, binary: bool = False) -> bytes:
+        """
+        DXF of the latest stabilized contours, in mm like /process-image
+
+        Raises:
+            RuntimeError: Before the first frame was processed
+        """
+        contours = self.latest_contours()
+        if contours is None:
+            raise RuntimeError("No frame processed yet")
+        return contours_to_dxf_bytes(
+            contours,
+            self.x_ratio,
+            self.y_ratio,
+            self.profile.real_width_mm,
+            self.profile.real_height_mm,
+            binary=binary,
+        )
+
+    def stats(self, grabber: Optional[FrameGrabber] = None) -> Dict[str, Any]:
+        """Processed/skipped frames, frame rate, mean latency and stage milliseconds"""
+        with self._lock:
+            elapsed = time.monotonic() - self.started if self.started is not None else 0.0
+            processed = max(self.processed, 1)
+            stats = {
+                "processed": self.processed,
+                "skipped": self.skipped,
+                "fps": self.processed / elapsed if elapsed > 0 else 0.0,
+                "meanLatencyMs": 1000 * self.latency_seconds / processed,
+                "stageMeanMs": {
+                    stage: 1000 * seconds / processed
+                    for stage, seconds in self.stage_seconds.items()
+                },
+                "stabilizerResets": self.stabilizer.resets,
+            }
+        if grabber is not None:
+            stats["captured"] = grabber.captured
+        return stats
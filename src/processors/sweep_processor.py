@@ -0,0 +1,314 @@
+"""
+Parallel sweep over edge detection settings, used to tune
+edgeDetectionSettings in one request instead of one round trip per try
+"""
+
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from detection.edge_detecttor import EdgeDetector
+from monitoring.timing import StageTimer
+from processors.image_processor import ImageProcessor
+from processors.request_processor import RequestProcessor
+from processors.session_store import ImageSession
+from processors.worker_pool import available_cores
+
+# Upper bound on evaluated settings per sweep
+MAX_SWEEP_SETTINGS = 256
+
+DEFAULT_THUMBNAIL_SIZE = 160
+MAX_THUMBNAIL_SIZE = 1024
+
+SWEEP_PARAMETERS = ("blurKernelSize", "cannyLow", "cannyHigh", "morphKernelSize")
+
+
+class SweepProcessor:
+    """
+    Evaluates a grid of blur, Canny and morph settings on one image. The
+    grayscale image is computed once, every blur once and every Canny output
+    once, and the grid is spread over a thread pool (OpenCV releases the GIL)
+    """
+
+    @staticmethod
+    def parse_values(spec: Any) -> List[Any]:
+        """
+        Values of one sweep parameter: a list of values, a single value or an
+        inclusive range {"start": 20, "stop": 60, "step": 10}
+        """
+        if isinstance(spec, dict):
+            start = int(spec["start"])
+            stop = int(spec.get("stop", start))
+            step = int(spec.get("step", 1))
+            if step <= 0:
+                raise ValueError("Sweep range step must be positive")
+            return list(range(start, stop + 1, step))
+        if isinstance(spec, list):
+            return spec
+        return [spec]
+
+    @staticmethod
+    def parse_kernel(value: Any, odd: bool) -> Tuple[int, int]:
+        """Kernel size from a single size or a [width, height] pair"""
+        if isinstance(value, (list, tuple)):
+            if len(value) != 2:
+                raise ValueError(f"Invalid kernel size: {value}")
+            kernel = (int(value[0]), int(value[1]))
+        else:
+            kernel = (int(value), int(value))
+
+        if min(kernel) < 1 or (odd and (kernel[0] % 2 == 0 or kernel[1] % 2 == 0)):
+            raise ValueError(f"Invalid kernel size: {list(kernel)}")
+        return kernel
+
+    @staticmethod
+    def parse_thumbnail_size(data: Dict) -> int:
+        """Longest thumbnail side from data["thumbnailSize"], 1 to MAX_THUMBNAIL_SIZE"""
+        size = data.get("thumbnailSize", DEFAULT_THUMBNAIL_SIZE)
+        if isinstance(size, bool) or not isinstance(size, int):
+            raise ValueError(f"Invalid thumbnail size: {size}")
+        if not 1 <= size <= MAX_THUMBNAIL_SIZE:
+            raise ValueError(f"Thumbnail size must be between 1 and {MAX_THUMBNAIL_SIZE}")
+        return size
+
+    @staticmethod
+    def parse_grid(data: Dict) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        Expands data["sweep"] into a list of settings, parameters missing from
+        the sweep come from "edgeDetectionSettings". Canny pairs with the low
+        threshold above the high one are skipped. Also validates thumbnailSize
+
+        Returns:
+            (list of prepare_image keyword arguments, min contour area)
+        """
+        base = RequestProcessor.parse_edge_settings(data)
+        sweep = data.get("sweep") or {}
+        unknown = [name for name in sweep if name not in SWEEP_PARAMETERS]
+        if unknown:
+            raise ValueError(f"Unknown sweep parameters: {', '.join(map(str, unknown))}")
+
+        blur_kernels = [
+            SweepProcessor.parse_kernel(value, True)
+            for value in SweepProcessor.parse_values(
+                sweep.get("blurKernelSize", [list(base["blur_kernel_size"])])
+            )
+        ]
+        canny_lows = [int(value) for value in SweepProcessor.parse_values(
+            sweep.get("cannyLow", base["canny_low"])
+        )]
+        canny_highs = [int(value) for value in SweepProcessor.parse_values(
+            sweep.get("cannyHigh", base["canny_high"])
+        )]
+        morph_kernels = [
+            SweepProcessor.parse_kernel(value, False)
+            for value in SweepProcessor.parse_values(
+                sweep.get("morphKernelSize", [list(base["morph_kernel_size"])])
+            )
+        ]
+
+        grid = []
+        for blur_kernel, canny_low, canny_high, morph_kernel in itertools.product(
+            dict.fromkeys(blur_kernels),
+            dict.fromkeys(canny_lows),
+            dict.fromkeys(canny_highs),
+            dict.fromkeys(morph_kernels),
+        ):
+            if canny_low > canny_high:
+                continue
+            grid.append(
+                {
+                    "blur_kernel_size": blur_kernel,
+                    "canny_low": canny_low,
+                    "canny_high": canny_high,
+                    "morph_kernel_size": morph_kernel,
+                }
+            )
+
+        if not grid:
+            raise ValueError("Sweep has no valid settings")
+        if len(grid) > MAX_SWEEP_SETTINGS:
+            raise ValueError(
+                f"Sweep has {len(grid)} settings, at most {MAX_SWEEP_SETTINGS} are allowed"
+            )
+        SweepProcessor.parse_thumbnail_size(data)
+        return grid, base["min_contour_area"]
+
+    @staticmethod
+    def sweep(
+        image: np.ndarray,
+        grid: List[Dict[str, Any]],
+        min_contour_area: float = 1000,
+        scale: float = 1.0,
+        thumbnail_size: int = DEFAULT_THUMBNAIL_SIZE,
+        workers: Optional[int] = None,
+        gray_image: Optional[np.ndarray] = None,
+        timer: Optional[StageTimer] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Runs edge detection for every setting of grid
+
+        Args:
+            image: Corrected BGR image
+            grid: prepare_image keyword arguments per setting, at full resolution
+            min_contour_area: Minimum contour area at full resolution
+            scale: Size of image relative to full resolution (preview proxy),
+                settings and areas are scaled accordingly
+            thumbnail_size: Longest side of the contour thumbnails
+            workers: Threads, defaults to the available cores
+            gray_image: Already computed grayscale image
+            timer: Collects gray, blur, canny, close, contours and thumbnail spans
+
+        Returns:
+            One result per setting in grid order with "settings",
+            "contourCount", "totalContourArea" (full resolution pixels) and
+            "thumbnail" (JPEG data URL)
+        """
+        if timer is None:
+            timer = StageTimer()
+        if workers is None:
+            workers = available_cores()
+
+        scaled_grid = [
+            EdgeDetector.scale_settings(dict(settings, min_contour_area=min_contour_area), scale)
+            for settings in grid
+        ]
+
+        if gray_image is None:
+            with timer.span("gray"):
+                gray_image = EdgeDetector.to_grayscale(image)
+
+        height, width = image.shape[:2]
+        thumbnail_scale = min(1.0, thumbnail_size / max(width, height))
+        thumbnail_base = ImageProcessor.build_proxy(image, thumbnail_scale)
+
+        def blur(kernel: Tuple[int, int]) -> np.ndarray:
+            with timer.span("blur"):
+                return EdgeDetector.blur(gray_image, kernel)
+
+        def evaluate(canny_group: Tuple[Tuple, List[int]]) -> List[Tuple[int, Dict]]:
+            (kernel, canny_low, canny_high), indices = canny_group
+            with timer.span("canny"):
+                edges = EdgeDetector.detect_edges(blurred[kernel], canny_low, canny_high)
+
+            results = []
+            for index in indices:
+                settings = scaled_grid[index]
+                with timer.span("close"):
+                    closed = EdgeDetector.close_edges(edges, settings["morph_kernel_size"])
+                with timer.span("contours"):
+                    contours = EdgeDetector.find_contours(closed, settings["min_contour_area"])
+                    total_area = float(contours.areas().sum())
+                with timer.span("thumbnail"):
+                    thumbnail = EdgeDetector.draw_contours(
+                        thumbnail_base, contours.scaled(thumbnail_scale), thickness=1
+                    )
+                    thumbnail_url = ImageProcessor.encode_image(thumbnail, "jpeg", quality=70)
+                results.append(
+                    (
+                        index,
+                        {
+                            "contourCount": len(contours),
+                            "totalContourArea": total_area / (scale * scale),
+                            "thumbnail": thumbnail_url,
+                        },
+                    )
+                )
+            return results
+
+        # One Canny run per (blur, low, high), shared by all morph kernels
+        canny_groups: Dict[Tuple, List[int]] = {}
+        for index, settings in enumerate(scaled_grid):
+            group_key = (
+                settings["blur_kernel_size"], settings["canny_low"], settings["canny_high"]
+            )
+            canny_groups.setdefault(group_key, []).append(index)
+
+        kernels = list(dict.fromkeys(settings["blur_kernel_size"] for settings in scaled_grid))
+        results: List[Optional[Dict[str, Any]]] = [None] * len(grid)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            blurred = dict(zip(kernels, executor.map(blur, kernels)))
+            for group_results in executor.map(evaluate, canny_groups.items()):
+                for index, result in group_results:
+                    results[index] = result
+
+        for settings, result in zip(grid, results):
+            result["settings"] = {
+                "blurKernelSize": list(settings["blur_kernel_size"]),
+                "cannyLow": settings["canny_low"],
+                "cannyHigh": settings["canny_high"],
+                "morphKernelSize": list(settings["morph_kernel_size"]),
+            }
+        return results
+
+    @staticmethod
+    def process_job(
+        data: Dict,
+        session: Optional[ImageSession] = None,
+        image: Optional[np.ndarray] = None,
+        image_bytes: Optional[bytes] = None,
+    ) -> Dict:
+        """
+        Decodes and corrects the image like RequestProcessor.process_job and
+        sweeps the settings of data["sweep"] over it
+
+        Returns:
+            Dictionary with "result" (sweep results, ratios, preview scale and
+            megapixels) and "spans" (timing spans as (stage, seconds))
+        """
+        timer = StageTimer()
+        grid, min_contour_area = SweepProcessor.parse_grid(data)
+
+        image_scale = 1.0
+        if session is not None:
+            image = session.image
+        elif image is None:
+            image, image_scale = RequestProcessor.decode_request_image(data, image_bytes, timer)
+
+        transformations = data.get(
+            "transformations", RequestProcessor.get_default_transformations()
+        )
+        corrected_image, x_ratio, y_ratio, scale, stage_cache_key = (
+            RequestProcessor.correct_image(
+                data, image, transformations, data.get("preview"), session, timer, image_scale
+            )
+        )
+
+        gray_image = None
+        if session is not None:
+            # Shares the grayscale stage with /process-image on the same session
+            def gray():
+                with timer.span("gray"):
+                    return EdgeDetector.to_grayscale(corrected_image)
+
+            gray_image = session.stage_cache.get_or_compute("gray", (stage_cache_key,), gray)
+
+        results = SweepProcessor.sweep(
+            corrected_image,
+            grid,
+            min_contour_area,
+            scale,
+            SweepProcessor.parse_thumbnail_size(data),
+            gray_image=gray_image,
+            timer=timer,
+        )
+        if session is not None:
+            session.notify_change()
+
+        if x_ratio is not None and y_ratio is not None:
+            # Ratios are px/mm of the (possibly downscaled) corrected image
+            mm_per_px = scale * scale / (x_ratio * y_ratio)
+            for result in results:
+                result["totalContourAreaMm2"] = result["totalContourArea"] * mm_per_px
+
+        return {
+            "result": {
+                "results": results,
+                "x_ratio": x_ratio,
+                "y_ratio": y_ratio,
+                "preview_scale": scale,
+                "megapixels": image.shape[0] * image.shape[1] / image_scale**2 / 1e6,
+            },
+            "spans": timer.spans,
+        }
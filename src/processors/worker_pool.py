@@ -0,0 +1,226 @@
+"""
+Bounded process pool for CPU heavy OpenCV jobs
+
+Every worker slot owns one child process. Jobs wait in a bounded queue,
+submitting to a full queue fails immediately, and a job running longer than
+its timeout gets its child process killed and replaced
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+import cv2 as cv
+
+from errors.error import JobTimeoutError, QueueFullError
+
+
+def worker_main(connection) -> None:
+    """Child process loop: receives (function, args), sends back (ok, value)"""
+    # The pool already occupies every core, nested OpenCV threads only contend
+    cv.setNumThreads(1)
+
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        function, args = message
+        try:
+            connection.send((True, function(*args)))
+        except Exception as e:
+            try:
+                connection.send((False, e))
+            except Exception:
+                connection.send((False, RuntimeError(repr(e))))
+
+
+class Job:
+    """Queued call with the future its caller waits on"""
+
+    def __init__(self, function: Callable, args: tuple, timeout: Optional[float]):
+        self.function = function
+        self.args = args
+        self.timeout = timeout
+        self.future: Future = Future()
+
+
+class WorkerSlot:
+    """Thread feeding jobs from the queue to its own child process"""
+
+    def __init__(self, pool: "WorkerPool", index: int):
+        self.pool = pool
+        self.index = index
+        self.process = None
+        self.connection = None
+        self.thread = threading.Thread(
+            target=self.run, name=f"cv-worker-{index}", daemon=True
+        )
+
+    def start_process(self) -> None:
+        """Starts (or replaces) the child process of this slot"""
+        parent_connection, child_connection = self.pool.context.Pipe()
+        self.process = self.pool.context.Process(
+            target=worker_main, args=(child_connection,), daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+        self.connection = parent_connection
+
+    def kill_process(self) -> None:
+        """Terminates the child process, used for runaway or broken jobs"""
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        if self.connection is not None:
+            self.connection.close()
+        self.process = None
+        self.connection = None
+
+    def run(self) -> None:
+        self.start_process()
+        while True:
+            job = self.pool.jobs.get()
+            if job is None:
+                break
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            self.pool.job_started()
+            try:
+                self.execute(job)
+            finally:
+                self.pool.job_finished()
+
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.kill_process()
+
+    def execute(self, job: Job) -> None:
+        """Runs one job in the child process and resolves its future"""
+        if self.process is None or not self.process.is_alive():
+            self.start_process()
+
+        try:
+            self.connection.send((job.function, job.args))
+            if not self.connection.poll(job.timeout):
+                self.kill_process()
+                self.start_process()
+                self.pool.timeouts += 1
+                job.future.set_exception(
+                    JobTimeoutError(f"Job exceeded its {job.timeout:g}s time limit")
+                )
+                return
+
+            success, value = self.connection.recv()
+        except (EOFError, OSError) as e:
+            self.kill_process()
+            self.start_process()
+            job.future.set_exception(RuntimeError(f"Worker process failed: {e}"))
+            return
+
+        if success:
+            job.future.set_result(value)
+        else:
+            job.future.set_exception(value)
+
+
+class WorkerPool:
+    """
+    Fixed size process pool with a bounded job queue and per job timeouts
+
+    Args:
+        workers: Number of child processes, defaults to the available cores
+        queue_size: Jobs allowed to wait for a free worker, defaults to workers
+        timeout: Seconds a job may run before its process is killed
+        retry_after: Seconds clients are asked to wait when the queue is full
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        timeout: Optional[float] = 60.0,
+        retry_after: int = 2,
+    ):
+        if workers is None:
+            workers = available_cores()
+        if queue_size is None:
+            queue_size = workers
+
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.context = multiprocessing.get_context("spawn")
+        self.jobs: "queue.Queue[Optional[Job]]" = queue.Queue(maxsize=queue_size)
+        self.timeouts = 0
+        self.rejected = 0
+        self._busy = 0
+        self._lock = threading.Lock()
+        self._slots = [WorkerSlot(self, index) for index in range(workers)]
+        for slot in self._slots:
+            slot.thread.start()
+
+    def job_started(self) -> None:
+        with self._lock:
+            self._busy += 1
+
+    def job_finished(self) -> None:
+        with self._lock:
+            self._busy -= 1
+
+    def submit(self, function: Callable, *args: Any, timeout: Optional[float] = None) -> Future:
+        """
+        Queues function(*args) for a worker process, function and args must be
+        picklable. Raises QueueFullError when no queue slot is free
+        """
+        job = Job(function, args, self.timeout if timeout is None else timeout)
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            self.rejected += 1
+            raise QueueFullError("Server is busy, retry later") from None
+        return job.future
+
+    def run(self, function: Callable, *args: Any, timeout: Optional[float] = None) -> Any:
+        """Submits function(*args) and waits for its result"""
+        return self.submit(function, *args, timeout=timeout).result()
+
+    def shutdown(self) -> None:
+        """Stops all worker processes after the queued jobs are done"""
+        for _ in self._slots:
+            self.jobs.put(None)
+        for slot in self._slots:
+            slot.thread.join()
+
+    def stats(self) -> Dict[str, int]:
+        """Current pool usage"""
+        with self._lock:
+            busy = self._busy
+        return {
+            "workers": self.workers,
+            "busy": busy,
+            "queued": self.jobs.qsize(),
+            "queueSize": self.queue_size,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+def available_cores() -> int:
+    """Cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
@@ -0,0 +1,59 @@
+"""
+Production entry point: serves the Flask app with CV jobs on a bounded
+process pool
+
+Usage:
+    python serve.py [--host 0.0.0.0] [--port 5000] [--workers N]
+                    [--queue-size M] [--timeout SECONDS] [--threads T]
+
+Uses waitress when it is installed, otherwise the threaded werkzeug server.
+Requests fail fast with 503 and Retry-After when the job queue is full, and
+with 504 when a job exceeds its timeout (its worker process is replaced)
+"""
+
+import argparse
+
+from app import app, set_worker_pool
+from processors.worker_pool import WorkerPool, available_cores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the image processing API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=available_cores(),
+                        help="CV worker processes, defaults to the available cores")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="Jobs allowed to wait for a worker, defaults to --workers")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="Seconds a job may run before it is cancelled")
+    parser.add_argument("--retry-after", type=int, default=2,
+                        help="Retry-After seconds sent when the queue is full")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="HTTP handler threads, defaults to workers + queue size + 4")
+    args = parser.parse_args()
+
+    pool = WorkerPool(args.workers, args.queue_size, args.timeout, args.retry_after)
+    set_worker_pool(pool)
+
+    # Enough handler threads for every running and queued job plus light requests
+    threads = args.threads or pool.workers + pool.queue_size + 4
+
+    try:
+        try:
+            from waitress import serve
+        except ImportError:
+            serve = None
+
+        if serve is not None:
+            serve(app, host=args.host, port=args.port, threads=threads)
+        else:
+            from werkzeug.serving import run_simple
+
+            run_simple(args.host, args.port, app, threaded=True)
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
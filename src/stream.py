@@ -0,0 +1,181 @@
+"""
+Stream entry point: live contour detection on a camera or a recorded video
+
+Usage:
+    python stream.py SOURCE (--rig ID | --corners X,Y,X,Y,X,Y,X,Y
+                             --width-mm W --height-mm H [--mirrored] [--rotation R])
+                     [--fps 15] [--scale 1.0] [--alpha 0.3] [--settings JSON]
+                     [--show] [--snapshot-dir DIR] [--snapshot-every SECONDS]
+                     [--duration SECONDS] [--max-frames N] [--no-pace]
+
+SOURCE is a device index (0), a device path (/dev/video0) or a video file.
+A DXF snapshot of the current contours is written on "s" in the --show
+window, on SIGUSR1, every --snapshot-every seconds and when the stream
+ends. Video files are played at their frame rate like a camera, --no-pace
+processes every frame instead (reproducible offline runs)
+"""
+
+import argparse
+import json
+import os
+import signal
+import time
+
+import cv2 as cv
+
+from detection.edge_detecttor import EdgeDetector
+from detection.rig_profile import RigProfile, get_rig_store
+from processors.image_processor import ImageProcessor
+from processors.request_processor import RequestProcessor
+from processors.stream_processor import FrameGrabber, StreamProcessor
+
+
+def parse_source(source: str):
+    """Device indices are passed to OpenCV as int"""
+    return int(source) if source.isdigit() else source
+
+
+def load_profile(args, image_size) -> RigProfile:
+    """Stored rig, or a profile from the command line geometry"""
+    if args.rig:
+        profile = get_rig_store().get(args.rig)
+        if profile is None:
+            raise SystemExit(f"Unknown rig: {args.rig}")
+        return profile
+
+    if not (args.corners and args.width_mm and args.height_mm):
+        raise SystemExit("Either --rig or --corners, --width-mm and --height-mm are required")
+    values = [float(value) for value in args.corners.split(",")]
+    if len(values) != 8:
+        raise SystemExit("--corners needs four x,y pairs")
+    coordinates = [{"x": values[i], "y": values[i + 1]} for i in range(0, 8, 2)]
+    source_transform, _ = ImageProcessor.get_transformation_matrix(
+        image_size[0], image_size[1], args.mirrored, args.rotation
+    )
+    return RigProfile(
+        "stream",
+        image_size,
+        coordinates,
+        args.width_mm,
+        args.height_mm,
+        {"mirrored": args.mirrored, "rotation": args.rotation},
+        source_transform,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live contour detection on a video source")
+    parser.add_argument("source", help="Device index, device path or video file")
+    parser.add_argument("--rig", help="Stored rig profile (see POST /rigs)")
+    parser.add_argument("--corners", help="Drawer corners as x,y,x,y,x,y,x,y")
+    parser.add_argument("--width-mm", type=float, help="Drawer width in mm")
+    parser.add_argument("--height-mm", type=float, help="Drawer height in mm")
+    parser.add_argument("--mirrored", action="store_true")
+    parser.add_argument("--rotation", type=int, default=0, choices=(0, 90, 180, 270))
+    parser.add_argument("--settings", default="{}",
+                        help="edgeDetectionSettings JSON as for /process-image")
+    parser.add_argument("--fps", type=float, default=15.0,
+                        help="Target processed frames per second, 0 for as fast as possible")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Processing size relative to full resolution, lower it for more fps")
+    parser.add_argument("--alpha", type=float, default=0.3,
+                        help="Weight of the newest frame in the moving average, 1 disables it")
+    parser.add_argument("--show", action="store_true", help="Show the contours in a window")
+    parser.add_argument("--snapshot-dir", default="output", help="Directory for DXF snapshots")
+    parser.add_argument("--snapshot-every", type=float, default=0,
+                        help="Seconds between automatic snapshots, 0 for none")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after seconds")
+    parser.add_argument("--max-frames", type=int, default=None,
+                        help="Stop after processed frames")
+    parser.add_argument("--no-pace", action="store_true",
+                        help="Process every frame of a video file instead of playing it in real time")
+    args = parser.parse_args()
+
+    grabber = FrameGrabber(parse_source(args.source), paced=not args.no_pace)
+    width = int(grabber.capture.get(cv.CAP_PROP_FRAME_WIDTH))
+    height = int(grabber.capture.get(cv.CAP_PROP_FRAME_HEIGHT))
+    profile = load_profile(args, (width, height))
+    edge_settings = RequestProcessor.parse_edge_settings(
+        {"edgeDetectionSettings": json.loads(args.settings)}
+    )
+    stream = StreamProcessor(
+        profile, edge_settings, args.scale, args.alpha, args.fps, keep_image=args.show
+    )
+
+    os.makedirs(args.snapshot_dir, exist_ok=True)
+    snapshot_requested = False
+    last_snapshot = time.monotonic()
+    last_report = time.monotonic()
+
+    def write_snapshot() -> None:
+        path = os.path.join(args.snapshot_dir, f"snapshot_{time.strftime('%Y%m%d_%H%M%S')}.dxf")
+        try:
+            data = stream.snapshot_dxf()
+        except RuntimeError as e:
+            print(f"snapshot skipped: {e}")
+            return
+        with open(path, "wb") as dxf_file:
+            dxf_file.write(data)
+        print(f"snapshot {path} ({len(stream.latest_contours())} contours)")
+
+    def request_snapshot(*_):
+        nonlocal snapshot_requested
+        snapshot_requested = True
+
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, request_snapshot)
+
+    def on_result(result: dict) -> None:
+        nonlocal snapshot_requested, last_snapshot, last_report
+        now = time.monotonic()
+        if args.show:
+            cv.imshow(
+                "stream",
+                EdgeDetector.draw_contours(
+                    result["image"], result["contours"], max(1, round(3 * args.scale)), True
+                ),
+            )
+            key = cv.waitKey(1) & 0xFF
+            if key == ord("s"):
+                snapshot_requested = True
+            elif key in (ord("q"), 27):
+                stream.stop()
+
+        if args.snapshot_every and now - last_snapshot >= args.snapshot_every:
+            snapshot_requested = True
+        if snapshot_requested:
+            snapshot_requested = False
+            last_snapshot = now
+            write_snapshot()
+
+        if now - last_report >= 1.0:
+            last_report = now
+            stats = stream.stats(grabber)
+            print(f"{stats['fps']:5.1f} fps  latency {stats['meanLatencyMs']:6.1f} ms  "
+                  f"processed {stats['processed']}  skipped {stats['skipped']}  "
+                  f"{len(result['contours'])} contours")
+
+    grabber.start()
+    try:
+        stream.run(grabber, on_result, args.duration, args.max_frames)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        grabber.stop()
+        if args.show:
+            cv.destroyAllWindows()
+
+    write_snapshot()
+    stats = stream.stats(grabber)
+    print()
+    print(f"{stats['processed']} frames processed, {stats['skipped']} skipped of "
+          f"{stats['captured']} captured: {stats['fps']:.1f} fps, "
+          f"mean latency {stats['meanLatencyMs']:.1f} ms")
+    if args.fps and stats["fps"] < 0.9 * args.fps and not args.no_pace:
+        print(f"Below the target of {args.fps:g} fps, try a lower --scale")
+    for stage, milliseconds in stats["stageMeanMs"].items():
+        print(f"  {stage:<12} mean {milliseconds:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
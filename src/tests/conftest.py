@@ -0,0 +1,93 @@
+"""
+Shared fixtures, modules are imported from src like the entry points do
+"""
+
+import base64
+import os
+import sys
+import tempfile
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+SRC_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGE_DIRECTORY = os.path.join(os.path.dirname(SRC_DIRECTORY), "images")
+
+if SRC_DIRECTORY not in sys.path:
+    sys.path.insert(0, SRC_DIRECTORY)
+
+# Fresh result cache and rig profiles per test run, entries of earlier runs
+# would turn misses into hits
+os.environ["ALIGNER_RESULT_CACHE_DIR"] = tempfile.mkdtemp(prefix="aligner-test-results-")
+os.environ["ALIGNER_RIG_DIR"] = tempfile.mkdtemp(prefix="aligner-test-rigs-")
+
+# Drawer corners of test_1.jpg
+DRAWER_CORNERS = [
+    {"x": 150, "y": 80},
+    {"x": 1900, "y": 75},
+    {"x": 1950, "y": 1200},
+    {"x": 120, "y": 1240},
+]
+
+
+@pytest.fixture(scope="session")
+def drawer_image() -> np.ndarray:
+    """Colour test photo, 2000x1285"""
+    image = cv.imread(os.path.join(IMAGE_DIRECTORY, "test_1.jpg"), cv.IMREAD_COLOR)
+    assert image is not None
+    return image
+
+
+@pytest.fixture(scope="session")
+def image_bytes() -> bytes:
+    """Encoded JPEG of drawer_image"""
+    with open(os.path.join(IMAGE_DIRECTORY, "test_1.jpg"), "rb") as image_file:
+        return image_file.read()
+
+
+@pytest.fixture(scope="session")
+def image_data(image_bytes) -> str:
+    """drawer_image as the imageData field of a request"""
+    return "data:image/jpeg;base64," + base64.b64encode(image_bytes).decode("utf-8")
+
+
+@pytest.fixture
+def drawer_request(image_data) -> dict:
+    """/process-image request for the drawer of drawer_image"""
+    return {
+        "imageData": image_data,
+        "coordinates": [dict(point) for point in DRAWER_CORNERS],
+        "realWidthMm": 530,
+        "realHeightMm": 330,
+    }
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Flask test client of the app"""
+    from app import app
+
+    return app.test_client()
+
+
+def read_polylines(body: bytes) -> list:
+    """
+    Vertex lists of the LWPOLYLINE entities of a DXF. The files also carry
+    creation times and GUIDs, which differ between otherwise equal files
+    """
+    import io
+
+    import ezdxf
+
+    document = ezdxf.read(io.StringIO(body.decode("utf-8")))
+    return [
+        [tuple(point) for point in entity.get_points("xy")]
+        for entity in document.modelspace().query("LWPOLYLINE")
+    ]
+
+
+@pytest.fixture(scope="session")
+def dxf_polylines():
+    """read_polylines, for comparing DXF geometry"""
+    return read_polylines
@@ -0,0 +1,76 @@
+import base64
+import io
+import json
+import re
+
+import cv2 as cv
+import numpy as np
+
+
+def parse_multipart(body: bytes, content_type: str) -> dict:
+    """Parts of a multipart/mixed response by name, read by Content-Length"""
+    boundary = re.search(r"boundary=(\S+)", content_type).group(1).encode("ascii")
+    parts = {}
+    position = 0
+    while True:
+        position = body.index(b"--" + boundary, position) + len(boundary) + 2
+        if body[position:position + 2] == b"--":
+            return parts
+        header_end = body.index(b"\r\n\r\n", position)
+        headers = body[position:header_end].decode("ascii")
+        name = re.search(r'name="([^"]+)"', headers).group(1)
+        part_type = re.search(r"Content-Type: (\S+)", headers).group(1)
+        length = int(re.search(r"Content-Length: (\d+)", headers).group(1))
+        start = header_end + 4
+        parts[name] = (part_type, body[start:start + length])
+        position = start + length
+
+
+def test_multipart_upload_matches_json_endpoint(client, drawer_request, image_bytes):
+    params = {key: value for key, value in drawer_request.items() if key != "imageData"}
+    response = client.post(
+        "/process-image/binary",
+        data={"params": json.dumps(params), "image": (io.BytesIO(image_bytes), "drawer.jpg")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    parts = parse_multipart(response.data, response.headers["Content-Type"])
+
+    metadata = json.loads(parts["metadata"][1])
+    assert metadata["success"]
+    assert metadata["parts"] == [name for name in parts if name != "metadata"]
+
+    expected = client.post("/process-image", json=drawer_request).get_json()
+    assert metadata["xRatio"] == expected["xRatio"]
+    content_type, edge_png = parts["edgeImage"]
+    assert content_type == "image/png"
+    edge_image = cv.imdecode(np.frombuffer(edge_png, np.uint8), cv.IMREAD_UNCHANGED)
+    expected_png = base64.b64decode(expected["edgeImage"].split(",", 1)[1])
+    expected_edges = cv.imdecode(np.frombuffer(expected_png, np.uint8), cv.IMREAD_UNCHANGED)
+    assert np.array_equal(edge_image, expected_edges)
+    # The DXF is opt-in
+    assert "dxf" not in parts
+
+
+def test_raw_body_upload(client, drawer_request, image_bytes):
+    params = {key: value for key, value in drawer_request.items() if key != "imageData"}
+    response = client.post(
+        "/process-image/binary",
+        query_string={"params": json.dumps(params)},
+        data=image_bytes,
+        content_type="image/jpeg",
+    )
+    assert response.status_code == 200
+    parts = parse_multipart(response.data, response.headers["Content-Type"])
+    assert json.loads(parts["metadata"][1])["success"]
+
+
+def test_invalid_upload_is_rejected(client, drawer_request):
+    params = {key: value for key, value in drawer_request.items() if key != "imageData"}
+    response = client.post(
+        "/process-image/binary",
+        query_string={"params": json.dumps(params)},
+        data=b"not an image",
+        content_type="image/jpeg",
+    )
+    assert response.status_code == 400
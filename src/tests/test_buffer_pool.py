@@ -0,0 +1,56 @@
+import threading
+import time
+
+import numpy as np
+
+from detection.buffer_pool import BufferPool
+
+
+def test_released_buffers_are_reused():
+    pool = BufferPool(max_bytes=1024)
+    buffer = pool.acquire((8, 8))
+    pool.release(buffer)
+    assert pool.acquire((8, 8)) is buffer
+    assert pool.acquire((4, 4), np.float32) is not buffer
+    assert pool.thread_counters() == (64 + 64, 64)
+
+
+def test_idle_bytes_are_capped_across_threads():
+    pool = BufferPool(max_bytes=1000)
+    ready = threading.Barrier(4)
+    done = threading.Barrier(4)
+    observed = []
+
+    def hold_buffers():
+        buffers = [pool.acquire((100,)) for _ in range(5)]
+        ready.wait()
+        pool.release(*buffers)
+        observed.append(pool.stats()["idleBytes"])
+        # Keep the thread and its free lists alive until all released
+        done.wait()
+
+    threads = [threading.Thread(target=hold_buffers) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 4 threads released 2000 bytes, at most 1000 stayed idle
+    assert len(observed) == 4
+    assert max(observed) == 1000
+
+    # Ended threads take their idle buffers with them
+    deadline = time.monotonic() + 5
+    while pool.stats()["idleBytes"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool.stats()["idleBytes"] == 0
+
+
+def test_release_over_the_cap_drops_the_oldest_buffers():
+    pool = BufferPool(max_bytes=250)
+    first, second, third = (pool.acquire((100,)) for _ in range(3))
+    pool.release(first, second, third)
+    assert pool.stats()["idleBytes"] == 200
+    assert pool.acquire((100,)) is third
+    assert pool.acquire((100,)) is second
+    assert pool.acquire((100,)) is not first
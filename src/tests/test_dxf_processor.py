@@ -0,0 +1,44 @@
+import numpy as np
+import ezdxf
+
+from processors.dxf_processor import contours_to_dxf, contours_to_dxf_bytes, contours_to_mm
+
+CONTOURS = [
+    np.array([[[10, 20]], [[110, 20]], [[110, 220]], [[10, 220]]], dtype=np.int32),
+    np.array([[[300, 40]], [[350, 90]], [[300, 140]]], dtype=np.int32),
+]
+
+
+def test_contours_to_mm_matches_per_point_conversion():
+    x_ratio, y_ratio, origin = 3.5, 4.0, (5.0, -2.0)
+    converted = contours_to_mm(CONTOURS, x_ratio, y_ratio, origin)
+
+    assert len(converted) == len(CONTOURS)
+    for contour, points_mm in zip(CONTOURS, converted):
+        expected = [
+            (x / x_ratio + origin[0], -y / y_ratio + origin[1])
+            for x, y in contour.reshape(-1, 2)
+        ]
+        assert np.allclose(points_mm, expected)
+
+    assert contours_to_mm([], x_ratio, y_ratio) == []
+
+
+def test_dxf_bytes_match_file_output(tmp_path, dxf_polylines):
+    file_path = contours_to_dxf(CONTOURS, str(tmp_path / "contours"), 2.0, 2.0, 530, 330)
+    with open(file_path, "rb") as f:
+        expected = dxf_polylines(f.read())
+
+    assert dxf_polylines(contours_to_dxf_bytes(CONTOURS, 2.0, 2.0, 530, 330)) == expected
+    assert expected[0] == [(5.0, -10.0), (55.0, -10.0), (55.0, -110.0), (5.0, -110.0)]
+
+
+def test_binary_dxf(tmp_path):
+    body = contours_to_dxf_bytes(CONTOURS, 2.0, 2.0, 530, 330, binary=True)
+    assert body.startswith(b"AutoCAD Binary DXF")
+
+    path = tmp_path / "contours.dxf"
+    path.write_bytes(body)
+    document = ezdxf.readfile(str(path))
+    assert len(document.modelspace().query("LWPOLYLINE")) == len(CONTOURS)
+    assert len(document.modelspace().query("LINE")) == 4
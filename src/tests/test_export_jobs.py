@@ -0,0 +1,106 @@
+import base64
+import time
+
+import numpy as np
+
+from detection.packed_contours import PackedContours
+from processors.export_jobs import ExportJobStore
+
+
+def wait_for_export(client, export_id: str) -> dict:
+    """Polls an export until it leaves the queue"""
+    deadline = time.monotonic() + 30
+    while True:
+        body = client.get(f"/exports/{export_id}").get_json()
+        if body["status"] not in ("queued", "running") or time.monotonic() > deadline:
+            return body
+        time.sleep(0.02)
+
+
+def wait_for_job(job) -> None:
+    deadline = time.monotonic() + 30
+    while job.status in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def square_inputs(size: int) -> dict:
+    corners = [[10, 10], [10 + size, 10], [10 + size, 10 + size], [10, 10 + size]]
+    outline = np.array(corners).reshape(-1, 1, 2)
+    return {
+        "contours": PackedContours.from_contours([outline]),
+        "x_ratio": 2.0,
+        "y_ratio": 2.0,
+        "width_mm": 100.0,
+        "height_mm": 100.0,
+    }
+
+
+def test_store_caches_by_contours(dxf_polylines):
+    store = ExportJobStore(workers=1)
+    job = store.submit(inputs=square_inputs(40))
+    wait_for_job(job)
+    assert (job.status, job.cached) == ("done", False)
+    assert dxf_polylines(job.body)[0] == [(5.0, -5.0), (25.0, -5.0), (25.0, -25.0), (5.0, -25.0)]
+
+    # Equal contours are done on submit, others are built again
+    repeated = store.submit(inputs=square_inputs(40))
+    assert (repeated.status, repeated.cached, repeated.body) == ("done", True, job.body)
+    other = store.submit(inputs=square_inputs(60))
+    wait_for_job(other)
+    assert other.key != job.key and not other.cached
+
+    def fail():
+        raise ValueError("no contours")
+
+    failed = store.submit(prepare=fail)
+    wait_for_job(failed)
+    assert (failed.status, failed.error) == ("failed", "no contours")
+    assert store.stats()["jobs"] == {"done": 3, "failed": 1}
+
+
+def test_export_of_returned_contours(client, drawer_request, dxf_polylines):
+    request = {
+        **drawer_request,
+        "outputs": ["contours", "dxf"],
+        "encoding": {"contours": {"format": "delta"}},
+    }
+    processed = client.post("/process-image", json=request).get_json()
+    export = {
+        "contours": processed["contours"],
+        "xRatio": processed["xRatio"],
+        "yRatio": processed["yRatio"],
+        "realWidthMm": 530,
+        "realHeightMm": 330,
+        "filename": "../top drawer",
+    }
+    created = client.post("/exports", json=export)
+    assert created.status_code in (200, 202)
+    status = wait_for_export(client, created.get_json()["exportId"])
+    assert status["status"] == "done"
+
+    download = client.get(created.get_json()["downloadUrl"])
+    assert download.status_code == 200
+    assert download.headers["Content-Disposition"] == 'attachment; filename="top drawer.dxf"'
+    assert dxf_polylines(download.data) == dxf_polylines(base64.b64decode(processed["dxf_data"]))
+
+    # Same contours again come from the DXF cache
+    repeated = client.post("/exports", json=export)
+    assert repeated.status_code == 200
+    assert repeated.get_json()["cached"]
+
+
+def test_export_of_a_request(client, drawer_request, dxf_polylines):
+    created = client.post("/exports", json=drawer_request).get_json()
+    status = wait_for_export(client, created["exportId"])
+    assert status["status"] == "done"
+
+    body = client.get(created["downloadUrl"]).data
+    expected = client.post("/process-image", json={**drawer_request, "outputs": ["dxf"]}).get_json()
+    assert dxf_polylines(body) == dxf_polylines(base64.b64decode(expected["dxf_data"]))
+
+
+def test_invalid_exports(client):
+    assert client.post("/exports", json={"contours": {"format": "delta"}}).status_code == 400
+    assert client.post("/exports", json={"coordinates": []}).status_code == 400
+    assert client.get("/exports/missing").status_code == 404
+    assert client.get("/exports/missing/download").status_code == 404
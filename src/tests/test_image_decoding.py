@@ -0,0 +1,44 @@
+import cv2 as cv
+import pytest
+
+from processors.image_processor import ImageProcessor
+from processors.request_processor import RequestProcessor
+
+
+@pytest.mark.parametrize("extension", [".jpg", ".png", ".webp"])
+def test_header_size_matches_decode(drawer_image, extension):
+    image = drawer_image[:301, :517]
+    _, buffer = cv.imencode(extension, image)
+    assert ImageProcessor.read_image_size(buffer.tobytes()) == (517, 301)
+
+
+def test_unknown_header_has_no_size():
+    assert ImageProcessor.read_image_size(b"GIF89a" + bytes(32)) is None
+
+
+def test_preview_decodes_reduced(drawer_request, image_bytes):
+    image, scale = RequestProcessor.decode_request_image(
+        {**drawer_request, "preview": {"width": 400, "height": 300}}, image_bytes
+    )
+    assert scale == 0.25
+    assert image.shape[1] == 500
+
+    image, scale = RequestProcessor.decode_request_image(drawer_request, image_bytes)
+    assert scale == 1.0
+    assert image.shape[:2] == (1285, 2000)
+
+
+def test_corners_outside_the_image_are_rejected(client, drawer_request):
+    corners = [dict(corner) for corner in drawer_request["coordinates"]]
+    corners[2] = {"x": 2100, "y": 1200}
+    response = client.post("/process-image", json={**drawer_request, "coordinates": corners})
+    assert response.status_code == 400
+
+    # Corners refer to the rotated image
+    rotated = {**drawer_request, "transformations": {"mirrored": False, "rotation": 90}}
+    response = client.post("/process-image", json=rotated)
+    assert response.status_code == 400
+
+    corners[2] = {"x": 2000, "y": 1285}
+    response = client.post("/process-image", json={**drawer_request, "coordinates": corners})
+    assert response.status_code == 200
@@ -0,0 +1,67 @@
+import json
+import threading
+
+from processors.live_session import LiveSession
+
+
+def create_session(client, drawer_request) -> str:
+    response = client.post("/sessions", json={"imageData": drawer_request["imageData"]})
+    return response.get_json()["sessionId"]
+
+
+def test_updates_are_latest_wins():
+    started = threading.Event()
+    release = threading.Event()
+    processed = []
+
+    def handler(data, timer):
+        processed.append(data["value"])
+        if data["value"] == 1:
+            started.set()
+            release.wait(5)
+        with timer.span("edges"):
+            pass
+        return {"value": data["value"]}
+
+    channel = LiveSession(handler)
+    channel.submit({"value": 1})
+    assert started.wait(5)
+    channel.submit({"value": 2})
+    channel.submit({"value": 3})
+    release.set()
+
+    event = channel.wait(0, timeout=5)
+    assert event == {"event": "result", "value": 3, "generation": 3}
+    # 1 was cancelled at its next stage, 2 was replaced before it started
+    assert processed == [1, 3]
+    assert channel.stats()["cancelled"] == 1
+    assert channel.stats()["coalesced"] == 1
+    channel.close()
+
+
+def test_stream_sends_the_latest_result(client, drawer_request):
+    session_id = create_session(client, drawer_request)
+    update = {key: value for key, value in drawer_request.items() if key != "imageData"}
+    response = client.post(f"/sessions/{session_id}/live", json=update)
+    assert response.status_code == 202
+    generation = response.get_json()["generation"]
+
+    stream = client.get(f"/sessions/{session_id}/live", buffered=False)
+    assert stream.headers["Content-Type"].startswith("text/event-stream")
+    event = next(chunk for chunk in stream.response if not chunk.startswith(b":"))
+    stream.close()
+
+    lines = dict(line.split(": ", 1) for line in event.decode("utf-8").strip().split("\n"))
+    assert lines["id"] == str(generation)
+    assert lines["event"] == "result"
+    assert json.loads(lines["data"])["xRatio"] is not None
+    client.delete(f"/sessions/{session_id}")
+
+
+def test_invalid_last_event_id_is_rejected(client, drawer_request):
+    session_id = create_session(client, drawer_request)
+    response = client.get(f"/sessions/{session_id}/live", headers={"Last-Event-ID": "abc"})
+    assert response.status_code == 400
+    response = client.get(f"/sessions/{session_id}/live?after=x")
+    assert response.status_code == 400
+    client.delete(f"/sessions/{session_id}")
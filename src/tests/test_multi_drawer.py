@@ -0,0 +1,107 @@
+import base64
+import io
+
+import ezdxf
+import pytest
+
+from processors.multi_drawer_processor import MAX_DRAWERS, MultiDrawerProcessor
+
+TOP = [{"x": 150, "y": 80}, {"x": 1900, "y": 75}, {"x": 1925, "y": 660}, {"x": 135, "y": 660}]
+BOTTOM = [
+    {"x": 135, "y": 660},
+    {"x": 1925, "y": 660},
+    {"x": 1950, "y": 1200},
+    {"x": 120, "y": 1240},
+]
+
+
+def drawers_request(image_data, **fields) -> dict:
+    return {
+        "imageData": image_data,
+        "outputs": ["dxf"],
+        "drawers": [
+            {"name": "top", "coordinates": TOP, "realWidthMm": 530, "realHeightMm": 165},
+            {"name": "bottom", "coordinates": BOTTOM, "realWidthMm": 530, "realHeightMm": 165},
+        ],
+        **fields,
+    }
+
+
+def test_parse_drawers_merges_shared_fields():
+    data = {
+        "outputs": ["dxf"],
+        "edgeDetectionSettings": {"cannyLow": 30, "cannyHigh": 120},
+        "drawers": [
+            {"coordinates": TOP, "realWidthMm": 530, "realHeightMm": 165},
+            {
+                "name": "lower drawer",
+                "coordinates": BOTTOM,
+                "realWidthMm": 530,
+                "realHeightMm": 165,
+                "outputs": ["contours"],
+                "edgeDetectionSettings": {"cannyLow": 10},
+            },
+        ],
+    }
+    first, second = MultiDrawerProcessor.parse_drawers(data)
+
+    assert (first["name"], second["name"]) == ("drawer_1", "lower_drawer")
+    assert first["outputs"] == ["dxf"] and second["outputs"] == ["contours"]
+    assert second["edgeDetectionSettings"] == {"cannyLow": 10, "cannyHigh": 120}
+
+
+@pytest.mark.parametrize(
+    "drawers",
+    [
+        [],
+        [{"coordinates": TOP, "realWidthMm": 530}],
+        [{"coordinates": TOP[:3], "realWidthMm": 530, "realHeightMm": 165}],
+        [{"name": "a", "coordinates": TOP, "realWidthMm": 530, "realHeightMm": 165}] * 2,
+        [{"coordinates": TOP, "realWidthMm": 530, "realHeightMm": 165}] * (MAX_DRAWERS + 1),
+    ],
+)
+def test_invalid_drawers(client, image_data, drawers):
+    with pytest.raises(ValueError):
+        MultiDrawerProcessor.parse_drawers({"drawers": drawers})
+    response = client.post("/process-drawers", json={"imageData": image_data, "drawers": drawers})
+    assert response.status_code == 400
+
+
+def test_separate_matches_single_drawer(client, image_data, dxf_polylines):
+    body = client.post("/process-drawers", json=drawers_request(image_data)).get_json()
+    assert body["success"] and body["dxf_data"] is None
+    assert [drawer["name"] for drawer in body["drawers"]] == ["top", "bottom"]
+
+    for drawer, coordinates in zip(body["drawers"], (TOP, BOTTOM)):
+        single = client.post(
+            "/process-image",
+            json={
+                "imageData": image_data,
+                "coordinates": coordinates,
+                "realWidthMm": 530,
+                "realHeightMm": 165,
+                "outputs": ["dxf"],
+            },
+        ).get_json()
+        assert (drawer["xRatio"], drawer["yRatio"]) == (single["xRatio"], single["yRatio"])
+        assert dxf_polylines(base64.b64decode(drawer["dxf_data"])) == dxf_polylines(
+            base64.b64decode(single["dxf_data"])
+        )
+
+
+def test_combined_dxf_has_a_layer_set_per_drawer(client, image_data):
+    request = drawers_request(image_data, dxfMode="combined")
+    # The bottom drawer only asks for contours and stays out of the DXF
+    request["drawers"][1]["outputs"] = ["contours"]
+    body = client.post("/process-drawers", json=request).get_json()
+
+    assert all(drawer["dxf_data"] is None for drawer in body["drawers"])
+    assert body["drawers"][1]["contours"] is not None
+    document = ezdxf.read(io.StringIO(base64.b64decode(body["dxf_data"]).decode("utf-8")))
+    layers = {entity.dxf.layer for entity in document.modelspace()}
+    assert layers and all(layer.startswith("top_") for layer in layers)
+
+
+def test_unknown_dxf_mode(client, image_data):
+    response = client.post("/process-drawers", json=drawers_request(image_data, dxfMode="stacked"))
+    assert response.status_code == 400
@@ -0,0 +1,88 @@
+import base64
+import json
+
+import cv2 as cv
+import numpy as np
+
+from detection.packed_contours import PackedContours
+
+
+def decode_data_url(data_url: str):
+    """Mime type and decoded image of a base64 data URL"""
+    header, encoded = data_url.split(",", 1)
+    buffer = np.frombuffer(base64.b64decode(encoded), np.uint8)
+    return header[len("data:"):-len(";base64")], cv.imdecode(buffer, cv.IMREAD_UNCHANGED)
+
+
+def test_only_requested_outputs_are_encoded(client, drawer_request):
+    response = client.post("/process-image", json={**drawer_request, "outputs": ["edgeImage"]})
+    assert response.status_code == 200
+    body = response.get_json()
+
+    assert body["edgeImage"] is not None
+    assert body["processedImage"] is None
+    assert body["contouredImage"] is None
+    assert body["dxf_data"] is None
+    assert body["xRatio"] is not None
+
+
+def test_per_artifact_encoding(client, drawer_request):
+    request = {
+        **drawer_request,
+        "outputs": ["processedImage", "contouredImage"],
+        "encoding": {
+            "processedImage": {"format": "jpeg", "quality": 70, "maxDimension": 400},
+            "contouredImage": {"format": "webp"},
+        },
+    }
+    body = client.post("/process-image", json=request).get_json()
+
+    mime_type, processed = decode_data_url(body["processedImage"])
+    assert mime_type == "image/jpeg"
+    assert max(processed.shape[:2]) == 400
+
+    mime_type, contoured = decode_data_url(body["contouredImage"])
+    assert mime_type == "image/webp"
+    assert max(contoured.shape[:2]) > 400
+
+
+def test_invalid_outputs_and_encoding_are_rejected(client, drawer_request):
+    for options in (
+        {"outputs": ["thumbnail"]},
+        {"encoding": {"edgeImage": {"format": "gif"}}},
+        {"encoding": {"edgeImage": {"quality": "high"}}},
+    ):
+        response = client.post("/process-image", json={**drawer_request, **options})
+        assert response.status_code == 400
+        assert not response.get_json()["success"]
+
+        params = {key: value for key, value in drawer_request.items() if key != "imageData"}
+        response = client.post(
+            "/process-image/binary",
+            query_string={"params": json.dumps({**params, **options})},
+            data=base64.b64decode(drawer_request["imageData"].split(",", 1)[1]),
+            content_type="image/jpeg",
+        )
+        assert response.status_code == 400
+
+
+def test_vector_contours_match_dxf(client, drawer_request, dxf_polylines):
+    request = {
+        **drawer_request,
+        "outputs": ["contours", "dxf"],
+        "encoding": {"contours": {"format": "delta"}},
+    }
+    body = client.post("/process-image", json=request).get_json()
+    assert body["edgeImage"] is None
+    assert body["contours"]["format"] == "delta"
+
+    contours = PackedContours.decode(base64.b64decode(body["contours"]["data"]), "delta")
+    polylines = dxf_polylines(base64.b64decode(body["dxf_data"]))
+    assert len(contours) == len(polylines) > 0
+    assert list(contours.counts) == [len(polyline) for polyline in polylines]
+
+    response = client.post(
+        "/process-image",
+        json={**request, "encoding": {"contours": {"format": "svg"}}},
+    )
+    assert response.status_code == 400
@@ -0,0 +1,149 @@
+import cv2 as cv
+import numpy as np
+import pytest
+
+from detection.packed_contours import PackedContours, decode_varints, encode_varints
+
+
+def make_contour_list(seed: int, count: int = 20) -> list:
+    """Random OpenCV style int32 polygons"""
+    random = np.random.default_rng(seed)
+    contours = []
+    for _ in range(count):
+        points = random.integers(3, 40)
+        contours.append(random.integers(0, 4000, (points, 1, 2)).astype(np.int32))
+    return contours
+
+
+def make_contours(seed: int, count: int = 20, span: float = 4000.0) -> PackedContours:
+    """Random contours including empty ones and negative coordinates"""
+    random = np.random.default_rng(seed)
+    contours = []
+    for _ in range(count):
+        points = random.integers(0, 40)
+        contours.append(random.uniform(-span, span, (points, 1, 2)).astype(np.float32))
+    return PackedContours.from_contours(contours)
+
+
+def test_measurements_match_opencv():
+    contour_list = make_contour_list(0)
+    contours = PackedContours.from_contours(contour_list)
+
+    assert len(contours) == len(contour_list)
+    assert np.allclose(contours.areas(), [cv.contourArea(c) for c in contour_list])
+    assert np.allclose(contours.lengths(), [cv.arcLength(c, True) for c in contour_list])
+    expected_boxes = []
+    for contour in contour_list:
+        x, y, width, height = cv.boundingRect(contour)
+        expected_boxes.append([x, y, x + width - 1, y + height - 1])
+    assert np.array_equal(contours.bounding_boxes(), expected_boxes)
+
+
+def test_split_filter_and_to_list():
+    contour_list = make_contour_list(1)
+    contours = PackedContours.from_contours(contour_list)
+
+    for original, restored in zip(contour_list, contours.to_list()):
+        assert np.array_equal(original, restored)
+
+    mask = np.arange(len(contours)) % 3 == 0
+    filtered = contours.filter(mask)
+    kept = [contour for contour, keep in zip(contour_list, mask) if keep]
+    assert len(filtered) == len(kept)
+    for original, points in zip(kept, filtered.split()):
+        assert np.array_equal(original.reshape(-1, 2), points)
+
+
+def test_empty_contours():
+    contours = PackedContours.from_contours([])
+    assert len(contours) == 0
+    assert contours.areas().shape == (0,)
+    assert contours.bounding_boxes().shape == (0, 4)
+    assert len(contours.simplify(1.0, 2.0, 2.0)) == 0
+
+
+def test_simplify_tolerance_is_in_mm():
+    # Bumps of 2 px on a 1000 px edge, 1 mm with 2 px/mm horizontally
+    # but 0.25 mm with 8 px/mm vertically
+    x = np.arange(0, 1001, 10)
+    bumps = np.stack([x, np.where(x % 20 == 0, 0, 2)], axis=1)
+    outline = np.concatenate([bumps, [[1000, 500], [0, 500]]]).reshape(-1, 1, 2)
+    contours = PackedContours.from_contours([outline.astype(np.int32)])
+
+    kept = contours.simplify(0.5, 2.0, 2.0)
+    removed = contours.simplify(0.5, 2.0, 8.0)
+    assert len(kept.contour(0)) > 50
+    assert len(removed.contour(0)) <= 4
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        [0],
+        [1, 127, 128, 255, 16383, 16384],
+        [2**32 - 1, 2**32, 2**56, 2**63, 2**64 - 1],
+        list(range(1000)),
+    ],
+)
+def test_varints_round_trip(values):
+    array = np.array(values, np.uint64)
+    assert np.array_equal(decode_varints(encode_varints(array)), array)
+
+
+def test_varint_lengths():
+    assert len(encode_varints(np.array([127], np.uint64))) == 1
+    assert len(encode_varints(np.array([128], np.uint64))) == 2
+    assert len(encode_varints(np.array([2**64 - 1], np.uint64))) == 10
+
+
+def test_truncated_varints_are_rejected():
+    body = encode_varints(np.array([300], np.uint64))
+    with pytest.raises(ValueError):
+        decode_varints(body[:-1])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_packed_round_trip_is_exact(seed):
+    contours = make_contours(seed)
+    decoded = PackedContours.decode(contours.encode("packed"), "packed")
+    assert np.array_equal(decoded.offsets, contours.offsets)
+    assert np.array_equal(decoded.vertices, contours.vertices)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_delta_round_trip_restores_rounded_vertices(seed):
+    contours = make_contours(seed)
+    decoded = PackedContours.decode(contours.encode("delta"), "delta")
+    assert np.array_equal(decoded.offsets, contours.offsets)
+    assert np.array_equal(decoded.vertices, np.round(contours.vertices))
+
+
+def test_delta_zigzag_of_negative_deltas():
+    contours = PackedContours.from_contours(
+        [
+            np.array([[[5, 5]], [[0, 0]], [[-1, -1]], [[-70000, 3]]], np.float32),
+            np.array([[[-3, 2]]], np.float32),
+        ]
+    )
+    decoded = PackedContours.decode(contours.encode("delta"), "delta")
+    assert np.array_equal(decoded.vertices, contours.vertices)
+    assert np.array_equal(decoded.offsets, [0, 4, 5])
+
+
+def test_empty_contours_round_trip():
+    contours = PackedContours.from_contours([])
+    for contour_format in ("packed", "delta"):
+        decoded = PackedContours.decode(contours.encode(contour_format), contour_format)
+        assert len(decoded) == 0
+        assert decoded.vertices.shape == (0, 2)
+
+
+def test_mismatched_vertex_data_is_rejected():
+    body = make_contours(0).encode("packed")
+    with pytest.raises(ValueError):
+        PackedContours.decode(body[:-8], "packed")
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        make_contours(0).encode("json")
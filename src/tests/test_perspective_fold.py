@@ -0,0 +1,39 @@
+import cv2 as cv
+import numpy as np
+import pytest
+
+from detection.drawer_detector import DrawerDetector
+from processors.image_processor import ImageProcessor
+
+
+@pytest.mark.parametrize("mirrored", [False, True])
+@pytest.mark.parametrize("rotation", [0, 90, 180, 270])
+def test_single_warp_matches_transform_then_warp(drawer_image, mirrored, rotation):
+    image = cv.resize(drawer_image, (800, 514), interpolation=cv.INTER_AREA)
+    transformed = ImageProcessor.process_transformations(image, mirrored, rotation)
+    height, width = transformed.shape[:2]
+    corners = np.array(
+        [
+            [0.08 * width, 0.06 * height],
+            [0.95 * width, 0.05 * height],
+            [0.97 * width, 0.94 * height],
+            [0.05 * width, 0.96 * height],
+        ],
+        np.float32,
+    )
+
+    expected, expected_x_ratio, expected_y_ratio = DrawerDetector.process_drawer_image(
+        transformed, corners, 530, 330
+    )
+    source_transform, size = ImageProcessor.get_transformation_matrix(
+        image.shape[1], image.shape[0], mirrored, rotation
+    )
+    folded, x_ratio, y_ratio = DrawerDetector.process_drawer_image(
+        image, corners, 530, 330, source_transform=source_transform
+    )
+
+    assert size == (width, height)
+    assert (x_ratio, y_ratio) == (expected_x_ratio, expected_y_ratio)
+    assert folded.shape == expected.shape
+    difference = cv.absdiff(folded, expected)
+    assert difference.max() <= 1
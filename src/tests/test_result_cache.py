@@ -0,0 +1,80 @@
+import re
+
+import numpy as np
+
+from detection.packed_contours import PackedContours
+from processors.result_cache import ResultCache
+
+
+def metric_value(client, name: str) -> float:
+    """Unlabelled series of a metric from the /metrics text"""
+    text = client.get("/metrics").get_data(as_text=True)
+    match = re.search(rf"^{name} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def make_job(size: int) -> dict:
+    return {
+        "result": {"x_ratio": 2.5, "megapixels": 1.0},
+        "artifacts": [("edgeImage", "image/png", bytes(range(256)) * (size // 256))],
+        "contours": PackedContours.from_contours(
+            [np.array([[[0, 0]], [[10, 0]], [[10, 10]]], np.int32)]
+        ),
+    }
+
+
+def test_round_trip_and_lru_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10**6)
+    cache.put("first", make_job(2048))
+    # Room for two entries
+    cache.max_bytes = 3 * cache.stats()["bytes"] - 1
+    cached = cache.get("first")
+    assert cached["result"] == {"x_ratio": 2.5, "megapixels": 1.0}
+    assert cached["artifacts"] == make_job(2048)["artifacts"]
+    assert np.array_equal(cached["contours"].vertices, make_job(2048)["contours"].vertices)
+
+    cache.put("second", make_job(2048))
+    cache.get("first")
+    cache.put("third", make_job(2048))
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+
+    # The index is rebuilt from disk
+    assert ResultCache(str(tmp_path), max_bytes=cache.max_bytes).stats()["entries"] == 2
+
+
+def test_key_ignores_volatile_fields():
+    data = {"realWidthMm": 530, "edgeDetectionSettings": {"cannyLow": 30}}
+    key = ResultCache.make_key("hash", data)
+    assert key == ResultCache.make_key("hash", {**data, "sessionId": "x", "includeTimings": True})
+    assert key != ResultCache.make_key("hash", {**data, "realWidthMm": 531})
+    assert key != ResultCache.make_key("other", data)
+
+
+def test_repeated_request_hits_cache(client, drawer_request):
+    request = {**drawer_request, "realWidthMm": 531, "includeTimings": True}
+    first = client.post("/process-image", json=request)
+    megapixels = metric_value(client, "aligner_megapixels_total")
+
+    second = client.post("/process-image", json=request)
+    assert second.status_code == 200
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert list(second.get_json()["timings"]) == ["cache"]
+    assert second.get_json()["edgeImage"] == first.get_json()["edgeImage"]
+
+    # Hits still count the input they served
+    assert metric_value(client, "aligner_megapixels_total") > megapixels
+
+
+def test_matching_etag_is_not_modified(client, drawer_request):
+    request = {**drawer_request, "realWidthMm": 532}
+    etag = client.post("/process-image", json=request).headers["ETag"]
+
+    response = client.post("/process-image", json=request, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    changed = {**request, "realHeightMm": 331}
+    response = client.post("/process-image", json=changed, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
@@ -0,0 +1,86 @@
+import base64
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from detection.drawer_detector import DrawerDetector
+from detection.rig_profile import RigProfile
+from processors.image_processor import ImageProcessor
+
+
+def make_profile(drawer_image, corners, transformations) -> RigProfile:
+    height, width = drawer_image.shape[:2]
+    source_transform, _ = ImageProcessor.get_transformation_matrix(
+        width, height, transformations.get("mirrored", False), transformations.get("rotation", 0)
+    )
+    return RigProfile(
+        "bench-1",
+        (width, height),
+        corners,
+        530,
+        330,
+        transformations,
+        source_transform,
+    )
+
+
+@pytest.mark.parametrize(
+    "transformations",
+    [{"mirrored": False, "rotation": 0}, {"mirrored": True, "rotation": 180}],
+)
+def test_remap_matches_warp(drawer_image, drawer_request, transformations):
+    profile = make_profile(drawer_image, drawer_request["coordinates"], transformations)
+    corrected, x_ratio, y_ratio = profile.correct(drawer_image)
+
+    source_transform, _ = ImageProcessor.get_transformation_matrix(
+        drawer_image.shape[1],
+        drawer_image.shape[0],
+        transformations["mirrored"],
+        transformations["rotation"],
+    )
+    expected, expected_x_ratio, expected_y_ratio = DrawerDetector.process_drawer_image(
+        drawer_image,
+        ImageProcessor.parse_coordinates(drawer_request["coordinates"]),
+        530,
+        330,
+        source_transform=source_transform,
+    )
+
+    assert (x_ratio, y_ratio) == (expected_x_ratio, expected_y_ratio)
+    assert corrected.shape == expected.shape
+    # Equal up to the 1/32 pixel precision of the fixed-point tables
+    difference = cv.absdiff(corrected, expected)
+    assert difference.max() <= 4
+    assert np.count_nonzero(difference) / difference.size < 0.05
+
+
+def test_save_and_load(tmp_path, drawer_image, drawer_request):
+    profile = make_profile(drawer_image, drawer_request["coordinates"], {"rotation": 0})
+    profile.save(str(tmp_path))
+
+    loaded = RigProfile.load(str(tmp_path), "bench-1")
+    assert loaded.describe() == profile.describe()
+    assert np.array_equal(loaded.maps[0], profile.maps[0])
+    with pytest.raises(ValueError):
+        loaded.correct(drawer_image[:100])
+
+
+def test_rig_requests(client, drawer_request):
+    params = {key: value for key, value in drawer_request.items() if key != "imageData"}
+    response = client.post(
+        "/rigs", json={**params, "rigId": "bench-2", "imageWidth": 2000, "imageHeight": 1285}
+    )
+    assert response.status_code == 200
+
+    request = {"imageData": drawer_request["imageData"], "rigId": "bench-2", "outputs": ["dxf"]}
+    body = client.post("/process-image", json=request).get_json()
+    expected = client.post("/process-image", json={**drawer_request, "outputs": ["dxf"]}).get_json()
+    assert (body["xRatio"], body["yRatio"]) == (expected["xRatio"], expected["yRatio"])
+    assert base64.b64decode(body["dxf_data"]).startswith(b"  0\nSECTION")
+
+    response = client.post("/process-image", json={**request, "rigId": "missing"})
+    assert response.status_code == 404
+
+    assert client.delete("/rigs/bench-2").status_code == 200
+    assert client.get("/rigs/bench-2").status_code == 404
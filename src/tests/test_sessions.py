@@ -0,0 +1,73 @@
+import base64
+
+import numpy as np
+import pytest
+
+from processors.session_store import SessionStore
+
+
+def test_session_store_evicts_least_recently_used():
+    store = SessionStore(max_bytes=250)
+    first = store.create(np.zeros(100, np.uint8))
+    second = store.create(np.zeros(100, np.uint8))
+    assert store.get(first.session_id) is first
+
+    store.create(np.zeros(100, np.uint8))
+    assert store.get(second.session_id) is None
+    assert store.get(first.session_id) is first
+    assert store.stats()["evictions"] == 1
+
+
+def test_session_store_keeps_the_newest_session_over_the_cap():
+    store = SessionStore(max_bytes=10)
+    session = store.create(np.zeros(100, np.uint8))
+    assert store.get(session.session_id) is session
+    assert store.delete(session.session_id)
+    assert not store.delete(session.session_id)
+
+
+def test_session_request_matches_upload(client, drawer_request, dxf_polylines):
+    drawer_request["outputs"] = ["edgeImage", "dxf"]
+    created = client.post("/sessions", json={"imageData": drawer_request["imageData"]})
+    assert created.status_code == 200
+    session_id = created.get_json()["sessionId"]
+
+    uploaded = client.post("/process-image", json=drawer_request).get_json()
+    session_request = dict(drawer_request, sessionId=session_id)
+    del session_request["imageData"]
+    from_session = client.post("/process-image", json=session_request).get_json()
+
+    assert from_session["success"]
+    for field in ("edgeImage", "xRatio", "yRatio"):
+        assert from_session[field] == uploaded[field]
+    assert dxf_polylines(base64.b64decode(from_session["dxf_data"])) == dxf_polylines(
+        base64.b64decode(uploaded["dxf_data"])
+    )
+
+    assert client.delete(f"/sessions/{session_id}").status_code == 200
+    assert client.post("/process-image", json=session_request).status_code == 404
+
+
+def test_unknown_session_is_404(client):
+    assert client.delete("/sessions/unknown").status_code == 404
+
+
+@pytest.mark.parametrize("path", ["/process-image", "/process-drawers", "/sweep-edges", "/exports"])
+def test_image_routes_reject_unknown_sessions(client, drawer_request, path):
+    request = {key: value for key, value in drawer_request.items() if key != "imageData"}
+    request["sessionId"] = "unknown"
+    drawer_keys = ("coordinates", "realWidthMm", "realHeightMm")
+    request["drawers"] = [{key: request[key] for key in drawer_keys}]
+    response = client.post(path, json=request)
+    assert response.status_code == 404
+    assert response.get_json()["error"] == "Unknown or expired session"
+
+
+def test_binary_route_rejects_unknown_sessions(client):
+    response = client.post(
+        "/process-image/binary",
+        query_string={"params": '{"sessionId": "unknown"}'},
+        data=b"",
+        content_type="image/jpeg",
+    )
+    assert response.status_code == 404
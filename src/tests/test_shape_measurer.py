@@ -0,0 +1,33 @@
+import numpy as np
+
+from detection.packed_contours import PackedContours
+from detection.shape_measurer import ShapeMeasurer
+
+
+def test_rectangle_and_circle_in_mm():
+    # 2 px/mm: a 100 x 40 mm rectangle and a circle of 30 mm diameter
+    rectangle = np.array([[[20, 20]], [[220, 20]], [[220, 100]], [[20, 100]]], np.int32)
+    angles = np.linspace(0, 2 * np.pi, 360, endpoint=False)
+    circle = np.stack([400 + 30 * np.cos(angles), 200 + 30 * np.sin(angles)], axis=1)
+    contours = PackedContours.from_contours([rectangle, circle.reshape(-1, 1, 2)])
+
+    measurements = ShapeMeasurer.measure(contours, 2.0, 2.0)
+
+    assert np.allclose(measurements["area"], [4000, np.pi * 15**2], rtol=1e-3)
+    assert np.allclose(measurements["perimeter"], [280, np.pi * 30], rtol=1e-3)
+    assert np.isclose(measurements["circularity"][1], 1, atol=1e-3)
+    assert np.allclose(sorted(measurements["rect_size"][0]), [40, 100])
+    # DXF frame, y points up from the drawer top left corner
+    assert np.allclose(measurements["rect_center"][0], [60, -30])
+    assert np.allclose(measurements["enclosing_diameter"][1], 30, atol=0.1)
+    assert np.allclose(measurements["inscribed_diameter"], [40, 30], atol=1.0)
+    assert np.allclose(measurements["inscribed_center"][1], [200, -100], atol=0.5)
+
+    records = ShapeMeasurer.to_records(measurements)
+    assert records[0]["areaMm2"] == 4000.0
+
+
+def test_measure_request(client, drawer_request):
+    body = client.post("/process-image", json={**drawer_request, "measure": True}).get_json()
+    assert len(body["measurements"]) > 0
+    assert all(record["areaMm2"] > 0 for record in body["measurements"])
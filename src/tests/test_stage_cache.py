@@ -0,0 +1,67 @@
+import numpy as np
+
+from detection.edge_detecttor import EdgeDetector
+from detection.stage_cache import StageCache
+
+
+def prepare(image, cache, **settings):
+    return EdgeDetector.prepare_image(image, cache=cache, cache_key="image", **settings)
+
+
+def test_get_or_compute_counts_hits_and_misses():
+    cache = StageCache(max_entries=2)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return np.zeros(4, np.uint8)
+
+    first = cache.get_or_compute("gray", "a", compute)
+    assert cache.get_or_compute("gray", "a", compute) is first
+    assert len(calls) == 1
+    assert cache.stats() == {"hits": {"gray": 1}, "misses": {"gray": 1}}
+    assert cache.nbytes == 4
+
+
+def test_lru_per_stage():
+    cache = StageCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.get_or_compute("canny", key, lambda: np.zeros(1, np.uint8))
+    cache.get_or_compute("gray", "a", lambda: np.zeros(1, np.uint8))
+
+    # "a" was the least recently used canny entry, gray has its own slots
+    cache.get_or_compute("canny", "a", lambda: np.zeros(1, np.uint8))
+    cache.get_or_compute("gray", "a", lambda: np.zeros(1, np.uint8))
+    assert cache.stats()["misses"] == {"canny": 4, "gray": 1}
+    assert cache.stats()["hits"] == {"gray": 1}
+
+
+def test_cached_stages_match_uncached(drawer_image):
+    cache = StageCache()
+    expected = EdgeDetector.prepare_pooled(drawer_image, canny_high=150)
+    prepare(drawer_image, cache)
+    assert np.array_equal(prepare(drawer_image, cache, canny_high=150), expected)
+    assert cache.stats()["hits"] == {"blur": 1}
+
+
+def test_repeated_request_hits_the_last_stage(drawer_image):
+    cache = StageCache()
+    first = prepare(drawer_image, cache)
+    assert prepare(drawer_image, cache) is first
+    assert cache.stats() == {
+        "hits": {"close": 1},
+        "misses": {"close": 1, "canny": 1, "blur": 1, "gray": 1},
+    }
+
+
+def test_early_stages_survive_later_parameter_changes(drawer_image):
+    cache = StageCache(max_entries=4)
+    prepare(drawer_image, cache)
+    for size in (3, 7, 9):
+        prepare(drawer_image, cache, morph_kernel_size=(size, size))
+    prepare(drawer_image, cache, canny_high=160)
+
+    misses = cache.stats()["misses"]
+    assert misses["gray"] == 1
+    assert misses["blur"] == 1
+    assert misses["canny"] == 2
@@ -0,0 +1,78 @@
+import cv2 as cv
+import numpy as np
+import pytest
+
+from detection.rig_profile import RigProfile
+from processors.image_processor import ImageProcessor
+from processors.request_processor import RequestProcessor
+from processors.stream_processor import FrameGrabber, StreamProcessor
+
+FRAME_COUNT = 12
+
+
+@pytest.fixture(scope="module")
+def recorded_video(tmp_path_factory, drawer_image) -> str:
+    """Short MJPG recording of the drawer with a little sensor noise"""
+    frame = cv.resize(drawer_image, (1000, 642), interpolation=cv.INTER_AREA)
+    path = str(tmp_path_factory.mktemp("video") / "drawer.avi")
+    writer = cv.VideoWriter(path, cv.VideoWriter_fourcc(*"MJPG"), 10, (1000, 642))
+    if not writer.isOpened():
+        pytest.skip("No MJPG video writer in this OpenCV build")
+    random = np.random.default_rng(0)
+    for _ in range(FRAME_COUNT):
+        noise = random.integers(-4, 5, frame.shape, dtype=np.int16)
+        writer.write(np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    writer.release()
+    return path
+
+
+def test_recorded_video(recorded_video, drawer_request, dxf_polylines):
+    coordinates = [
+        {"x": point["x"] / 2, "y": point["y"] / 2} for point in drawer_request["coordinates"]
+    ]
+    source_transform, _ = ImageProcessor.get_transformation_matrix(1000, 642, False, 0)
+    profile = RigProfile(
+        "stream", (1000, 642), coordinates, 530, 330, {"rotation": 0}, source_transform
+    )
+    processor = StreamProcessor(
+        profile, RequestProcessor.parse_edge_settings({}), scale=0.5, target_fps=0
+    )
+
+    indices = []
+    grabber = FrameGrabber(recorded_video, paced=False).start()
+    try:
+        processor.run(grabber, on_result=lambda result: indices.append(result["index"]))
+    finally:
+        grabber.stop()
+
+    # Unpaced files hand over every frame in order
+    assert indices == list(range(FRAME_COUNT))
+    stats = processor.stats(grabber)
+    assert (stats["processed"], stats["skipped"]) == (FRAME_COUNT, 0)
+    assert stats["captured"] == FRAME_COUNT
+    assert processor.target_size == profile.scaled_target_size(0.5)
+
+    polylines = dxf_polylines(processor.snapshot_dxf())
+    assert len(polylines) == len(processor.latest_contours()) > 0
+    # Contours lie inside the drawer, in mm
+    points = np.array([point for polyline in polylines for point in polyline])
+    assert points[:, 0].min() >= -1 and points[:, 0].max() <= 531
+    assert points[:, 1].min() >= -331 and points[:, 1].max() <= 1
+
+
+def test_snapshot_before_first_frame(drawer_image, drawer_request):
+    source_transform, _ = ImageProcessor.get_transformation_matrix(2000, 1285, False, 0)
+    profile = RigProfile(
+        "stream",
+        (2000, 1285),
+        drawer_request["coordinates"],
+        530,
+        330,
+        {"rotation": 0},
+        source_transform,
+    )
+    processor = StreamProcessor(profile, RequestProcessor.parse_edge_settings({}), scale=0.25)
+    with pytest.raises(RuntimeError):
+        processor.snapshot_dxf()
+    with pytest.raises(ValueError):
+        processor.process_frame(drawer_image[:100])
@@ -0,0 +1,38 @@
+import base64
+
+import cv2 as cv
+import numpy as np
+
+
+def test_sweep_evaluates_every_setting(client, drawer_request):
+    request = {
+        **drawer_request,
+        "sweep": {"cannyLow": [30, 50], "cannyHigh": {"start": 100, "stop": 160, "step": 30}},
+        "thumbnailSize": 120,
+    }
+    response = client.post("/sweep-edges", json=request)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["count"] == 6
+
+    result = next(
+        result for result in body["results"]
+        if result["settings"]["cannyLow"] == 30 and result["settings"]["cannyHigh"] == 130
+    )
+    encoded = result["thumbnail"].split(",", 1)[1]
+    thumbnail = cv.imdecode(np.frombuffer(base64.b64decode(encoded), np.uint8), cv.IMREAD_COLOR)
+    assert max(thumbnail.shape[:2]) == 120
+    assert result["contourCount"] > 0
+
+
+def test_invalid_sweep_is_rejected(client, drawer_request):
+    for options in (
+        {"sweep": {"threshold": [1, 2]}},
+        {"sweep": {"blurKernelSize": [4]}},
+        {"thumbnailSize": 0},
+        {"thumbnailSize": 5000},
+        {"thumbnailSize": "large"},
+    ):
+        response = client.post("/sweep-edges", json={**drawer_request, **options})
+        assert response.status_code == 400
+        assert not response.get_json()["success"]
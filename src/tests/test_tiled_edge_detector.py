@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import detection.edge_detecttor as edge_detecttor
+from detection.edge_detecttor import EdgeDetector
+from detection.tiled_edge_detector import TiledEdgeDetector
+
+
+@pytest.mark.parametrize("tile_size", [64, 200, 333, 1024, 4096])
+def test_tiled_matches_untiled_for_tile_sizes(drawer_image, tile_size):
+    expected = EdgeDetector.prepare_pooled(drawer_image)
+    tiled = TiledEdgeDetector.prepare_image(drawer_image, tile_size=tile_size)
+    assert np.array_equal(tiled, expected)
+
+
+@pytest.mark.parametrize(
+    "blur, low, high, morph",
+    [
+        ((5, 5), 30, 130, (5, 5)),
+        ((3, 3), 10, 250, (3, 3)),
+        ((9, 9), 60, 90, (7, 7)),
+        ((5, 5), 50, 50, (5, 5)),
+        # cv.Canny swaps inverted thresholds
+        ((5, 5), 130, 30, (5, 5)),
+    ],
+)
+def test_tiled_matches_untiled_for_settings(drawer_image, blur, low, high, morph):
+    expected = EdgeDetector.prepare_pooled(drawer_image, blur, low, high, morph)
+    tiled = TiledEdgeDetector.prepare_image(drawer_image, blur, low, high, morph, tile_size=256)
+    assert np.array_equal(tiled, expected)
+
+
+def test_tiled_matches_untiled_on_grayscale(drawer_image):
+    gray = EdgeDetector.to_grayscale(drawer_image)
+    expected = EdgeDetector.prepare_pooled(gray)
+    assert np.array_equal(TiledEdgeDetector.prepare_image(gray, tile_size=300), expected)
+
+
+@pytest.mark.parametrize("min_pixels", [0, 1, 10**9])
+def test_prepare_image_threshold_does_not_change_output(drawer_image, monkeypatch, min_pixels):
+    expected = EdgeDetector.prepare_pooled(drawer_image)
+    monkeypatch.setattr(edge_detecttor, "TILED_MIN_PIXELS", min_pixels)
+    assert np.array_equal(EdgeDetector.prepare_image(drawer_image), expected)
+
+
+def test_tiles_cover_the_image():
+    tiles = TiledEdgeDetector.get_tiles(1000, 700, 300)
+    covered = np.zeros((700, 1000), np.int32)
+    for x_min, y_min, x_max, y_max in tiles:
+        covered[y_min:y_max, x_min:x_max] += 1
+    assert (covered == 1).all()
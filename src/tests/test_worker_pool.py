@@ -0,0 +1,57 @@
+import os
+import time
+
+import pytest
+
+from errors.error import JobTimeoutError, QueueFullError
+from processors.worker_pool import WorkerPool
+
+
+def wait_until(condition, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def pool():
+    worker_pool = WorkerPool(workers=1, queue_size=1, timeout=30.0)
+    yield worker_pool
+    worker_pool.shutdown()
+
+
+def test_runs_jobs_in_a_child_process(pool):
+    assert pool.run(pow, 2, 10) == 1024
+    assert pool.run(os.getpid) != os.getpid()
+
+
+def test_job_exceptions_reach_the_caller(pool):
+    with pytest.raises(ValueError):
+        pool.run(int, "not a number")
+
+
+def test_full_queue_is_rejected(pool):
+    running = pool.submit(time.sleep, 1.0)
+    wait_until(lambda: pool.stats()["busy"] == 1)
+    queued = pool.submit(time.sleep, 0)
+
+    with pytest.raises(QueueFullError):
+        pool.submit(time.sleep, 0)
+    assert pool.stats()["rejected"] == 1
+
+    running.result()
+    queued.result()
+    assert pool.run(pow, 3, 2) == 9
+
+
+def test_timeout_replaces_the_worker_process(pool):
+    first_pid = pool.run(os.getpid)
+
+    with pytest.raises(JobTimeoutError):
+        pool.run(time.sleep, 30, timeout=0.5)
+    assert pool.stats()["timeouts"] == 1
+
+    second_pid = pool.run(os.getpid)
+    assert second_pid != first_pid
+    assert pool.stats()["busy"] == 0
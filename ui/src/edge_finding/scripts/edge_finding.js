@@ -232,8 +232,8 @@ function handleNoImage(message) {
 if (exportButton) {
   exportButton.addEventListener("click", async () => {
     try {
-      // First send final data to API for processing
-      await ApiService.sendToAPI();
+      // First send final data to API for processing and build the DXF
+      await ApiService.sendToAPI({ exportDxf: true });
 
       // Only save to database if user is authenticated
       if (authController.isAuthenticated()) {
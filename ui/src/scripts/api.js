@@ -5,6 +5,7 @@ import { AppState } from "./app_state.js";
 
 const API_BASE_URL = "http://localhost:5000";
 const PROCESSING_TIMEOUT = 30000;
+const EXPORT_POLL_INTERVAL = 250;
 
 // Default edge detection settings
 const DEFAULT_EDGE_DETECTION_SETTINGS = {
@@ -57,11 +58,63 @@ export const ApiService = {
     }
   },
 
+  /**
+   * Builds the DXF of processed contours through an export job and stores it
+   * @param {Object} data Successful /process-image response with "contours"
+   * @param {number} drawerWidth Drawer width in mm
+   * @param {number} drawerHeight Drawer height in mm
+   * @returns {Promise<void>}
+   */
+  async exportDxf(data, drawerWidth, drawerHeight) {
+    const response = await fetch(`${API_BASE_URL}/exports`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        contours: data.contours,
+        xRatio: data.xRatio,
+        yRatio: data.yRatio,
+        realWidthMm: drawerWidth,
+        realHeightMm: drawerHeight
+      }),
+    });
+    let job = await response.json();
+    if (!response.ok || !job.success) {
+      throw new Error(job.error || `HTTP error! status: ${response.status}`);
+    }
+
+    // Cached contours are done right away, others finish in the background
+    const deadline = Date.now() + PROCESSING_TIMEOUT;
+    while (job.status === "queued" || job.status === "running") {
+      if (Date.now() > deadline) {
+        throw new Error("DXF export timed out");
+      }
+      await new Promise((resolve) => setTimeout(resolve, EXPORT_POLL_INTERVAL));
+      job = await (await fetch(`${API_BASE_URL}${job.statusUrl}`)).json();
+    }
+    if (job.status !== "done") {
+      throw new Error(job.error || "DXF export failed");
+    }
+
+    const download = await fetch(`${API_BASE_URL}${job.downloadUrl}`);
+    if (!download.ok) {
+      throw new Error(`HTTP error! status: ${download.status}`);
+    }
+    const bytes = new Uint8Array(await download.arrayBuffer());
+    let binary = "";
+    for (let i = 0; i < bytes.length; i += 0x8000) {
+      binary += String.fromCharCode(...bytes.subarray(i, i + 0x8000));
+    }
+    AppState.setDxfData(btoa(binary));
+  },
+
   /**
    * Sends the image processing request to the API
+   * @param {Object} [options]
+   * @param {boolean} [options.exportDxf] Also build the DXF (export page),
+   *   slider updates only need the images
    * @returns {Promise<void>}
    */
-  async sendToAPI() {
+  async sendToAPI({ exportDxf = false } = {}) {
     if (!this.validateRequest()) return;
 
     try {
@@ -101,7 +154,12 @@ export const ApiService = {
         },
         realWidthMm: drawerWidth,
         realHeightMm: drawerHeight,
-        edgeDetectionSettings: edgeDetectionSettings
+        edgeDetectionSettings: edgeDetectionSettings,
+        // The DXF comes from /exports, built from the returned contours
+        outputs: exportDxf
+          ? ["processedImage", "contouredImage", "contours"]
+          : ["processedImage", "contouredImage"],
+        encoding: { contours: { format: "delta" } }
       };
 
       // Only include coordinates if not in edge finding mode
@@ -131,9 +189,8 @@ export const ApiService = {
         AppState.setProcessedImage(data.processedImage);
         AppState.setContouredImage(data.contouredImage);
         
-        // Store DXF data if available
-        if (data.dxf_data) {
-          AppState.setDxfData(data.dxf_data);
+        if (exportDxf) {
+          await this.exportDxf(data, drawerWidth, drawerHeight);
         }
         
         // Only redirect if not already in edge finding view
@@ -153,6 +210,6 @@ export const ApiService = {
 };
 
 // Export a convenience function for backward compatibility
-export async function sendToAPI() {
-  return ApiService.sendToAPI();
+export async function sendToAPI(options) {
+  return ApiService.sendToAPI(options);
 }